@@ -1,7 +1,12 @@
 import streamlit as st
+import fit_pool
 
 st.set_page_config(page_title="Livestock Methane Emission Dashboard", page_icon="🐮")#, layout="wide")
 
+# Start warming the forecast workers (Prophet import + Stan model load) in the
+# background, so the first forecast on page 4 does not pay the cold start
+fit_pool.start()
+
 st.title("Livestock Methane Emissions Project")
 
 st.header("Introduction")
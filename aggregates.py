@@ -0,0 +1,123 @@
+"""
+aggregates.py
+=============
+Materialized aggregate cube for the Global and Africa dashboards.
+
+Every groupby the dashboard pages used to run on each Streamlit rerun is
+computed once here, when the cleaned dataset is ingested, and persisted next to
+it as Parquet under dataset/cube/. The pages read these tables directly, so
+moving a widget does no aggregation work at all.
+
+Tables (each a DataFrame in the dict returned by load_cube()):
+
+  continent_summary  Continent, Countries, Total, Mean
+  region_summary     Region, Countries, Total, Mean          (African sub-regions)
+  subregion_summary  Continent, Sub-region, Countries, Total, Mean   (UN M49, every continent)
+  continent_year     Continent, Year, Value                  (mean across countries)
+  region_year        Region, Year, Value                     (mean across countries)
+  subregion_year     Continent, Sub-region, Year, Value      (mean across countries)
+  area_totals        Area, Area Code (ISO3), Continent, Sub-region, Region, Total, Mean,
+                     Global Rank, Global Rank Asc, Continent Rank, Sub-region Rank, Region Rank
+
+Sub-regions and the African regions come from the geography table
+(geography.py, dataset/countries.csv).
+
+Rankings are 1-based and break ties the way nlargest/nsmallest do, so
+"top N" is simply `area_totals['Global Rank'] <= N`. Global ranks are by total
+emissions; continent and region ranks are by mean annual emissions.
+"""
+
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from data_store import CLEANED_CSV, PARQUET_AVAILABLE, is_fresh, load_data, source_mtime
+from geography import with_geography
+
+CUBE_DIR = "dataset/cube"
+CUBE_TABLES = ['continent_summary', 'region_summary', 'subregion_summary', 'continent_year', 'region_year',
+               'subregion_year', 'area_totals']
+
+
+def _summary(df, key):
+    summary = df.groupby(key, observed=True).agg(Countries=('Area', 'nunique'),
+                                                 Total=('Value', 'sum'),
+                                                 Mean=('Value', 'mean'))
+    return summary.reset_index()
+
+
+def build_cube(df):
+    """Compute every dashboard aggregate from the cleaned dataset."""
+    df = with_geography(df)
+    df['Area'] = df['Area'].astype(str)
+    df['Continent'] = df['Continent'].astype(str)
+    # Masks before the casts: astype(str) turns NaN into 'nan' on pandas < 3
+    has_subregion, in_africa = df['Sub-region'].notna(), df['Region'].notna()
+    df['Sub-region'] = df['Sub-region'].astype(str).where(has_subregion)
+    df['Region'] = df['Region'].astype(str).where(in_africa)
+    africa = df[in_africa]
+
+    area_totals = (df.groupby('Area', sort=True)
+                     .agg(**{'Area Code (ISO3)': ('Area Code (ISO3)', 'first'),
+                             'Continent': ('Continent', 'first'),
+                             'Sub-region': ('Sub-region', 'first'),
+                             'Region': ('Region', 'first'),
+                             'Total': ('Value', 'sum'),
+                             'Mean': ('Value', 'mean')})
+                     .reset_index())
+    area_totals['Area Code (ISO3)'] = area_totals['Area Code (ISO3)'].astype(str)
+    # method='first' ranks ties in order of appearance, matching nlargest/nsmallest(keep='first')
+    area_totals['Global Rank'] = area_totals['Total'].rank(method='first', ascending=False).astype('int16')
+    area_totals['Global Rank Asc'] = area_totals['Total'].rank(method='first').astype('int16')
+    area_totals['Continent Rank'] = (area_totals.groupby('Continent')['Mean']
+                                                .rank(method='first', ascending=False).astype('int16'))
+    area_totals['Sub-region Rank'] = (area_totals.groupby('Sub-region')['Mean']
+                                                 .rank(method='first', ascending=False).astype('int16'))
+    area_totals['Region Rank'] = (area_totals.groupby('Region')['Mean']
+                                             .rank(method='first', ascending=False).astype('Int16'))
+
+    return {
+        'continent_summary': _summary(df, 'Continent'),
+        'region_summary': _summary(africa, 'Region'),
+        'subregion_summary': _summary(df, ['Continent', 'Sub-region']),
+        'continent_year': df.groupby(['Continent', 'Year'])['Value'].mean().reset_index(),
+        'region_year': africa.groupby(['Region', 'Year'])['Value'].mean().reset_index(),
+        'subregion_year': df.groupby(['Continent', 'Sub-region', 'Year'])['Value'].mean().reset_index(),
+        'area_totals': area_totals,
+    }
+
+
+def write_cube(cube, cube_dir=CUBE_DIR):
+    """Persist the cube tables as Parquet files under cube_dir."""
+    if not PARQUET_AVAILABLE:
+        return
+    try:
+        os.makedirs(cube_dir, exist_ok=True)
+        for name, table in cube.items():
+            table.to_parquet(os.path.join(cube_dir, f"{name}.parquet"), index=False)
+    except OSError:
+        # Read-only deployments still get the in-memory cube
+        pass
+
+
+@lru_cache(maxsize=2)
+def _load_cube(csv_path, cube_dir, mtime):
+    paths = {name: os.path.join(cube_dir, f"{name}.parquet") for name in CUBE_TABLES}
+    if PARQUET_AVAILABLE and all(is_fresh(path, csv_path) for path in paths.values()):
+        return {name: pd.read_parquet(path) for name, path in paths.items()}
+    cube = build_cube(load_data(csv_path, value_dtype='float64'))
+    write_cube(cube, cube_dir)
+    return cube
+
+
+def load_cube(csv_path=CLEANED_CSV, cube_dir=CUBE_DIR):
+    """Return the aggregate cube, building and persisting it if it is missing or stale."""
+    return _load_cube(csv_path, cube_dir, source_mtime(csv_path))
+
+
+def top_areas(area_totals, rank_column, n, group_column=None):
+    """Areas with rank_column <= n, in (group, rank) order — a filter, not a groupby."""
+    top = area_totals[area_totals[rank_column] <= n]
+    order = [rank_column] if group_column is None else [group_column, rank_column]
+    return top.sort_values(order)
@@ -0,0 +1,325 @@
+"""
+backtest.py
+===========
+Rolling-origin (expanding-window) backtests for any model and any set of
+countries.
+
+    python backtest.py                                   # Prophet + ARIMA + baselines, all countries
+    python backtest.py --models prophet drift --initial 12 --horizon 5 --countries Brazil India
+
+    from backtest import backtest, summarize
+    results = backtest(df, ['Brazil', 'India'], models=['prophet', 'theta'], initial=12, horizon=5)
+    summarize(results)                                   # MAE / RMSE / MAPE per model
+
+Every fold trains on years [0, cutoff) and forecasts the next `horizon` years;
+cutoffs run from `initial` to the last one with a full horizon, every `step`
+years. The split in comparison.py (train 2000-2016, 5 test years) is the last
+fold of initial=17, and paper_analysis_v2.py's (15 / 7) is one fold of
+horizon=7, so both single splits are special cases of this engine.
+
+Models:
+
+  prophet        folds of a country run in order and each fit is warm-started
+                 from the previous fold's parameters (rescaled to the new
+                 fold's y/t scaling and changepoint grid), so the optimizer
+                 starts next to the answer instead of from Prophet's default init
+  arima          one (p, d, q) per run (params={'arima': {'order': ...}}),
+                 fits memoized by arima_search
+  <baseline>     any model in baselines.MODELS, fit for all countries at once
+                 per fold as array operations
+
+Prophet and ARIMA fold fits are cached on disk (model_cache/folds/) keyed by
+model, hyperparameters, training window and horizon, so extending a backtest
+by a year or adding a model only fits the new folds.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from arima_search import _MP_CONTEXT, fit_arima
+from baselines import MODELS as BASELINE_MODELS
+from instrument import record_fit
+from model_cache import CACHE_DIR
+
+FOLD_CACHE_DIR = os.path.join(CACHE_DIR, "folds")
+
+# Same Prophet configuration as the model comparison (comparison.py)
+PROPHET_DEFAULTS = {
+    'changepoint_prior_scale': 0.05,
+    'seasonality_mode': 'additive',
+    'yearly_seasonality': False,
+    'weekly_seasonality': False,
+    'daily_seasonality': False,
+}
+ARIMA_DEFAULTS = {'order': (1, 1, 1)}
+
+
+def expanding_folds(n, initial, horizon, step=1):
+    """(train_end, test_end) index pairs; every fold has a full test horizon."""
+    return [(end, end + horizon) for end in range(initial, n - horizon + 1, step)]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# FOLD CACHE
+# ══════════════════════════════════════════════════════════════════════════════
+def fold_key(model, params, years, values, horizon):
+    payload = json.dumps({'model': model, 'params': params, 'horizon': horizon,
+                          'years': [int(y) for y in years]}, sort_keys=True, default=str)
+    digest = hashlib.sha256(payload.encode('utf-8'))
+    digest.update(np.ascontiguousarray(values, dtype='float64').tobytes())
+    return digest.hexdigest()
+
+
+def _load_fold(key, cache_dir):
+    try:
+        with open(os.path.join(cache_dir, f"{key}.pkl"), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def _save_fold(key, result, cache_dir):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, os.path.join(cache_dir, f"{key}.pkl"))
+    except OSError:
+        # Read-only deployments simply run uncached
+        pass
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PROPHET — warm-started fold fits
+# ══════════════════════════════════════════════════════════════════════════════
+def _changepoint_dates(ds, n_changepoints=25, changepoint_range=0.8):
+    """The changepoint dates Prophet will place for this history (Prophet.set_changepoints)."""
+    hist_size = int(np.floor(len(ds) * changepoint_range))
+    n_changepoints = min(n_changepoints, hist_size - 1)
+    if n_changepoints <= 0:
+        return ds[:0]
+    cp_indexes = np.linspace(0, hist_size - 1, n_changepoints + 1).round().astype(int)
+    return ds[cp_indexes][1:]
+
+
+def warm_start_init(state, train, params):
+    """Stan init for a new fold from the previous fold's fitted parameters.
+
+    Prophet fits in scaled units (y / y_scale, t / t_scale), and both scales
+    grow with the window, so slopes, offsets and noise are converted to the
+    new fold's units; changepoint deltas are carried over by nearest date.
+    """
+    y_scale = float(np.abs(train['y']).max()) or 1.0
+    t_scale = (train['ds'].max() - train['ds'].min()) / np.timedelta64(1, 's')
+    y_ratio = state['y_scale'] / y_scale
+    slope_ratio = y_ratio * t_scale / state['t_scale']
+
+    new_cps = _changepoint_dates(train['ds'].to_numpy(), params.get('n_changepoints', 25),
+                                 params.get('changepoint_range', 0.8))
+    old_cps, old_delta = state['changepoints'], state['params']['delta']
+    if len(new_cps) and len(old_cps):
+        nearest = np.abs(new_cps[:, None] - old_cps[None, :]).argmin(axis=1)
+        delta = old_delta[nearest] * slope_ratio
+    else:
+        delta = np.zeros(len(new_cps))
+    return {
+        'k': float(state['params']['k'][0]) * slope_ratio,
+        'm': float(state['params']['m'][0]) * y_ratio,
+        'sigma_obs': float(state['params']['sigma_obs'][0]) * y_ratio,
+        'delta': delta,
+        'beta': state['params']['beta'] * y_ratio,
+    }
+
+
+def prophet_fold(years, values, horizon, params=None, warm=None):
+    """Fit Prophet on one training window; returns (forecast, state for the next fold)."""
+    from prophet import Prophet
+
+    params = {**PROPHET_DEFAULTS, **(params or {})}
+    train = pd.DataFrame({'ds': pd.to_datetime(years, format='%Y'), 'y': np.asarray(values, dtype='float64')})
+    m = Prophet(**params)
+    if warm is not None:
+        m.fit(train, init=warm_start_init(warm, train, params))
+    else:
+        m.fit(train)
+    forecast = m.predict(m.make_future_dataframe(periods=horizon, freq='YE'))['yhat'].to_numpy()[-horizon:]
+    state = {
+        'params': {name: np.asarray(value).ravel() for name, value in m.params.items()},
+        'y_scale': float(m.y_scale),
+        't_scale': m.t_scale.total_seconds(),
+        'changepoints': m.changepoints.to_numpy(),
+    }
+    return forecast, state
+
+
+def arima_fold(years, values, horizon, params=None, warm=None):
+    order = tuple((params or {}).get('order', ARIMA_DEFAULTS['order']))
+    forecast = fit_arima(np.asarray(values, dtype='float64'), order, horizon)['forecast']
+    return (forecast if forecast is not None else np.full(horizon, np.nan)), None
+
+
+FOLD_MODELS = {
+    'prophet': prophet_fold,
+    'arima': arima_fold,
+}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# ENGINE
+# ══════════════════════════════════════════════════════════════════════════════
+def backtest_series(country, years, values, model, folds, params=None, use_cache=True,
+                    cache_dir=FOLD_CACHE_DIR):
+    """All folds of one country for a per-series model, in order (for warm starts)."""
+    fold_fn = FOLD_MODELS[model]
+    rows, warm = [], None
+    for train_end, test_end in folds:
+        horizon = test_end - train_end
+        train_years, train_values = years[:train_end], values[:train_end]
+        key = fold_key(model, params, train_years, train_values, horizon)
+        cached = _load_fold(key, cache_dir) if use_cache else None
+        if cached is None:
+            start = time.perf_counter()
+            forecast, state = fold_fn(train_years, train_values, horizon, params, warm)
+            record_fit(model, time.perf_counter() - start)
+            if use_cache:
+                _save_fold(key, {'forecast': forecast, 'state': state}, cache_dir)
+        else:
+            forecast, state = cached['forecast'], cached['state']
+            record_fit(model, 0.0, cached=True)
+        warm = state
+        rows.append(pd.DataFrame({
+            'Area': country,
+            'model': model,
+            'cutoff': int(years[train_end - 1]),
+            'Year': years[train_end:test_end].astype(int),
+            'step': np.arange(1, horizon + 1),
+            'y': values[train_end:test_end],
+            'yhat': forecast,
+        }))
+    return rows
+
+
+def _worker_init():
+    logging.getLogger('cmdstanpy').disabled = True
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+
+
+def _series_task(args):
+    return backtest_series(*args)
+
+
+def _baseline_rows(model, years, areas, Y, folds):
+    """A vectorized baseline: one call per fold covers every country."""
+    rows = []
+    for train_end, test_end in folds:
+        horizon = test_end - train_end
+        forecast = BASELINE_MODELS[model](Y[:train_end], horizon)       # (horizon × countries)
+        rows.append(pd.DataFrame({
+            'Area': np.repeat(areas, horizon),
+            'model': model,
+            'cutoff': int(years[train_end - 1]),
+            'Year': np.tile(years[train_end:test_end], len(areas)).astype(int),
+            'step': np.tile(np.arange(1, horizon + 1), len(areas)),
+            'y': Y[train_end:test_end].T.ravel(),
+            'yhat': forecast.T.ravel(),
+        }))
+    return rows
+
+
+def backtest(df, countries=None, models=('prophet',), initial=15, horizon=5, step=1, params=None,
+             workers=None, use_cache=True):
+    """Rolling-origin backtest; returns one row per (country, model, cutoff, test year).
+
+    params maps model name -> hyperparameters for that model.
+    Countries with gaps in their series are left out of the baselines
+    (which need a complete years × countries matrix).
+    """
+    params = params or {}
+    wide = df.pivot(index='Year', columns='Area', values='Value').astype('float64')
+    wide.columns = wide.columns.astype(str)
+    if countries is not None:
+        wide = wide[list(countries)]
+    years = wide.index.to_numpy()
+    folds = expanding_folds(len(years), initial, horizon, step)
+    if not folds:
+        raise ValueError(f"No fold fits: {len(years)} years, initial={initial}, horizon={horizon}")
+
+    frames = []
+    baseline_models = [m for m in models if m in BASELINE_MODELS]
+    if baseline_models:
+        complete = wide.dropna(axis=1)
+        for model in baseline_models:
+            frames += _baseline_rows(model, years, complete.columns.to_numpy(), complete.to_numpy(), folds)
+
+    tasks = []
+    for model in models:
+        if model in BASELINE_MODELS:
+            continue
+        if model not in FOLD_MODELS:
+            raise ValueError(f"Unknown model {model!r}; choose from {sorted(FOLD_MODELS) + sorted(BASELINE_MODELS)}")
+        for country in wide.columns:
+            series = wide[country].dropna()
+            tasks.append((country, series.index.to_numpy(), series.to_numpy(), model,
+                          expanding_folds(len(series), initial, horizon, step), params.get(model), use_cache))
+    if tasks:
+        if workers == 1 or len(tasks) == 1:
+            per_series = [backtest_series(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT, initializer=_worker_init) as pool:
+                per_series = list(pool.map(_series_task, tasks))
+        for rows in per_series:
+            frames += rows
+
+    results = pd.concat(frames, ignore_index=True)
+    results['error'] = results['yhat'] - results['y']
+    return results
+
+
+def summarize(results, by=('model',)):
+    """MAE, RMSE and MAPE (%) of a backtest, grouped by the given columns."""
+    err = results.assign(abs_error=results['error'].abs(),
+                         sq_error=results['error'] ** 2,
+                         ape=(results['error'] / results['y']).abs() * 100)
+    summary = err.groupby(list(by), observed=True).agg(
+        MAE=('abs_error', 'mean'), RMSE=('sq_error', 'mean'), MAPE=('ape', 'mean'), n=('error', 'size'))
+    summary['RMSE'] = np.sqrt(summary['RMSE'])
+    return summary
+
+
+if __name__ == "__main__":
+    from data_store import load_data
+
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest over countries and models.")
+    parser.add_argument("--models", nargs='+', default=['prophet', 'arima', 'drift', 'theta'])
+    parser.add_argument("--countries", nargs='*', default=None, help="Area names (default: all)")
+    parser.add_argument("--initial", type=int, default=15, help="years in the first training window")
+    parser.add_argument("--horizon", type=int, default=5, help="test years per fold")
+    parser.add_argument("--step", type=int, default=1, help="years between cutoffs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--no-cache", action="store_true", help="refit every fold")
+    parser.add_argument("--output", default=None, help="write the fold-level results to this CSV")
+    args = parser.parse_args()
+
+    _worker_init()
+    start = time.time()
+    results = backtest(load_data(value_dtype='float64'), args.countries, args.models, args.initial,
+                       args.horizon, args.step, workers=args.workers, use_cache=not args.no_cache)
+    print(f"{results['Area'].nunique()} countries × {results['cutoff'].nunique()} cutoffs "
+          f"× {len(args.models)} models in {time.time() - start:.1f}s\n")
+    print(summarize(results).round(3).to_string())
+    print("\n--- MAE by forecast step ---")
+    print(summarize(results, by=('model', 'step'))['MAE'].unstack('step').round(3).to_string())
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"\nWritten: {args.output}")
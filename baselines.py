@@ -0,0 +1,199 @@
+"""
+baselines.py
+============
+Vectorized baseline forecasters over the wide modelling matrix.
+
+The wide matrix (wide_matrix.py: memory-mapped and built from the cleaned
+store) holds one row per year and one column per country (ISO3). Every model
+here fits all countries at once, as NumPy array operations on that
+(years × countries) layout, so the whole zoo fits, forecasts and backtests
+~190 series in well under a second. That makes it a benchmark for the
+per-country Prophet/ARIMA fits in paper_analysis.py and a fast fallback when
+Prophet is too slow.
+
+    python baselines.py                      # 5-year holdout, summary table
+
+The holdout (train 2000-2016, test 2017-2021) is the one used for Table 2, so
+the script also lines the baselines up against model_comparison.csv.
+
+Models (each `forecast(Y, h) -> (h, n_countries)` array):
+
+  naive        last observed value
+  drift        last value + average historical change
+  linear       OLS linear trend
+  loglinear    OLS trend on log(y) (constant growth rate)
+  holt_damped  Holt's damped trend, (alpha, beta, phi) chosen per country by grid SSE
+  theta        Theta method (SES + half the linear-trend slope), alpha per country
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM
+from wide_matrix import load_matrix
+
+ALPHA_GRID = np.linspace(0.05, 0.95, 19)
+BETA_GRID = np.array([0.01, 0.05, 0.1, 0.2, 0.3])
+PHI_GRID = np.array([0.8, 0.9, 0.95, 0.98])
+
+
+def load_wide(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+    """Return (years, iso3_codes, Y) with Y a float64 (years × countries) array.
+
+    The panel is wide_matrix.complete_panel: years not every country has yet
+    are cut from the end, then countries with a gap are left out.
+    """
+    return load_matrix(item, element, complete=True)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# MODELS — all take Y (T × N) and a horizon h, and return an (h × N) forecast
+# ══════════════════════════════════════════════════════════════════════════════
+def _trend_fit(Y):
+    """OLS intercept and slope of every column against t = 0..T-1."""
+    T = Y.shape[0]
+    t = np.arange(T, dtype='float64')
+    t_c = t - t.mean()
+    slope = t_c @ (Y - Y.mean(axis=0)) / (t_c @ t_c)
+    intercept = Y.mean(axis=0) - slope * t.mean()
+    return intercept, slope
+
+
+def naive(Y, h):
+    return np.repeat(Y[-1:], h, axis=0)
+
+
+def drift(Y, h):
+    step = (Y[-1] - Y[0]) / (Y.shape[0] - 1)
+    return Y[-1] + np.arange(1, h + 1)[:, None] * step
+
+
+def linear(Y, h):
+    intercept, slope = _trend_fit(Y)
+    t_future = np.arange(Y.shape[0], Y.shape[0] + h)[:, None]
+    return intercept + slope * t_future
+
+
+def loglinear(Y, h):
+    return np.exp(linear(np.log(np.clip(Y, 1e-6, None)), h))
+
+
+def _ses_levels(Y, alphas):
+    """Final SES level and one-step SSE for every alpha (A,) × column (N,) pair."""
+    level = np.broadcast_to(Y[0], (len(alphas), Y.shape[1])).copy()
+    a = alphas[:, None]
+    sse = np.zeros_like(level)
+    for y in Y[1:]:
+        err = y - level
+        sse += err ** 2
+        level += a * err
+    return level, sse
+
+
+def theta(Y, h):
+    """Theta(2) method of Assimakopoulos & Nikolopoulos, in the SES form of Hyndman & Billah (2003)."""
+    levels, sse = _ses_levels(Y, ALPHA_GRID)
+    best = sse.argmin(axis=0)
+    cols = np.arange(Y.shape[1])
+    level = levels[best, cols]
+    alpha = ALPHA_GRID[best]
+    _, slope = _trend_fit(Y)
+    n = Y.shape[0]
+    steps = np.arange(1, h + 1)[:, None]
+    return level + 0.5 * slope * (steps - 1 + 1 / alpha - (1 - alpha) ** n / alpha)
+
+
+def holt_damped(Y, h):
+    """Holt's damped additive trend; (alpha, beta, phi) picked per column by one-step SSE."""
+    grid = np.array(list(itertools.product(ALPHA_GRID, BETA_GRID, PHI_GRID)))   # (C, 3)
+    alpha, beta, phi = (grid[:, i:i + 1] for i in range(3))
+    C, N = len(grid), Y.shape[1]
+
+    level = np.broadcast_to(Y[0], (C, N)).copy()
+    trend = np.broadcast_to(Y[1] - Y[0], (C, N)).copy()
+    sse = np.zeros((C, N))
+    for y in Y[1:]:
+        pred = level + phi * trend
+        err = y - pred
+        sse += err ** 2
+        new_level = pred + alpha * err
+        trend = phi * trend + beta * (new_level - level - phi * trend)
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    cols = np.arange(N)
+    level, trend, phi = level[best, cols], trend[best, cols], grid[best, 2]
+    damp = np.cumsum(phi[None, :] ** np.arange(1, h + 1)[:, None], axis=0)
+    return level + damp * trend
+
+
+MODELS = {
+    'naive': naive,
+    'drift': drift,
+    'linear': linear,
+    'loglinear': loglinear,
+    'holt_damped': holt_damped,
+    'theta': theta,
+}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BACKTEST
+# ══════════════════════════════════════════════════════════════════════════════
+def backtest(model, Y, n_test=5):
+    """Fit on all but the last n_test rows; return (forecast, MAE, RMSE) per column."""
+    train, test = Y[:-n_test], Y[-n_test:]
+    pred = model(train, n_test)
+    err = test - pred
+    return pred, np.abs(err).mean(axis=0), np.sqrt((err ** 2).mean(axis=0))
+
+
+def run_all(Y, codes, h=6, n_test=5, models=None):
+    """Run every model on every column in one call.
+
+    Returns a dict name -> {'forecast': DataFrame (h × countries) fit on the full
+    series, 'metrics': DataFrame indexed by ISO3 with holdout MAE and RMSE}.
+    """
+    out = {}
+    for name in models or MODELS:
+        model = MODELS[name]
+        _, mae, rmse = backtest(model, Y, n_test)
+        out[name] = {
+            'forecast': pd.DataFrame(model(Y, h), columns=codes),
+            'metrics': pd.DataFrame({'MAE': mae, 'RMSE': rmse}, index=pd.Index(codes, name='Area Code (ISO3)')),
+        }
+    return out
+
+
+if __name__ == "__main__":
+    import time
+
+    years, codes, Y = load_wide()
+    start = time.time()
+    results = run_all(Y, codes)
+    elapsed = time.time() - start
+
+    print(f"Baselines for {len(codes)} countries, holdout {years[-5]}-{years[-1]} "
+          f"({elapsed * 1000:.0f} ms for all models)\n")
+    summary = pd.DataFrame({name: r['metrics'].mean() for name, r in results.items()}).T.round(3)
+    summary.index.name = 'Model'
+    print(summary.to_string())
+
+    # Same holdout as Table 2 in paper_analysis.py — compare on its countries
+    try:
+        comparison = pd.read_csv("model_comparison.csv")
+    except FileNotFoundError:
+        comparison = None
+    if comparison is not None:
+        from data_store import load_data
+
+        df = load_data()
+        area_to_iso3 = dict(zip(df['Area'].astype(str), df['Area Code (ISO3)'].astype(str)))
+        iso3 = comparison['Country'].map(area_to_iso3)
+        table = comparison[['Country', 'ARIMA MAE', 'Prophet MAE']].copy()
+        for name, r in results.items():
+            table[f'{name} MAE'] = r['metrics']['MAE'].reindex(iso3).round(3).values
+        print("\n--- Holdout MAE vs model_comparison.csv (kt) ---")
+        print(table.to_string(index=False))
@@ -0,0 +1,264 @@
+"""
+batch_forecast.py
+=================
+Fit Prophet for every country in the cleaned dataset and write one forecast
+table that the Future Prediction App reads instantly.
+
+    python batch_forecast.py                 # all CPUs, 20-year horizon
+    python batch_forecast.py --workers 4 --horizon 10
+    python batch_forecast.py --item Sheep --element "Enteric fermentation (Emissions CH4)"
+    python batch_forecast.py --backend numpy   # in-process NumPy/SciPy fit (fast_prophet.py)
+    python batch_forecast.py --breaks          # changepoints at detected structural breaks (breaks.py)
+
+Countries are fit across a process pool. Each fitted model is also written to
+the on-disk model cache (model_cache.py), so a live fit in the app for the same
+series is a cache hit as well.
+
+With --backend numpy the models are fit in this process by fast_prophet's
+fit_batch instead — all countries in a second or two, no pool or cmdstan —
+and nothing is written to the model cache.
+
+The table (dataset/forecasts.arrow, a versioned memory-mapped artifact —
+forecast_artifact.py — or .csv without pyarrow) has one row per country × date:
+
+  Area, Area Code (ISO3), ds, horizon   horizon 0 = historical, 1..H = future years
+  y                                     observed value (NaN for future rows)
+  yhat, yhat_lower, yhat_upper          point forecast and uncertainty interval
+  Model, Config                         fitting model class and hyperparameter hash
+  MAE, RMSE, R2                         in-sample fit metrics for the country
+
+Other livestock items / elements (emissions_tensor.py) get their own table,
+dataset/forecasts_<item>_<element>.arrow. country_forecast() reads one
+country's rows as a zero-copy slice of the mapped file.
+
+Countries with a row in dataset/prophet_best_params.csv (tuning.py) are fit
+with their tuned hyperparameters on top of PROPHET_PARAMS (backtest's
+PROPHET_DEFAULTS, the base they were tuned on); the rest use PROPHET_PARAMS
+as is. With --breaks
+every country is fit with changepoints at its detected breaks instead
+(breaks.seeded_params).
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from data_store import CLEANED_CSV, is_fresh, load_data
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM, TENSOR_PATH, is_default, load_selection
+from forecast_artifact import ARROW_AVAILABLE, open_artifact, write_artifact
+from backtest import PROPHET_DEFAULTS
+from tuning import BEST_PARAMS_CSV, params_for
+
+FORECAST_PATH = "dataset/forecasts.arrow" if ARROW_AVAILABLE else "dataset/forecasts.csv"
+MAX_HORIZON = 20        # the app allows forecasting up to 20 years
+# One base configuration for every fit — untuned and tuned countries, live fits,
+# hierarchy aggregates — the one the tuned values were searched on (no
+# seasonality: the series are annual)
+PROPHET_PARAMS = PROPHET_DEFAULTS
+
+
+def forecast_path(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+    """Forecast table for one item/element; the default series keeps FORECAST_PATH."""
+    if is_default(item, element):
+        return FORECAST_PATH
+    root, ext = os.path.splitext(FORECAST_PATH)
+    slug = re.sub(r'[^a-z0-9]+', '_', f"{item} {element}".lower()).strip('_')
+    return f"{root}_{slug}{ext}"
+
+
+def country_series(df, country):
+    """Prophet-ready ds/y frame for one country."""
+    country_data = df[df['Area'] == country]
+    return pd.DataFrame({'ds': pd.to_datetime(country_data['Year'].astype(int), format='%Y'),
+                         'y': country_data['Value'].astype('float64').values})
+
+
+def forecast_country(country, iso3, model_data, horizon=MAX_HORIZON, params=None, backend=None):
+    """Fit (or load from cache) one country's model and return its forecast rows."""
+    from model_cache import get_or_fit
+
+    params = params or PROPHET_PARAMS
+    model = get_or_fit(country, model_data, params, backend=backend)
+    return forecast_rows(model, country, iso3, model_data, horizon, params)
+
+
+def forecast_rows(model, country, iso3, model_data, horizon=MAX_HORIZON, params=None):
+    """Forecast rows (history + horizon years) and fit metrics of a fitted model."""
+    from model_cache import config_hash
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    future = model.make_future_dataframe(periods=horizon, freq='YE')
+    fc = model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+    n_hist = len(model_data)
+    fitted = fc['yhat'].values[:n_hist]
+    actual = model_data['y'].values
+
+    fc.insert(0, 'Area', country)
+    fc.insert(1, 'Area Code (ISO3)', iso3)
+    fc.insert(3, 'horizon', np.r_[np.zeros(n_hist, dtype='int16'), np.arange(1, horizon + 1, dtype='int16')])
+    fc.insert(4, 'y', np.r_[actual, np.full(horizon, np.nan)])
+    fc['Model'] = type(model).__name__
+    fc['Config'] = config_hash(params)
+    fc['MAE'] = mean_absolute_error(actual, fitted)
+    fc['RMSE'] = np.sqrt(mean_squared_error(actual, fitted))
+    fc['R2'] = r2_score(actual, fitted)
+    return fc
+
+
+def _worker_init():
+    # Keep cmdstanpy's per-fit INFO chatter out of the batch log
+    logging.getLogger('cmdstanpy').disabled = True
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+
+
+def _forecast_task(args):
+    return forecast_country(*args)
+
+
+def _run_numpy(tasks):
+    """In-process forecasts with fast_prophet: one fit_batch per distinct parameter set."""
+    from fast_prophet import fit_batch
+
+    groups = {}
+    for task in tasks:
+        config = task[4] or PROPHET_PARAMS
+        groups.setdefault(json.dumps(config, sort_keys=True, default=str), (config, []))[1].append(task)
+    frames = {}
+    for config, group in groups.values():
+        models = fit_batch({task[0]: task[2] for task in group}, **config)
+        for country, iso3, model_data, horizon, _ in group:
+            frames[country] = forecast_rows(models[country], country, iso3, model_data, horizon, config)
+    return [frames[task[0]] for task in tasks]
+
+
+def run_batch(df=None, countries=None, horizon=MAX_HORIZON, workers=None, params=None, tuned=True,
+              backend='stan', breaks=None):
+    """Forecast every country (or the given subset) across a process pool.
+
+    Without explicit params, each country uses its tuned hyperparameters
+    (tuned=True, the cattle CH4 series they were tuned on) or PROPHET_PARAMS.
+    Results come back in country order regardless of which worker finished first.
+    backend='numpy' fits in-process with fast_prophet instead (workers is ignored).
+    With a breaks table (breaks.detect_breaks), changepoints sit on each country's
+    breaks (breaks.seeded_params, on top of params) and tuning is not used.
+    """
+    df = load_data(value_dtype='float64') if df is None else df
+    if countries is None:
+        countries = df['Area'].unique().tolist()
+    iso3 = dict(zip(df['Area'].astype(str), df['Area Code (ISO3)'].astype(str)))
+    if breaks is not None:
+        from breaks import seeded_params
+
+        configs = {country: seeded_params(breaks, country, params or PROPHET_PARAMS) for country in countries}
+    else:
+        configs = {country: params if params is not None else (tuned and params_for(country)) or None
+                   for country in countries}
+    tasks = [(country, iso3[country], country_series(df, country), horizon, configs[country])
+             for country in countries]
+
+    if backend == 'numpy':
+        frames = _run_numpy(tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+            frames = list(pool.map(_forecast_task, tasks))
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_forecasts(table, path=FORECAST_PATH, key=('Area',), **metadata):
+    """Write a forecast table: the Arrow artifact for .arrow paths, CSV otherwise."""
+    if path.endswith('.arrow'):
+        write_artifact(table, path, key, **metadata)
+    else:
+        table.to_csv(path, index=False)
+
+
+@lru_cache(maxsize=4)
+def _read_csv_forecasts(path, mtime):
+    return pd.read_csv(path, parse_dates=['ds'])
+
+
+def read_forecasts(path=FORECAST_PATH):
+    """The whole forecast table at path, fresh or not; None if it is missing."""
+    if path.endswith('.arrow'):
+        artifact = open_artifact(path)
+        return None if artifact is None else artifact.frame()
+    if not os.path.exists(path):
+        return None
+    return _read_csv_forecasts(path, os.path.getmtime(path))
+
+
+def _is_current(path, csv_path):
+    # Stale data, or the cattle series was re-tuned after this table was built
+    return is_fresh(path, csv_path) and (csv_path != CLEANED_CSV or is_fresh(path, BEST_PARAMS_CSV))
+
+
+def load_forecasts(path=FORECAST_PATH, csv_path=CLEANED_CSV):
+    """The precomputed forecast table, or None if it is missing or older than the data.
+
+    Files are opened once per modification time, so a re-run of the batch is
+    picked up by a running app without a restart.
+    """
+    if not _is_current(path, csv_path):
+        return None
+    return read_forecasts(path)
+
+
+def country_forecast(country, periods, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+    """Historical + first `periods` future rows for one country, or None if not precomputed."""
+    path = forecast_path(item, element)
+    if not _is_current(path, CLEANED_CSV if is_default(item, element) else TENSOR_PATH):
+        return None
+    if path.endswith('.arrow'):
+        # Zero-copy slice of the mapped artifact; only these rows reach pandas
+        artifact = open_artifact(path)
+        if artifact is None or artifact.horizon(country) < periods:
+            return None
+        return artifact.frame(country, periods)
+    table = read_forecasts(path)
+    rows = table[(table['Area'] == country) & (table['horizon'] <= periods)]
+    if rows.empty or rows['horizon'].max() < periods:
+        return None
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch Prophet forecasts for every country.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: all CPUs)")
+    parser.add_argument("--horizon", type=int, default=MAX_HORIZON,
+                        help=f"years to forecast beyond the data (default: {MAX_HORIZON})")
+    parser.add_argument("--item", default=DEFAULT_ITEM, help=f"livestock item (default: {DEFAULT_ITEM})")
+    parser.add_argument("--element", default=DEFAULT_ELEMENT, help=f"emission element (default: {DEFAULT_ELEMENT})")
+    parser.add_argument("--backend", choices=['stan', 'numpy'], default='stan',
+                        help="Prophet/cmdstan (default) or the in-process fast_prophet fit")
+    parser.add_argument("--breaks", action='store_true',
+                        help="put changepoints on each country's detected structural breaks (breaks.py)")
+    args = parser.parse_args()
+
+    start = time.time()
+    path = forecast_path(args.item, args.element)
+    if args.breaks:
+        from breaks import load_breaks
+
+        breaks = load_breaks(args.item, args.element)
+    else:
+        breaks = None
+    table = run_batch(df=load_selection(args.item, args.element, 'float64'), horizon=args.horizon,
+                      workers=args.workers, tuned=is_default(args.item, args.element), backend=args.backend,
+                      breaks=breaks)
+    write_forecasts(table, path, item=args.item, element=args.element, horizon=args.horizon, backend=args.backend,
+                    changepoints='breaks' if args.breaks else 'grid')
+    n_countries = table['Area'].nunique()
+    engine = f"{args.workers} workers" if args.backend == 'stan' else "the numpy backend"
+    print(f"Forecast {n_countries} countries × {args.horizon} years "
+          f"with {engine} in {time.time() - start:.1f}s")
+    print(f"Written: {path}")
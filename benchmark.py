@@ -0,0 +1,339 @@
+"""
+benchmark.py
+============
+Offline timings for the expensive paths of the dashboards, forecasting and
+paper analysis, with a stored baseline to catch regressions.
+
+    python benchmark.py                          # run everything, write benchmarks/latest.json
+    python benchmark.py --save-baseline          # ... and store it as benchmarks/baseline.json
+    python benchmark.py --only csv_load cube     # names (or prefixes) to run
+    python benchmark.py --scales 10 50           # scaling runs without the all-country size
+
+Every run is compared with benchmarks/baseline.json when it exists: a
+benchmark regresses when its median is more than its threshold slower than
+the baseline (and by at least MIN_DELTA_S, so sub-millisecond noise never
+trips it). The script exits with status 1 on any regression, so it can gate CI.
+Baselines are machine-specific — save one on the machine that compares.
+
+Benchmarks:
+
+  csv_load / store_load      cleaned CSV parse vs the typed Parquet store
+  cube_build                 dashboard aggregate cube (aggregates.py)
+  page:<name>                each Streamlit page script, first run and warm rerun
+                             (aggregation + figure construction; needs streamlit)
+  prophet_fit_predict        one Prophet fit + 6-year predict (Brazil)
+  arima_grid                 paper_analysis.py's ARIMA order grid, top 10 countries
+  cps_sweep                  paper_analysis_v2.py's changepoint_prior_scale sweep
+  morans_i                   global Moran's I of country means, contiguity weights (spatial.py)
+  morans_i:all_years         global Moran's I and LISA for every year, 9,999 permutations
+  baselines                  every vectorized baseline, all countries
+  scale:<stage>:<n>          cube / baselines / ARIMA grid / Prophet fits on n countries
+
+Nothing touches the network: all data comes from dataset/.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from data_store import CLEANED_CSV, STORE_PATH, load_data
+
+BENCH_DIR = "benchmarks"
+RESULTS_PATH = os.path.join(BENCH_DIR, "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+DEFAULT_THRESHOLD = 0.25      # 25% slower than baseline = regression
+THRESHOLDS = {                # noisier benchmarks get more slack
+    'prophet_fit_predict': 0.5,
+    'cps_sweep': 0.5,
+    'arima_grid': 0.5,
+    'page:': 0.5,
+    'scale:prophet': 0.5,
+}
+MIN_DELTA_S = 0.005
+
+SCALES = [10, 50, 'all']
+N_COMPARISON_COUNTRIES = 10   # as in paper_analysis.py
+ARIMA_MAX_PQ = 2
+CPS_GRID = [0.001, 0.01, 0.05, 0.1, 0.5]   # as in paper_analysis_v2.py
+
+
+def _quiet():
+    warnings.filterwarnings("ignore")
+    logging.getLogger('cmdstanpy').disabled = True
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+
+
+def timeit(fn, repeats=5, warmup=0):
+    """Run fn warmup + repeats times; return a dict of timings in seconds."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'median': statistics.median(times), 'min': min(times), 'max': max(times), 'repeats': repeats}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# WORKLOADS — each mirrors the code path it is named after
+# ══════════════════════════════════════════════════════════════════════════════
+def _top_emitters(df, n):
+    """The n highest-total countries (all of them for n='all'), as the paper picks them."""
+    totals = df.groupby('Area', observed=True)['Value'].sum().sort_values(ascending=False)
+    return totals.index.tolist() if n == 'all' else totals.head(n).index.tolist()
+
+
+def _series(df, country):
+    return df[df['Area'] == country].sort_values('Year')['Value'].to_numpy(dtype='float64')
+
+
+def _prophet(cps=0.05):
+    from prophet import Prophet
+    return Prophet(changepoint_prior_scale=cps, seasonality_mode='additive', yearly_seasonality=False,
+                   weekly_seasonality=False, daily_seasonality=False)
+
+
+def prophet_fit_predict(df, country='Brazil', periods=6):
+    from batch_forecast import country_series
+    m = _prophet()
+    m.fit(country_series(df, country))
+    return m.predict(m.make_future_dataframe(periods=periods, freq='YE'))
+
+
+def arima_grid(df, countries, max_pq=ARIMA_MAX_PQ):
+    """The comparison's ARIMA order search on 2000-2016, memo cache cleared first."""
+    import arima_search
+    from comparison import N_TRAIN
+    from statsmodels.tsa.stattools import adfuller
+
+    arima_search._FIT_CACHE.clear()
+    train = {c: _series(df, c)[:N_TRAIN] for c in countries}
+    d = {c: 0 if adfuller(v, autolag='AIC')[1] < 0.05 else 1 for c, v in train.items()}
+    return arima_search.select_orders(train, d, max_pq=max_pq, n_forecast=5)
+
+
+def cps_sweep(df, country='Brazil'):
+    """paper_analysis_v2.py's sweep: per cps, a 15-year train fit and a full-series fit."""
+    from batch_forecast import country_series
+    ts = country_series(df, country)
+    for cps in CPS_GRID:
+        m = _prophet(cps)
+        m.fit(ts.iloc[:15])
+        m.predict(m.make_future_dataframe(periods=len(ts) - 15, freq='YE'))
+        m2 = _prophet(cps)
+        m2.fit(ts)
+        m2.predict(ts[['ds']])
+
+
+def morans_i(df):
+    """Global Moran's I of country mean emissions on contiguity weights (999 permutations)."""
+    import spatial
+    means = df.groupby('Area Code (ISO3)', observed=True)['Value'].mean()
+    return spatial.moran(means.to_numpy()[None, :], spatial.weights(means.index), permutations=999)
+
+
+def morans_i_all_years(df):
+    """paper_analysis.py's spatial stage: Moran's I and LISA for 2000-2021."""
+    import spatial
+    return spatial.moran_by_year(df), spatial.lisa_by_year(df)
+
+
+def prophet_fits(df, countries):
+    from batch_forecast import country_series
+    for country in countries:
+        m = _prophet()
+        m.fit(country_series(df, country))
+        m.predict(m.make_future_dataframe(periods=6, freq='YE'))
+
+
+def _subset_wide(Y, codes, df, countries):
+    iso3 = set(df.loc[df['Area'].isin(countries), 'Area Code (ISO3)'].astype(str))
+    keep = np.array([c in iso3 for c in codes])
+    return Y[:, keep], codes[keep]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SUITE
+# ══════════════════════════════════════════════════════════════════════════════
+def page_benchmarks():
+    """First-run and warm-rerun timings of every Streamlit page, via streamlit's AppTest."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {}
+    out = {}
+    root = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(root, '1_*.py')) + glob.glob(os.path.join(root, 'pages', '*.py'))):
+        name = 'page:' + os.path.splitext(os.path.basename(path))[0].split('_')[-1]
+        app = AppTest.from_file(path, default_timeout=300)
+        start = time.perf_counter()
+        app.run()
+        cold = time.perf_counter() - start
+        out[name + ':first'] = {'median': cold, 'min': cold, 'max': cold, 'repeats': 1}
+        out[name + ':rerun'] = timeit(app.run, repeats=3)
+    return out
+
+
+def suite(scales=SCALES):
+    """Ordered (name, thunk) list; thunks return a timing dict, or None when skipped."""
+    df = load_data(value_dtype='float64')
+
+    def plain(fn, repeats=5, warmup=0):
+        return lambda: timeit(fn, repeats, warmup)
+
+    def with_module(module, fn, repeats=1, warmup=0):
+        # Optional dependencies: a benchmark whose stack is missing is recorded as skipped
+        def run():
+            try:
+                __import__(module)
+            except ImportError:
+                return None
+            return timeit(fn, repeats, warmup)
+        return run
+
+    from aggregates import build_cube
+    from baselines import load_wide, run_all
+    _, codes, Y = load_wide()
+    top = _top_emitters(df, N_COMPARISON_COUNTRIES)
+
+    benches = [
+        ('csv_load', plain(lambda: pd.read_csv(CLEANED_CSV))),
+        ('store_load', plain(lambda: pd.read_parquet(STORE_PATH))
+         if os.path.exists(STORE_PATH) else lambda: None),
+        ('cube_build', plain(lambda: build_cube(df))),
+        ('baselines', plain(lambda: run_all(Y, codes), warmup=1)),
+        ('prophet_fit_predict', with_module('prophet', lambda: prophet_fit_predict(df), repeats=3, warmup=1)),
+        ('arima_grid', with_module('statsmodels', lambda: arima_grid(df, top))),
+        ('cps_sweep', with_module('prophet', lambda: cps_sweep(df))),
+        ('morans_i', plain(lambda: morans_i(df), repeats=5)),
+        ('morans_i:all_years', plain(lambda: morans_i_all_years(df), repeats=3)),
+    ]
+    for n in scales:
+        countries = _top_emitters(df, n)
+        sub = df[df['Area'].isin(countries)]
+        Y_n, codes_n = _subset_wide(Y, codes, df, countries)
+        benches += [
+            (f'scale:cube:{n}', plain(lambda sub=sub: build_cube(sub))),
+            (f'scale:baselines:{n}', plain(lambda Y_n=Y_n, codes_n=codes_n: run_all(Y_n, codes_n))),
+            (f'scale:arima_grid:{n}', with_module('statsmodels', lambda c=countries: arima_grid(df, c))),
+            (f'scale:prophet:{n}', with_module('prophet', lambda c=countries: prophet_fits(df, c))),
+        ]
+    return benches
+
+
+def run(only=None, scales=SCALES):
+    _quiet()
+    results = {}
+    for name, thunk in suite(scales):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        timing = thunk()
+        results[name] = timing if timing is not None else {'skipped': True}
+        _report(name, results[name])
+    if not only or any(prefix.startswith('page') for prefix in only):
+        for name, timing in page_benchmarks().items():
+            results[name] = timing
+            _report(name, timing)
+    return results
+
+
+def _report(name, timing):
+    if timing.get('skipped'):
+        print(f"  {name:<34} skipped (dependency not installed)")
+    else:
+        print(f"  {name:<34} {timing['median'] * 1000:10.1f} ms  (min {timing['min'] * 1000:.1f}, n={timing['repeats']})")
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BASELINE COMPARISON
+# ══════════════════════════════════════════════════════════════════════════════
+def threshold_for(name):
+    for prefix, threshold in THRESHOLDS.items():
+        if name.startswith(prefix):
+            return threshold
+    return DEFAULT_THRESHOLD
+
+
+def compare(results, baseline):
+    """Rows of (name, baseline s, current s, ratio, regressed) for benchmarks in both runs."""
+    rows = []
+    for name, timing in results.items():
+        base = baseline.get(name)
+        if not base or base.get('skipped') or timing.get('skipped'):
+            continue
+        ratio = timing['median'] / base['median'] if base['median'] else float('inf')
+        regressed = (ratio > 1 + threshold_for(name)
+                     and timing['median'] - base['median'] > MIN_DELTA_S)
+        rows.append((name, base['median'], timing['median'], ratio, regressed))
+    return rows
+
+
+def save(report, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with baseline regression checks.")
+    parser.add_argument("--only", nargs='*', default=None, help="benchmark names or prefixes to run")
+    parser.add_argument("--scales", nargs='*', default=[str(s) for s in SCALES],
+                        help="country counts for the scaling runs ('all' = every country)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="also store this run as the baseline")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    scales = [s if s == 'all' else int(s) for s in args.scales]
+    print(f"Benchmarks ({os.cpu_count()} CPUs)")
+    results = run(args.only, scales)
+    report = {'environment': environment(), 'results': results}
+    save(report, args.output)
+    print(f"\nWritten: {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\n--- vs {args.baseline} (commit {baseline['environment'].get('commit')}) ---")
+        for name, base_s, cur_s, ratio, regressed in compare(results, baseline['results']):
+            flag = "  REGRESSION" if regressed else ""
+            print(f"  {name:<34} {base_s * 1000:10.1f} -> {cur_s * 1000:10.1f} ms  x{ratio:.2f}{flag}")
+            if regressed:
+                regressions.append(name)
+    if args.save_baseline:
+        save(report, args.baseline)
+        print(f"Baseline saved: {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        raise SystemExit(1)
@@ -0,0 +1,175 @@
+"""
+cleaning.py
+===========
+Programmatic version of the `wrangle` cleaning step in
+Livestock_Emissions_Project.ipynb: turns a raw FAOSTAT "Emissions from
+Livestock" (GLE) extract into the cleaned Area / Year / Value / Continent /
+Area Code (ISO3) layout.
+
+Two entry points:
+
+  clean_raw(raw)            an in-memory extract (e.g. dataset/Cattle_CH4_dataset_2000_2021.csv)
+  clean_bulk(path)          a full Emissions-from-Livestock bulk download (all items,
+                            elements and years; hundreds of MB, .csv or .zip), streamed
+                            in chunks so memory stays bounded by the chunk size
+
+    python cleaning.py Emissions_livestock_E_All_Data_(Normalized).zip
+    python cleaning.py bulk.zip --item F1757 --element 72441 --start-year 2000
+
+ISO2 -> ISO3 and Continent come from the bundled dataset/countries.csv (one
+row per country in the cleaned dataset), so no pycountry lookups are needed and
+the result is identical to the notebook's output. Areas that are not in that
+table — FAOSTAT aggregates such as 'China', and states with partial coverage
+like 'Sudan (former)' or 'Serbia and Montenegro' — are skipped and reported.
+"""
+
+import argparse
+from functools import lru_cache
+
+import pandas as pd
+
+from data_store import CLEANED_CSV, PARQUET_AVAILABLE, STORE_PATH, to_store_frame
+
+RAW_CSV = "dataset/Cattle_CH4_dataset_2000_2021.csv"
+COUNTRIES_CSV = "dataset/countries.csv"
+
+CATTLE_ITEM_CODE = 'F1757'        # Item Code (CPC): Cattle
+CH4_TOTAL_ELEMENT_CODE = 72441    # Element Code: Livestock total (Emissions CH4)
+
+CLEAN_COLUMNS = ['Area', 'Year', 'Value', 'Continent', 'Area Code (ISO3)']
+
+# Only these columns are parsed from bulk files; everything else is skipped by the reader
+BULK_COLUMNS = ['Area Code (ISO2)', 'Area', 'Item Code (CPC)', 'Item', 'Element Code', 'Element', 'Year', 'Value']
+BULK_CHUNKSIZE = 200_000
+
+
+@lru_cache(maxsize=None)
+def load_countries(path=COUNTRIES_CSV):
+    """Country lookup table: Area, Area Code (ISO2), Area Code (ISO3), Continent."""
+    # keep_default_na=False: Namibia's ISO2 code is the literal string "NA"
+    return pd.read_csv(path, keep_default_na=False)
+
+
+def read_raw(path):
+    """Read a raw FAOSTAT GLE extract (BOM, fully quoted strings, ISO2 codes)."""
+    return pd.read_csv(path, encoding='utf-8-sig', keep_default_na=False, na_values={'Value': ['']},
+                       dtype={'Area Code (ISO2)': str, 'Item Code (CPC)': str})
+
+
+def _code_mask(column, codes):
+    """Rows whose code is in codes (one code, a list, or None for all)."""
+    if codes is None:
+        return pd.Series(True, index=column.index)
+    codes = [codes] if isinstance(codes, (str, int)) else codes
+    # Bulk files prefix code columns with an apostrophe ('F1757) to protect them from Excel
+    return column.astype(str).str.lstrip("'").isin([str(code) for code in codes])
+
+
+def clean_raw(raw, item_code=CATTLE_ITEM_CODE, element_code=CH4_TOTAL_ELEMENT_CODE, countries=None,
+              keep_labels=False):
+    """Clean a raw GLE frame into CLEAN_COLUMNS.
+
+    Returns (clean, skipped_areas). Rows are filtered to the requested item(s)
+    and element(s) when those columns are present (None keeps all of them), and
+    rows without a Value are dropped. keep_labels=True adds the Item and Element
+    names, for extracts that hold more than one series (emissions_tensor.py).
+    """
+    countries = load_countries() if countries is None else countries
+
+    if 'Item Code (CPC)' in raw.columns:
+        raw = raw[_code_mask(raw['Item Code (CPC)'], item_code)]
+    if 'Element Code' in raw.columns:
+        raw = raw[_code_mask(raw['Element Code'], element_code)]
+    raw = raw[pd.to_numeric(raw['Value'], errors='coerce').notna()]
+
+    # Match on ISO2 where FAOSTAT provides one, otherwise on the Area name
+    by_iso2 = countries.set_index('Area Code (ISO2)')
+    by_area = countries.set_index('Area')
+    iso2 = raw['Area Code (ISO2)'].astype(str) if 'Area Code (ISO2)' in raw.columns else pd.Series('', index=raw.index)
+    matched = iso2.isin(by_iso2.index)
+    area = iso2.map(by_iso2['Area']).where(matched, raw['Area'].where(raw['Area'].isin(by_area.index)))
+
+    skipped = sorted(raw.loc[area.isna(), 'Area'].unique())
+    keep = area.notna()
+    area = area[keep]
+    clean = pd.DataFrame({
+        'Area': area.values,
+        'Year': raw.loc[keep, 'Year'].astype(int).values,
+        'Value': raw.loc[keep, 'Value'].astype('float64').values,
+        'Continent': area.map(by_area['Continent']).values,
+        'Area Code (ISO3)': area.map(by_area['Area Code (ISO3)']).values,
+    })
+    if keep_labels:
+        clean.insert(1, 'Item', raw.loc[keep, 'Item'].values)
+        clean.insert(2, 'Element', raw.loc[keep, 'Element'].values)
+    return clean, skipped
+
+
+def stream_bulk(path, item_code=CATTLE_ITEM_CODE, element_code=CH4_TOTAL_ELEMENT_CODE,
+                start_year=None, end_year=None, chunksize=BULK_CHUNKSIZE, encoding='utf-8-sig',
+                keep_labels=False):
+    """Read a FAOSTAT GLE bulk file chunk by chunk and return its cleaned rows.
+
+    Only BULK_COLUMNS are parsed, and each chunk is filtered to the requested
+    items/elements (and year range) before anything is kept, so peak memory is
+    one chunk plus the filtered result. Returns (clean, skipped_areas).
+    """
+    countries = load_countries()
+    reader = pd.read_csv(path, encoding=encoding, chunksize=chunksize, keep_default_na=False,
+                         usecols=lambda col: col in BULK_COLUMNS, dtype=str)
+    pieces, skipped = [], set()
+    for chunk in reader:
+        if start_year is not None or end_year is not None:
+            years = pd.to_numeric(chunk['Year'], errors='coerce')
+            chunk = chunk[years.between(start_year or -1, end_year or 10_000)]
+        clean, chunk_skipped = clean_raw(chunk, item_code, element_code, countries, keep_labels)
+        pieces.append(clean)
+        skipped.update(chunk_skipped)
+
+    clean = pd.concat(pieces, ignore_index=True) if pieces else pd.DataFrame(columns=CLEAN_COLUMNS)
+    return clean, sorted(skipped)
+
+
+def clean_bulk(path, item_code=CATTLE_ITEM_CODE, element_code=CH4_TOTAL_ELEMENT_CODE,
+               start_year=None, end_year=None, chunksize=BULK_CHUNKSIZE, encoding='utf-8-sig',
+               csv_path=CLEANED_CSV, store_path=STORE_PATH):
+    """Stream one item/element of a bulk file into the cleaned CSV and typed Parquet store.
+
+    Returns (clean, skipped_areas).
+    """
+    countries = load_countries()
+    clean, skipped = stream_bulk(path, item_code, element_code, start_year, end_year, chunksize, encoding)
+
+    # Same row order as the notebook's output: FAOSTAT country order, then year
+    rank = {area: i for i, area in enumerate(countries['Area'])}
+    clean = (clean.assign(_rank=clean['Area'].map(rank))
+                  .sort_values(['_rank', 'Year'], kind='stable')
+                  .drop(columns='_rank')
+                  .reset_index(drop=True))
+
+    if csv_path:
+        clean.to_csv(csv_path, index=False)
+    if store_path and PARQUET_AVAILABLE:
+        # Written after the CSV so the store is never older than its source
+        to_store_frame(clean).to_parquet(store_path, index=False)
+    return clean, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream-clean a FAOSTAT Emissions-from-Livestock bulk file.")
+    parser.add_argument("path", help="bulk CSV or .zip as downloaded from FAOSTAT")
+    parser.add_argument("--item", default=CATTLE_ITEM_CODE, help=f"Item Code (CPC) to keep (default: {CATTLE_ITEM_CODE})")
+    parser.add_argument("--element", default=CH4_TOTAL_ELEMENT_CODE,
+                        help=f"Element Code to keep (default: {CH4_TOTAL_ELEMENT_CODE})")
+    parser.add_argument("--start-year", type=int, default=2000)
+    parser.add_argument("--end-year", type=int, default=None)
+    parser.add_argument("--encoding", default='utf-8-sig', help="file encoding (older bulk files are latin-1)")
+    parser.add_argument("--chunksize", type=int, default=BULK_CHUNKSIZE)
+    args = parser.parse_args()
+
+    clean, skipped = clean_bulk(args.path, args.item, args.element, args.start_year, args.end_year,
+                                args.chunksize, args.encoding)
+    if skipped:
+        print(f"Skipped {len(skipped)} areas not in {COUNTRIES_CSV}: {', '.join(skipped)}")
+    print(f"Wrote {len(clean)} rows for {clean['Area'].nunique()} countries to {CLEANED_CSV}"
+          + (f" and {STORE_PATH}" if PARQUET_AVAILABLE else ""))
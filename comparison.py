@@ -0,0 +1,123 @@
+"""
+comparison.py
+=============
+ARIMA vs Prophet comparison (Table 2 / model_comparison.csv), as a function
+of the countries to compare, so it can run for the paper's top emitters
+(paper_analysis.py) or just for countries whose data changed (ingest.py).
+
+Each country is split into a 2000-2016 training window and a 2017+ test
+window. ARIMA's (p, d, q) is chosen by AIC over a parallel order search
+(arima_search.py); Prophet uses changepoint_prior_scale=0.05.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from statsmodels.tsa.stattools import adfuller
+
+from arima_search import fit_many, select_orders
+from instrument import TRACE
+
+N_TRAIN = 17   # 2000-2016
+
+
+def _prophet_metrics(values, years, n_test):
+    from prophet import Prophet
+
+    prophet_df = pd.DataFrame({
+        'ds': pd.to_datetime(years, format='%Y'),
+        'y': values
+    })
+    prophet_train = prophet_df.iloc[:N_TRAIN]
+
+    prophet_model = Prophet(
+        changepoint_prior_scale=0.05,
+        seasonality_mode='additive',
+        yearly_seasonality=False,
+        weekly_seasonality=False,
+        daily_seasonality=False
+    )
+    with TRACE.fit('prophet'):
+        prophet_model.fit(prophet_train)
+
+    future = prophet_model.make_future_dataframe(periods=n_test, freq='YE')
+    forecast = prophet_model.predict(future)
+    prophet_pred = forecast['yhat'].values[-n_test:]
+
+    test_vals = values[N_TRAIN:]
+    return (mean_absolute_error(test_vals, prophet_pred),
+            np.sqrt(mean_squared_error(test_vals, prophet_pred)),
+            r2_score(values, prophet_model.predict(prophet_df[['ds']])['yhat'].values))
+
+
+def compare_countries(df, countries, max_pq=2, workers=None):
+    """Fit ARIMA and Prophet for each country; returns one dict of raw metrics per country."""
+    warnings.filterwarnings("ignore")
+
+    # ── Train/test split: train on 2000-2016, test on the remaining years ──
+    series = {}
+    for country in countries:
+        country_data = df[df['Area'] == country].sort_values('Year')
+        series[country] = (country_data['Value'].values, country_data['Year'].values)
+    train_series = {country: values[:N_TRAIN] for country, (values, _) in series.items()}
+
+    # ── ARIMA order search, all (country, p, d, q) candidates in parallel ──
+    # Use ADF test to determine differencing
+    d_by_country = {country: 0 if adfuller(train_vals, autolag='AIC')[1] < 0.05 else 1
+                    for country, train_vals in train_series.items()}
+    n_test = {country: len(values) - N_TRAIN for country, (values, _) in series.items()}
+    best_arima = {}
+    for horizon in sorted(set(n_test.values())):
+        group = {c: v for c, v in train_series.items() if n_test[c] == horizon}
+        best_arima.update(select_orders(group, d_by_country, max_pq=max_pq, n_forecast=horizon, workers=workers))
+
+    # In-sample fits of each chosen order on the full series (for R2), also in parallel
+    insample_fits = fit_many([(series[country][0], best_arima[country][0], 0) for country in countries], workers)
+    arima_insample = dict(zip(countries, insample_fits))
+
+    results = []
+    for country in countries:
+        values, years = series[country]
+        test_vals = values[N_TRAIN:]
+
+        # ── PROPHET ──────────────────────────────────────────────────
+        prophet_mae, prophet_rmse, prophet_r2 = _prophet_metrics(values, years, n_test[country])
+
+        # ── ARIMA ─────────────────────────────────────────────────────
+        # The order search already fit the chosen order on the training window; reuse its forecast
+        order, arima_train_fit = best_arima[country]
+        arima_pred = arima_train_fit['forecast']
+
+        results.append({
+            'country': country,
+            'order': order,
+            'arima_mae': mean_absolute_error(test_vals, arima_pred),
+            'arima_rmse': np.sqrt(mean_squared_error(test_vals, arima_pred)),
+            # In-sample R2 for ARIMA
+            'arima_r2': r2_score(values, arima_insample[country]['fittedvalues']),
+            'prophet_mae': prophet_mae,
+            'prophet_rmse': prophet_rmse,
+            'prophet_r2': prophet_r2,
+        })
+    return results
+
+
+def comparison_row(result):
+    """One model_comparison.csv row (rounded, as published) from a compare_countries result."""
+    return {
+        'Country': result['country'],
+        'ARIMA Order': str(result['order']),
+        'ARIMA MAE': round(result['arima_mae'], 3),
+        'ARIMA RMSE': round(result['arima_rmse'], 3),
+        'ARIMA R2': round(result['arima_r2'], 3),
+        'Prophet MAE': round(result['prophet_mae'], 3),
+        'Prophet RMSE': round(result['prophet_rmse'], 3),
+        'Prophet R2': round(result['prophet_r2'], 3),
+        'Better Model': better_model(result),
+    }
+
+
+def better_model(result):
+    return 'Prophet' if result['prophet_mae'] < result['arima_mae'] else 'ARIMA'
@@ -0,0 +1,152 @@
+"""
+data_store.py
+=============
+Single access point for the cleaned cattle CH4 dataset.
+
+Every Streamlit page and analysis script loads the data through this module:
+
+    from data_store import load_data, select
+    df = load_data()
+
+The first call parses dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv into a
+compact typed table and persists it next to the CSV as Parquet, so later loads
+(and later processes) skip CSV parsing entirely:
+
+  - Area, Continent, Area Code (ISO3) -> categorical
+  - Year                              -> int16
+  - Value                             -> float32 (dashboards) / float64 (paper)
+  - rows sorted by (Area, Year)
+
+The Parquet copy keeps Value at the source's float64 precision so the paper
+statistics are unchanged; load_data() narrows it to float32 in memory unless
+asked for value_dtype='float64'. The Parquet copy is rebuilt automatically
+whenever the CSV is newer than it.
+The returned DataFrame is shared between callers — treat it as read-only and
+.copy() before adding columns.
+"""
+
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+# ── Optional Parquet support ───────────────────────────────────────────────
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+CLEANED_CSV = "dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv"
+STORE_PATH = "dataset/Cattle_CH4_dataset_cleaned_2000_2021.parquet"
+
+CATEGORY_COLUMNS = ['Area', 'Continent', 'Area Code (ISO3)']
+COLUMN_DTYPES = {'Year': 'int16'}
+
+
+def is_fresh(store_path, csv_path):
+    """True if the Parquet store exists and is not older than its CSV source."""
+    if not os.path.exists(store_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(store_path) >= os.path.getmtime(csv_path)
+
+
+def to_store_frame(df):
+    """Apply the store's dtypes and (Area, Year) ordering to a cleaned frame.
+
+    Categories are sorted lexicographically, so groupby results come out in the
+    same order as they did on plain string columns.
+    """
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = pd.Categorical(df[col])
+    df = df.astype({col: dtype for col, dtype in COLUMN_DTYPES.items() if col in df.columns})
+    return df.sort_values(['Area', 'Year'], kind='stable').reset_index(drop=True)
+
+
+def build_store(csv_path=CLEANED_CSV, store_path=STORE_PATH):
+    """Parse the cleaned CSV, convert it to the typed layout and persist it."""
+    df = to_store_frame(pd.read_csv(csv_path))
+    if PARQUET_AVAILABLE:
+        try:
+            df.to_parquet(store_path, index=False)
+        except OSError:
+            # Read-only deployments still get the typed frame, just not the cache
+            pass
+    return df
+
+
+def source_mtime(csv_path=CLEANED_CSV):
+    """Modification time of the cleaned CSV (0 if absent); part of every cache key here,
+    so an in-place update (ingest.py) is picked up by a running app."""
+    try:
+        return os.path.getmtime(csv_path)
+    except OSError:
+        return 0.0
+
+
+@lru_cache(maxsize=2)
+def _load_store(csv_path, store_path, mtime):
+    if PARQUET_AVAILABLE and is_fresh(store_path, csv_path):
+        return pd.read_parquet(store_path)
+    return build_store(csv_path, store_path)
+
+
+@lru_cache(maxsize=4)
+def _load_typed(csv_path, store_path, value_dtype, mtime):
+    df = _load_store(csv_path, store_path, mtime)
+    if df['Value'].dtype != value_dtype:
+        df = df.astype({'Value': value_dtype})
+    return df
+
+
+def load_data(csv_path=CLEANED_CSV, store_path=STORE_PATH, value_dtype='float32'):
+    """Return the typed, (Area, Year)-sorted dataset, loading it once per process
+    (and again only after the CSV changes)."""
+    return _load_typed(csv_path, store_path, value_dtype, source_mtime(csv_path))
+
+
+@lru_cache(maxsize=2)
+def _indexed(mtime):
+    """The dataset with a sorted (Area, Year) MultiIndex plus an ISO3 -> Area lookup."""
+    df = load_data()
+    indexed = df.set_index(['Area', 'Year']).sort_index()
+    iso3_to_area = dict(zip(df['Area Code (ISO3)'], df['Area']))
+    return indexed, iso3_to_area
+
+
+def select(df, years=None, iso3=None, areas=None):
+    """Rows of df for a (start, end) year range and a set of ISO3 codes or Areas.
+
+    When df is the shared frame from load_data(), the lookup is a slice on the
+    pre-built (Area, Year) index instead of a boolean scan over every row.
+    Any other frame (e.g. a continent subset) is filtered with masks.
+    """
+    if df is load_data():
+        indexed, iso3_to_area = _indexed(source_mtime())
+        all_areas = indexed.index.levels[0]
+        wanted = set(all_areas)
+        if areas is not None:
+            wanted &= set(areas)
+        if iso3 is not None:
+            wanted &= {iso3_to_area[code] for code in iso3 if code in iso3_to_area}
+        # Preserve the store's (Area, Year) order whatever order the names came in
+        names = [a for a in all_areas if a in wanted]
+        if not names:
+            return df.iloc[0:0]
+        year_slice = slice(None) if years is None else slice(years[0], years[1])
+        out = indexed.loc[(names, year_slice), :].reset_index()
+        out['Area'] = out['Area'].cat.remove_unused_categories()
+        return out[df.columns]
+
+    mask = pd.Series(True, index=df.index)
+    if years is not None:
+        mask &= df['Year'].between(years[0], years[1])
+    if iso3 is not None:
+        mask &= df['Area Code (ISO3)'].isin(iso3)
+    if areas is not None:
+        mask &= df['Area'].isin(areas)
+    return df[mask]
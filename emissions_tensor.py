@@ -0,0 +1,290 @@
+"""
+emissions_tensor.py
+===================
+All livestock items and emission elements as one Area × Item × Element × Year
+array, instead of one cleaned table per species.
+
+    python emissions_tensor.py Emissions_livestock_E_All_Data_(Normalized).zip
+    python emissions_tensor.py bulk.zip --start-year 2000
+
+    from emissions_tensor import load_tensor, load_selection
+    tensor = load_tensor()
+    tensor.sel(item=['Cattle', 'Buffalo']).sum('item')      # vectorized slice + sum
+    df = load_selection('Sheep', 'Enteric fermentation (Emissions CH4)')
+
+The tensor is a dense float32 array (NaN = no FAOSTAT value) with a label index
+per axis, persisted as dataset/emissions_tensor.npz. 190 countries × ~20 items ×
+~10 elements × 22 years is a few MB, so every species sits in memory at the
+cost of roughly one extra cattle table.
+
+Without a bulk build, the tensor holds just the cattle series from the cleaned
+CSV (item 'Cattle', element 'Livestock total (Emissions CH4)'). That slice is
+always refreshed from the CSV when the CSV is newer, so ingest.py updates keep
+flowing through to a multi-species tensor.
+
+load_selection() returns one (item, element) series in the cleaned layout
+(Area / Year / Value / Continent / Area Code (ISO3)), so the dashboards and
+forecasting code work unchanged on any species. The default selection is the
+shared data_store frame itself, keeping its indexed select() fast path.
+
+FAOSTAT items include aggregates ('Cattle' = dairy + non-dairy, 'All Animals'),
+so summing over the item axis double counts unless the items are chosen first.
+"""
+
+import argparse
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from data_store import CLEANED_CSV, is_fresh, load_data, source_mtime, to_store_frame
+
+TENSOR_PATH = "dataset/emissions_tensor.npz"
+
+DEFAULT_ITEM = 'Cattle'
+DEFAULT_ELEMENT = 'Livestock total (Emissions CH4)'
+TOTAL_LABEL = 'Total'     # label of an axis after it has been summed
+
+AXES = ('area', 'item', 'element', 'year')
+AREA_COLUMNS = ['Area', 'Area Code (ISO3)', 'Continent']
+
+
+class EmissionsTensor:
+    """Dense (area, item, element, year) float32 array with a label index per axis.
+
+    areas is a frame of AREA_COLUMNS, one row per entry on the area axis; the
+    other axes are pandas Indexes. Instances are treated as immutable — sel()
+    and sum() return new tensors.
+    """
+
+    def __init__(self, values, areas, items, elements, years):
+        self.values = values
+        self.areas = areas.reset_index(drop=True)
+        self.items = pd.Index(items, name='Item')
+        self.elements = pd.Index(elements, name='Element')
+        self.years = pd.Index(years, name='Year')
+
+    def __repr__(self):
+        return (f"EmissionsTensor({len(self.areas)} areas × {len(self.items)} items × "
+                f"{len(self.elements)} elements × {len(self.years)} years)")
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # BUILD / PERSIST
+    # ══════════════════════════════════════════════════════════════════════════
+    @classmethod
+    def from_long(cls, long):
+        """Scatter a long frame (AREA_COLUMNS + Item, Element, Year, Value) into the array."""
+        areas = (long[AREA_COLUMNS].astype(str).drop_duplicates('Area')
+                 .sort_values('Area').reset_index(drop=True))
+        items = pd.Index(sorted(long['Item'].astype(str).unique()))
+        elements = pd.Index(sorted(long['Element'].astype(str).unique()))
+        years = pd.Index(np.sort(long['Year'].astype(int).unique()))
+
+        # One vectorized scatter: label -> position on every axis, then a fancy-index assignment
+        a = pd.Index(areas['Area']).get_indexer(long['Area'].astype(str))
+        i = items.get_indexer(long['Item'].astype(str))
+        e = elements.get_indexer(long['Element'].astype(str))
+        y = years.get_indexer(long['Year'].astype(int))
+        values = np.full((len(areas), len(items), len(elements), len(years)), np.nan, dtype='float32')
+        values[a, i, e, y] = long['Value'].to_numpy(dtype='float32')
+        return cls(values, areas, items, elements, years)
+
+    @classmethod
+    def from_cleaned(cls, df, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+        """Single-series tensor from a frame in the cleaned (one Value column) layout."""
+        return cls.from_long(df.assign(Item=item, Element=element))
+
+    def to_long(self):
+        """Every non-missing cell as a long frame (the inverse of from_long)."""
+        a, i, e, y = np.nonzero(~np.isnan(self.values))
+        long = self.areas.iloc[a].reset_index(drop=True)
+        long['Item'] = self.items[i]
+        long['Element'] = self.elements[e]
+        long['Year'] = self.years[y]
+        long['Value'] = self.values[a, i, e, y]
+        return long
+
+    def save(self, path=TENSOR_PATH):
+        """Write the array and its labels atomically (tempfile + rename)."""
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp, values=self.values,
+            **{f"area_{col}": self.areas[col].to_numpy(dtype=str) for col in AREA_COLUMNS},
+            items=self.items.to_numpy(dtype=str), elements=self.elements.to_numpy(dtype=str),
+            years=self.years.to_numpy(dtype='int16'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=TENSOR_PATH):
+        with np.load(path) as npz:
+            areas = pd.DataFrame({col: npz[f"area_{col}"] for col in AREA_COLUMNS})
+            return cls(npz['values'], areas, npz['items'], npz['elements'], npz['years'].astype(int))
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # SLICE / REDUCE
+    # ══════════════════════════════════════════════════════════════════════════
+    def sel(self, area=None, item=None, element=None, year=None, iso3=None):
+        """Subset by label. Each argument is one label or a list; year may also be a
+        (start, end) tuple. Axes are kept (length 1 for a single label)."""
+        def positions(index, labels):
+            labels = [labels] if np.isscalar(labels) else list(labels)
+            pos = index.get_indexer(labels)
+            return pos[pos >= 0]
+
+        area_pos = np.arange(len(self.areas))
+        if area is not None:
+            area_pos = positions(pd.Index(self.areas['Area']), area)
+        if iso3 is not None:
+            area_pos = np.intersect1d(area_pos, positions(pd.Index(self.areas['Area Code (ISO3)']), iso3))
+        item_pos = np.arange(len(self.items)) if item is None else positions(self.items, item)
+        element_pos = np.arange(len(self.elements)) if element is None else positions(self.elements, element)
+        if year is None:
+            year_pos = np.arange(len(self.years))
+        elif isinstance(year, tuple):
+            year_pos = np.flatnonzero((self.years >= year[0]) & (self.years <= year[1]))
+        else:
+            year_pos = positions(self.years, year)
+
+        values = self.values[np.ix_(area_pos, item_pos, element_pos, year_pos)]
+        return EmissionsTensor(values, self.areas.iloc[area_pos], self.items[item_pos],
+                               self.elements[element_pos], self.years[year_pos])
+
+    def sum(self, *axes):
+        """Sum over the named axes (NaN-aware; all-missing stays NaN). Summed axes
+        keep length 1 with the label TOTAL_LABEL."""
+        positions = tuple(AXES.index(axis) for axis in axes)
+        present = (~np.isnan(self.values)).any(axis=positions, keepdims=True)
+        values = np.where(present, np.nansum(self.values, axis=positions, keepdims=True), np.nan)
+        values = values.astype('float32')
+        areas = (pd.DataFrame({col: [TOTAL_LABEL] for col in AREA_COLUMNS}) if 'area' in axes else self.areas)
+        return EmissionsTensor(values, areas,
+                               [TOTAL_LABEL] if 'item' in axes else self.items,
+                               [TOTAL_LABEL] if 'element' in axes else self.elements,
+                               [TOTAL_LABEL] if 'year' in axes else self.years)
+
+    def series(self, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+        """(area × year) array for one item/element; None sums that axis instead."""
+        t = self.sum('item') if item is None else self.sel(item=item)
+        t = t.sum('element') if element is None else t.sel(element=element)
+        return t.values[:, 0, 0, :]
+
+    def frame(self, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+        """One item/element in the cleaned layout: Area, Year, Value, Continent, Area Code (ISO3)."""
+        block = self.series(item, element)
+        a, y = np.nonzero(~np.isnan(block))
+        df = pd.DataFrame({
+            'Area': self.areas['Area'].to_numpy()[a],
+            'Year': self.years.to_numpy()[y],
+            'Value': block[a, y].astype('float64'),
+            'Continent': self.areas['Continent'].to_numpy()[a],
+            'Area Code (ISO3)': self.areas['Area Code (ISO3)'].to_numpy()[a],
+        })
+        return to_store_frame(df)
+
+    def with_series(self, df, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+        """A copy with one item/element replaced by a cleaned-layout frame."""
+        long = self.to_long()
+        long = long[(long['Item'] != item) | (long['Element'] != element)]
+        return EmissionsTensor.from_long(pd.concat([long, df.assign(Item=item, Element=element)],
+                                                   ignore_index=True))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# LOADING
+# ══════════════════════════════════════════════════════════════════════════════
+def build_tensor(csv_path=CLEANED_CSV, tensor_path=TENSOR_PATH):
+    """Bring the persisted tensor up to date with the cleaned CSV (or create it from it)."""
+    cattle = pd.read_csv(csv_path)
+    if os.path.exists(tensor_path):
+        tensor = EmissionsTensor.load(tensor_path).with_series(cattle)
+    else:
+        tensor = EmissionsTensor.from_cleaned(cattle)
+    try:
+        tensor.save(tensor_path)
+    except OSError:
+        # Read-only deployments still get the tensor, just not the cache
+        pass
+    return tensor
+
+
+@lru_cache(maxsize=2)
+def _load_tensor(csv_path, tensor_path, mtime):
+    if is_fresh(tensor_path, csv_path):
+        return EmissionsTensor.load(tensor_path)
+    return build_tensor(csv_path, tensor_path)
+
+
+def tensor_mtime(tensor_path=TENSOR_PATH):
+    try:
+        return os.path.getmtime(tensor_path)
+    except OSError:
+        return 0.0
+
+
+def load_tensor(csv_path=CLEANED_CSV, tensor_path=TENSOR_PATH):
+    """The emissions tensor, loaded once per process (and again after either file changes)."""
+    return _load_tensor(csv_path, tensor_path, (source_mtime(csv_path), tensor_mtime(tensor_path)))
+
+
+def is_default(item, element):
+    return (item, element) == (DEFAULT_ITEM, DEFAULT_ELEMENT)
+
+
+@lru_cache(maxsize=8)
+def _selection(item, element, value_dtype, mtime):
+    df = load_tensor().frame(item, element)
+    return df.astype({'Value': value_dtype})
+
+
+def load_selection(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT, value_dtype='float32'):
+    """One item/element in the cleaned layout, cached per selection.
+
+    The default (cattle CH4) selection is data_store.load_data() itself.
+    """
+    if is_default(item, element):
+        return load_data(value_dtype=value_dtype)
+    return _selection(item, element, value_dtype, (source_mtime(), tensor_mtime()))
+
+
+@lru_cache(maxsize=8)
+def _selection_cube(item, element, mtime):
+    from aggregates import build_cube
+    return build_cube(load_selection(item, element, 'float64'))
+
+
+def load_selection_cube(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+    """Dashboard aggregate cube for one item/element (the persisted cube for the default)."""
+    from aggregates import load_cube
+    if is_default(item, element):
+        return load_cube()
+    return _selection_cube(item, element, (source_mtime(), tensor_mtime()))
+
+
+if __name__ == "__main__":
+    from cleaning import BULK_CHUNKSIZE, stream_bulk
+
+    parser = argparse.ArgumentParser(description="Build the multi-species emissions tensor from a FAOSTAT bulk file.")
+    parser.add_argument("path", help="Emissions-from-Livestock bulk CSV or .zip")
+    parser.add_argument("--items", nargs='*', default=None, help="Item Codes (CPC) to keep (default: all)")
+    parser.add_argument("--elements", nargs='*', default=None, help="Element Codes to keep (default: all)")
+    parser.add_argument("--start-year", type=int, default=2000)
+    parser.add_argument("--end-year", type=int, default=None)
+    parser.add_argument("--encoding", default='utf-8-sig')
+    parser.add_argument("--chunksize", type=int, default=BULK_CHUNKSIZE)
+    args = parser.parse_args()
+
+    long, skipped = stream_bulk(args.path, args.items, args.elements, args.start_year, args.end_year,
+                                args.chunksize, args.encoding, keep_labels=True)
+    if skipped:
+        print(f"Skipped {len(skipped)} areas not in dataset/countries.csv")
+    tensor = EmissionsTensor.from_long(long)
+    if os.path.exists(CLEANED_CSV):
+        # The cleaned CSV stays the source of truth for the default series
+        tensor = tensor.with_series(pd.read_csv(CLEANED_CSV))
+    tensor.save()
+    print(f"{tensor} written to {TENSOR_PATH} ({tensor.values.nbytes / 1e6:.1f} MB in memory)")
@@ -0,0 +1,361 @@
+"""
+fast_prophet.py
+===============
+In-process MAP fit of Prophet's model with NumPy/SciPy — no cmdstan, no temp
+files, no subprocess.
+
+    from fast_prophet import FastProphet, fit_batch
+    m = FastProphet(changepoint_prior_scale=0.05)          # same arguments as Prophet
+    m.fit(model_data)                                      # ds / y frame
+    forecast = m.predict(m.make_future_dataframe(periods=6, freq='YE'))
+
+    models = fit_batch({'Brazil': brazil_ts, 'India': india_ts})   # shared set-up for all
+
+Prophet fits the MAP of a Stan model with L-BFGS through cmdstanpy; for 22
+annual points the process start-up and file round-trip cost far more than the
+optimisation. FastProphet fits the same posterior:
+
+  y / y_scale ~ Normal(trend(t) + X beta, sigma_obs)
+  trend(t)    = (k + A(t) delta) t + (m + A(t) gamma),  gamma = -t_cp * delta
+  k, m ~ Normal(0, 5)    delta ~ Laplace(0, changepoint_prior_scale)
+  beta ~ Normal(0, seasonality_prior_scale)    sigma_obs ~ Half-Normal(0.5)
+
+with Prophet's scaling (absmax y, ds mapped to [0, 1]), changepoint placement
+and Fourier seasonality features, so the fitted parameters and
+forecasts match Prophet's to optimiser tolerance. The Laplace prior is made
+smooth by splitting delta into positive and negative parts under bounds, and
+the posterior is minimised with L-BFGS-B and an analytic gradient (k, m and
+beta are solved in closed form inside it — see _map_fit).
+
+predict() returns Prophet's columns (ds, trend, yhat, yhat_lower/upper,
+trend_lower/upper, additive_terms, multiplicative_terms, one column per
+seasonality, each with _lower/_upper), and draws the intervals the way
+Prophet does: future changepoints from a Poisson process with the historical
+rate, Laplace deltas scaled by the fitted mean |delta|, plus observation
+noise. Draws use a fixed seed, so a forecast is reproducible.
+
+fit_batch() sets the design up once for every group of series that share
+dates and hyperparameters (all countries here) — changepoints, Fourier
+features, the eigendecomposition of the ridge solve — and then runs one small
+optimisation per series: a couple of hundred countries a second on one core.
+
+model_cache.get_or_fit(..., backend='numpy') and batch_forecast.py --backend
+numpy swap it in for existing callers.
+
+Supported: linear and flat growth, additive seasonalities (auto/True/False/
+order), explicit changepoints, changepoint_range, n_changepoints,
+interval_width. Logistic growth, multiplicative seasonality, holidays, MCMC
+and other Prophet arguments raise ValueError — use Prophet for those.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+# Prophet's built-in seasonalities: period (days), default Fourier order
+SEASONALITIES = {'yearly': (365.25, 10), 'weekly': (7, 3), 'daily': (1, 4)}
+
+MAX_ITER = 20000
+
+
+def fourier_series(dates, period, order):
+    """Prophet's Fourier features: sin/cos pairs of days since the epoch."""
+    t = (pd.to_datetime(dates) - pd.Timestamp(1970, 1, 1)).dt.total_seconds().to_numpy(dtype='float64') / 86400.0
+    x = 2 * np.pi * np.outer(t, np.arange(1, order + 1)) / period
+    features = np.empty((len(t), 2 * order))
+    features[:, 0::2] = np.sin(x)
+    features[:, 1::2] = np.cos(x)
+    return features
+
+
+class FastProphet:
+    """Drop-in for the MAP-fit subset of Prophet used in this repo."""
+
+    def __init__(self, growth='linear', changepoints=None, n_changepoints=25, changepoint_range=0.8,
+                 yearly_seasonality='auto', weekly_seasonality='auto', daily_seasonality='auto',
+                 holidays=None, seasonality_mode='additive', seasonality_prior_scale=10.0,
+                 holidays_prior_scale=10.0, changepoint_prior_scale=0.05, mcmc_samples=0,
+                 interval_width=0.80, uncertainty_samples=1000, random_state=0, **unsupported):
+        if growth not in ('linear', 'flat'):
+            raise ValueError(f"FastProphet supports linear and flat growth, not '{growth}'")
+        if seasonality_mode != 'additive':
+            raise ValueError("FastProphet supports additive seasonality only")
+        if holidays is not None or mcmc_samples:
+            raise ValueError("FastProphet does not support holidays or MCMC")
+        if unsupported:
+            raise ValueError(f"FastProphet does not support {', '.join(sorted(unsupported))}")
+        self.growth = growth
+        # Explicit changepoint dates (e.g. breaks.prophet_changepoints) replace the even grid
+        self.specified_changepoints = None if changepoints is None else pd.Series(pd.to_datetime(changepoints))
+        self.n_changepoints = n_changepoints if changepoints is None else len(self.specified_changepoints)
+        self.changepoint_range = changepoint_range
+        self.seasonality_settings = {'yearly': yearly_seasonality, 'weekly': weekly_seasonality,
+                                     'daily': daily_seasonality}
+        self.seasonality_prior_scale = float(seasonality_prior_scale)
+        self.changepoint_prior_scale = float(changepoint_prior_scale)
+        self.interval_width = interval_width
+        self.uncertainty_samples = uncertainty_samples
+        self.random_state = random_state
+        self.history = None
+        self.params = {}
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # SET-UP — scaling, changepoints and seasonal features, as Prophet does them
+    # ══════════════════════════════════════════════════════════════════════════
+    def _seasonalities(self, ds):
+        """Enabled seasonalities {name: (period, order)} under Prophet's 'auto' rules."""
+        span = ds.max() - ds.min()
+        spacing = ds.sort_values().diff().dropna().min() if len(ds) > 1 else pd.Timedelta(0)
+        auto = {
+            'yearly': span >= pd.Timedelta(days=730),
+            'weekly': span >= pd.Timedelta(weeks=2) and spacing < pd.Timedelta(weeks=1),
+            'daily': span >= pd.Timedelta(days=2) and spacing < pd.Timedelta(days=1),
+        }
+        enabled = {}
+        for name, setting in self.seasonality_settings.items():
+            period, default_order = SEASONALITIES[name]
+            if setting == 'auto':
+                setting = auto[name]
+            if setting is True:
+                enabled[name] = (period, default_order)
+            elif setting is not False and int(setting) > 0:
+                enabled[name] = (period, int(setting))
+        return enabled
+
+    def _features(self, ds):
+        blocks = [fourier_series(ds, period, order) for period, order in self.seasonalities.values()]
+        return np.hstack(blocks) if blocks else np.empty((len(ds), 0))
+
+    def _setup(self, df):
+        history = df[df['y'].notna()].copy()
+        history['ds'] = pd.to_datetime(history['ds'])
+        history = history.sort_values('ds').reset_index(drop=True)
+        if len(history) < 2:
+            raise ValueError("Dataframe has less than 2 non-NaN rows.")
+        self.history = history
+        self.start = history['ds'].min()
+        self.t_scale = history['ds'].max() - self.start
+        self.y_scale = float(np.abs(history['y']).max()) or 1.0
+        self.t = ((history['ds'] - self.start) / self.t_scale).to_numpy()
+        self.y = history['y'].to_numpy(dtype='float64') / self.y_scale
+
+        # Changepoints: the given dates, or evenly spaced over the first changepoint_range
+        if self.specified_changepoints is not None:
+            changepoints = self.specified_changepoints.sort_values().reset_index(drop=True)
+            if len(changepoints) and (changepoints.min() < self.start or changepoints.max() > history['ds'].max()):
+                raise ValueError("Changepoints must fall within training data.")
+        else:
+            hist_size = int(np.floor(len(history) * self.changepoint_range))
+            n_changepoints = min(self.n_changepoints, hist_size - 1)
+            index = np.linspace(0, hist_size - 1, max(n_changepoints, 0) + 1).round().astype(int)
+            changepoints = history['ds'].iloc[index].iloc[1:].reset_index(drop=True)
+        if len(changepoints) and self.growth == 'linear':
+            self.changepoints = changepoints
+            self.changepoints_t = ((self.changepoints - self.start) / self.t_scale).to_numpy()
+        else:
+            self.changepoints = pd.Series([], dtype='datetime64[ns]')
+            self.changepoints_t = np.array([0.0])       # Prophet's dummy changepoint
+
+        self.seasonalities = self._seasonalities(history['ds'])
+        self.X = self._features(history['ds'])
+        return self
+
+    def _design_key(self):
+        return (tuple(self.history['ds'].astype('int64')), tuple(self.seasonalities.items()),
+                tuple(self.changepoints_t), self.growth, self.changepoint_prior_scale,
+                self.seasonality_prior_scale)
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # FIT / PREDICT
+    # ══════════════════════════════════════════════════════════════════════════
+    def fit(self, df):
+        """Fit the MAP parameters to a ds / y frame; returns self, like Prophet."""
+        fit_batch({None: df}, models={None: self})
+        return self
+
+    def make_future_dataframe(self, periods, freq='D', include_history=True):
+        last = self.history['ds'].max()
+        dates = pd.date_range(start=last, periods=periods + 1, freq=freq)
+        dates = dates[dates > last][:periods]
+        if include_history:
+            dates = np.concatenate((np.array(self.history['ds']), np.array(dates)))
+        return pd.DataFrame({'ds': dates})
+
+    def _trend(self, t, deltas=None, changepoints_t=None):
+        k = self.params['k'][0, 0]
+        m = self.params['m'][0, 0]
+        if self.growth == 'flat':
+            return np.full(len(t), m)
+        deltas = self.params['delta'][0] if deltas is None else deltas
+        changepoints_t = self.changepoints_t if changepoints_t is None else changepoints_t
+        A = (t[:, None] >= changepoints_t[None, :])
+        return (k + A @ deltas) * t + (m + A @ (-changepoints_t * deltas))
+
+    def predict(self, df=None):
+        """Prophet's predict() columns for df (the history when None)."""
+        df = self.history[['ds']] if df is None else df
+        ds = pd.to_datetime(df['ds']).reset_index(drop=True)
+        t = ((ds - self.start) / self.t_scale).to_numpy()
+        trend = self._trend(t)
+
+        out = {'ds': ds, 'trend': trend * self.y_scale}
+        beta = self.params['beta'][0]
+        X = self._features(ds)
+        seasonal = {}
+        column = 0
+        for name, (_, order) in self.seasonalities.items():
+            width = 2 * order
+            seasonal[name] = X[:, column:column + width] @ beta[column:column + width] * self.y_scale
+            column += width
+        additive = sum(seasonal.values()) if seasonal else np.zeros(len(ds))
+
+        trend_lower = trend_upper = out['trend']
+        yhat = out['trend'] + additive
+        yhat_lower = yhat_upper = yhat
+        if self.uncertainty_samples:
+            trend_samples = self._sample_trend(t) * self.y_scale
+            rng = np.random.default_rng(None if self.random_state is None else self.random_state + 1)
+            noise = rng.normal(0, self.params['sigma_obs'][0, 0] * self.y_scale, trend_samples.shape)
+            yhat_samples = trend_samples + additive[None, :] + noise
+            q = [(1 - self.interval_width) / 2, 1 - (1 - self.interval_width) / 2]
+            trend_lower, trend_upper = np.quantile(trend_samples, q, axis=0)
+            yhat_lower, yhat_upper = np.quantile(yhat_samples, q, axis=0)
+
+        out.update({'yhat_lower': yhat_lower, 'yhat_upper': yhat_upper,
+                    'trend_lower': trend_lower, 'trend_upper': trend_upper,
+                    'additive_terms': additive, 'additive_terms_lower': additive,
+                    'additive_terms_upper': additive})
+        for name, values in seasonal.items():
+            out.update({name: values, f'{name}_lower': values, f'{name}_upper': values})
+        zeros = np.zeros(len(ds))
+        out.update({'multiplicative_terms': zeros, 'multiplicative_terms_lower': zeros,
+                    'multiplicative_terms_upper': zeros, 'yhat': yhat})
+        return pd.DataFrame(out)
+
+    def _sample_trend(self, t):
+        """(samples × len(t)) trend draws with new changepoints after the history.
+
+        Over each gap between consecutive future times, the number of new
+        changepoints is Poisson(S × gap) and their deltas Laplace(0, mean|delta|);
+        a changepoint at c with delta d adds d (t - c) to every later time.
+        """
+        n = self.uncertainty_samples
+        base = self._trend(t)
+        samples = np.repeat(base[None, :], n, axis=0)
+        if self.growth == 'flat':
+            return samples
+        future = np.unique(t[t > 1])
+        if len(future) == 0:
+            return samples
+
+        rng = np.random.default_rng(self.random_state)
+        edges = np.r_[1.0, future]
+        S = len(self.changepoints_t)
+        scale = np.mean(np.abs(self.params['delta'][0])) + 1e-8
+        counts = rng.poisson(S * np.diff(edges), size=(n, len(future)))
+        bins = np.repeat(np.arange(counts.size), counts.ravel())
+        gap = bins % len(future)
+        locations = edges[gap] + rng.random(len(bins)) * (edges[gap + 1] - edges[gap])
+        deltas = rng.laplace(0, scale, len(bins))
+        D = np.bincount(bins, deltas, counts.size).reshape(n, -1).cumsum(axis=1)
+        E = np.bincount(bins, deltas * locations, counts.size).reshape(n, -1).cumsum(axis=1)
+
+        position = np.searchsorted(future, t)            # index of each time among the future times
+        later = t > 1
+        samples[:, later] += D[:, position[later]] * t[later] - E[:, position[later]]
+        return samples
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# MAP OPTIMISATION — every series with the same design in one L-BFGS-B run
+# ══════════════════════════════════════════════════════════════════════════════
+def _map_fit(models):
+    """Fit models that share dates, changepoints, seasonal features and priors.
+
+    k, m and beta enter the mean linearly under Gaussian priors, so for given
+    deltas and sigma their optimum is a ridge solve; one eigendecomposition of
+    the prior-scaled design serves every series and every sigma. L-BFGS-B then
+    only sees delta+ / delta- (bounded at 0) and sigma, whose gradients are the
+    partial derivatives at the ridge optimum (envelope theorem). Without the
+    profiling, the nearly collinear Fourier columns of annual data make the
+    joint problem ill-conditioned enough to need thousands of iterations.
+    """
+    first = models[0]
+    t, X, cp = first.t, first.X, first.changepoints_t
+    Y = np.vstack([m.y for m in models])                    # (N × T)
+    N, T = Y.shape
+    flat = first.growth == 'flat'
+    S = 0 if flat else len(cp)                              # flat growth: deltas stay 0
+    tau = first.changepoint_prior_scale
+
+    # Smooth block: [k, m, beta] for linear growth, [m, beta] for flat
+    Z = np.column_stack(([] if flat else [t]) + [np.ones(T), X])
+    prior_sd = np.r_[[] if flat else [5.0], 5.0, np.full(X.shape[1], first.seasonality_prior_scale)]
+    eigenvalues, V = np.linalg.eigh((Z * prior_sd).T @ (Z * prior_sd))
+    project = (Z * prior_sd) @ V                            # (T × Q)
+    B = (t[:, None] >= cp[None, :S]) * (t[:, None] - cp[None, :S])   # trend = k t + m + B delta
+
+    def smooth(y, delta, sigma):
+        target = y - delta @ B.T
+        coef = (target @ project) / (eigenvalues + sigma[:, None] ** 2)
+        theta = (coef @ V.T) * prior_sd
+        return theta, target - theta @ Z.T
+
+    def objective(flat_x, y):
+        x = flat_x.reshape(len(y), 2 * S + 1)
+        dp, dm, sigma = x[:, :S], x[:, S:2 * S], x[:, -1]
+        theta, r = smooth(y, dp - dm, sigma)
+        rss = (r * r).sum(axis=1)
+        loss = (T * np.log(sigma) + rss / (2 * sigma ** 2) + ((theta / prior_sd) ** 2).sum(axis=1) / 2
+                + (dp + dm).sum(axis=1) / tau + 2 * sigma ** 2)
+        g_delta = (-r / sigma[:, None] ** 2) @ B
+        grad = np.empty_like(x)
+        grad[:, :S] = g_delta + 1 / tau
+        grad[:, S:2 * S] = -g_delta + 1 / tau
+        grad[:, -1] = T / sigma - rss / sigma ** 3 + 4 * sigma
+        return loss.sum(), grad.ravel()
+
+    # One small L-BFGS-B per series: a joint run over the stacked series would
+    # share one curvature estimate and stopping test across unrelated problems
+    x0 = np.zeros(2 * S + 1)
+    x0[-1] = 1.0                                            # Prophet's sigma_obs start
+    bounds = [(0.0, None)] * (2 * S) + [(1e-9, None)]
+    x = np.empty((N, 2 * S + 1))
+    converged = np.empty(N, dtype=bool)
+    options = {'maxiter': MAX_ITER, 'maxfun': MAX_ITER * 2, 'ftol': 1e-12, 'gtol': 1e-6}
+    for i in range(N):
+        start = x0
+        for _ in range(3):      # a failed line search (ABNORMAL) is restarted from where it stopped
+            result = minimize(objective, start, args=(Y[i:i + 1],), jac=True, method='L-BFGS-B',
+                              bounds=bounds, options=options)
+            if result.success:
+                break
+            start = result.x
+        x[i], converged[i] = result.x, result.success
+    delta = x[:, :S] - x[:, S:2 * S]
+    theta, _ = smooth(Y, delta, x[:, -1])
+    if flat:
+        theta = np.column_stack([np.zeros(N), theta])
+        delta = np.zeros((N, len(cp)))
+    for i, model in enumerate(models):
+        model.params = {'k': theta[i, None, 0:1], 'm': theta[i, None, 1:2], 'delta': delta[i, None, :],
+                        'sigma_obs': x[i, None, -1:], 'beta': theta[i, None, 2:]}
+        model.converged = bool(converged[i])
+
+
+def fit_batch(series, models=None, **params):
+    """Fit one FastProphet per ds / y frame in `series` ({name: frame}).
+
+    Series with identical dates (and therefore identical changepoints and
+    seasonal features) share one design set-up. Returns {name: fitted model}.
+    """
+    models = dict(models or {})
+    for name, df in series.items():
+        models.setdefault(name, FastProphet(**params))._setup(df)
+
+    groups = {}
+    for name, model in models.items():
+        groups.setdefault(model._design_key(), []).append(model)
+    for group in groups.values():
+        _map_fit(group)
+    return models
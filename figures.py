@@ -0,0 +1,216 @@
+"""
+figures.py
+==========
+Per-selection Plotly figures for the dashboard pages.
+
+    from figures import continent_trend, country_lines, extremes, continent_top
+    st.plotly_chart(continent_trend(item, element, 'Africa'))
+    st.plotly_chart(country_lines(item, element, (2005, 2015), ['BRA', 'IND']))
+
+The continent, top/bottom-5 and top-10-per-continent charts used to add a
+trace for every group to one figure and toggle visibility from a Plotly
+dropdown, so every rerun serialized (and the browser drew) all of them. Here
+the group is picked with a Streamlit selectbox and each figure holds only the
+selected group's traces, drawn with Scattergl (WebGL).
+
+Figures are built once per (item, element, group) per process and shared by
+every session; the cache key includes the data files' mtimes, so an ingest
+or tensor rebuild is picked up on the next rerun. Streamlit serializes the
+figure it is given on every call, so the built Figure is what is cached —
+rebuilding one from cached JSON costs about as much as building it.
+
+The year-range / country line chart of the Global and Africa pages runs in a
+Streamlit fragment, so moving its widgets reruns only the chart. Its figure
+comes from the memory-mapped years × countries matrix (wide_matrix.py) and
+is cached by (year range, sorted ISO3 set), so an interaction is one array
+slice — or a cache hit when that range and set were drawn before.
+
+The structural-break chart draws one country's series, its piecewise-linear
+fit and its break years from breaks.load_segments (all countries segmented
+once per data version).
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import plotly.graph_objects as go
+
+from aggregates import top_areas
+from breaks import load_segments
+from data_store import select, source_mtime
+from emissions_tensor import is_default, load_selection, load_selection_cube, tensor_mtime
+from wide_matrix import load_matrix
+
+YEARS_LABEL = "(2000-2021)"
+
+
+def _version():
+    return source_mtime(), tensor_mtime()
+
+
+def series_label(item, element):
+    """The selection's name in titles: 'Cattle CH4' for the default series."""
+    return "Cattle CH4" if is_default(item, element) else f"{item} — {element}"
+
+
+def _line(x, y, name):
+    return go.Scattergl(x=x, y=y, name=name, mode='lines')
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# GROUPS — the options of each selector
+# ══════════════════════════════════════════════════════════════════════════════
+def continents(item, element):
+    """Continents in the order of the precomputed continent/year table."""
+    return load_selection_cube(item, element)['continent_year']['Continent'].unique().tolist()
+
+
+def top_continents(item, element, n=10):
+    return top_areas(load_selection_cube(item, element)['area_totals'], 'Continent Rank', n,
+                     'Continent')['Continent'].unique().tolist()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# FIGURES — one per selection, cached
+# ══════════════════════════════════════════════════════════════════════════════
+@lru_cache(maxsize=32)
+def _continent_trend(item, element, continent, version):
+    table = load_selection_cube(item, element)['continent_year']
+    rows = table[table['Continent'] == continent]
+    fig = go.Figure(_line(rows['Year'], rows['Value'], continent))
+    fig.update_layout(
+        title=f'Average {series_label(item, element)} Emissions in {continent} {YEARS_LABEL}',
+        xaxis_title='Year',
+        yaxis_title='Emissions (kt)',
+    )
+    return fig
+
+
+def continent_trend(item, element, continent):
+    """Yearly average emissions of one continent."""
+    return _continent_trend(item, element, continent, _version())
+
+
+@lru_cache(maxsize=32)
+def _subregion_trend(item, element, continent, version):
+    table = load_selection_cube(item, element)['subregion_year']
+    rows = table[table['Continent'] == continent]
+    fig = go.Figure([_line(group['Year'], group['Value'], subregion)
+                     for subregion, group in rows.groupby('Sub-region', sort=True)])
+    fig.update_layout(
+        title=f'Average {series_label(item, element)} Emissions by Sub-region of {continent} {YEARS_LABEL}',
+        xaxis_title='Year',
+        yaxis_title='Emissions (kt)',
+        legend_title_text='Sub-region (UN M49)',
+    )
+    return fig
+
+
+def subregion_trend(item, element, continent):
+    """Yearly average emissions of every UN M49 sub-region of one continent."""
+    return _subregion_trend(item, element, continent, _version())
+
+
+@lru_cache(maxsize=32)
+def _extremes(item, element, which, n, version):
+    rank = 'Global Rank' if which == 'Top' else 'Global Rank Asc'
+    countries = top_areas(load_selection_cube(item, element)['area_totals'], rank, n)['Area']
+    # Slice the selected countries' series out of the indexed store
+    rows = select(load_selection(item, element), areas=countries)
+    fig = go.Figure([_line(rows.loc[rows['Area'] == country, 'Year'],
+                           rows.loc[rows['Area'] == country, 'Value'], country)
+                     for country in countries])
+    fig.update_layout(xaxis_title='Year',
+                      yaxis_title='Emissions (kt)',
+                      legend_title_text='Country',
+                      template='plotly_white',
+                      title=f'{series_label(item, element)} Emissions for {which} {n} Countries Worldwide {YEARS_LABEL}')
+    return fig
+
+
+def extremes(item, element, which='Top', n=5):
+    """The n highest ('Top') or lowest ('Bottom') emitters by total emissions."""
+    return _extremes(item, element, which, n, _version())
+
+
+@lru_cache(maxsize=32)
+def _continent_top(item, element, continent, n, version):
+    ranked = top_areas(load_selection_cube(item, element)['area_totals'], 'Continent Rank', n, 'Continent')
+    countries = ranked.loc[ranked['Continent'] == continent, 'Area']
+    rows = select(load_selection(item, element), areas=countries)
+    fig = go.Figure([_line(rows.loc[rows['Area'] == country, 'Year'],
+                           rows.loc[rows['Area'] == country, 'Value'], f'{country} - {continent}')
+                     for country in countries])
+    fig.update_layout(
+        title=f"Top {n} Countries' {series_label(item, element)} Emissions in {continent} {YEARS_LABEL}",
+        xaxis_title="Year",
+        yaxis_title="Emissions (kt)",
+        template="plotly_white"
+    )
+    return fig
+
+
+def continent_top(item, element, continent, n=10):
+    """The n highest emitters of one continent (by mean annual emissions)."""
+    return _continent_top(item, element, continent, n, _version())
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# COUNTRY LINES — the widget-driven chart, keyed by (year range, ISO3 set)
+# ══════════════════════════════════════════════════════════════════════════════
+@lru_cache(maxsize=8)
+def _year_arrays(item, element, version):
+    """(years, row of each ISO3, Area names, countries × years values), countries in ISO3 order."""
+    df = load_selection(item, element)
+    names = dict(zip(df['Area Code (ISO3)'].astype(str), df['Area'].astype(str)))
+    years, iso3, X = load_matrix(item, element)
+    rows = {code: i for i, code in enumerate(iso3.tolist())}
+    return years, rows, [names[code] for code in iso3.tolist()], X.T
+
+
+@lru_cache(maxsize=256)
+def _country_lines(item, element, years, iso3, version):
+    year_values, rows, areas, values = _year_arrays(item, element, version)
+    # Legend in Area order, as the store sorts the countries
+    selected = sorted((rows[code] for code in iso3 if code in rows), key=areas.__getitem__)
+    first, last = np.searchsorted(year_values, years[0]), np.searchsorted(year_values, years[1], side='right')
+    if not selected or first == last:
+        return None
+    x = year_values[first:last]
+    fig = go.Figure([_line(x, values[row, first:last], areas[row]) for row in selected])
+    fig.update_layout(xaxis_title='Year', yaxis_title='Value', legend_title_text='Area')
+    return fig
+
+
+def country_lines(item, element, years, iso3):
+    """One line per selected country over a (start, end) year range; None if nothing matches."""
+    return _country_lines(item, element, (int(years[0]), int(years[1])), tuple(sorted(set(iso3))), _version())
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# STRUCTURAL BREAKS — breaks.py's segmentation of one country
+# ══════════════════════════════════════════════════════════════════════════════
+def break_countries(item, element):
+    """ISO3 codes of the countries with a complete series (the ones breaks.py segments)."""
+    return load_segments(item, element)[1].tolist()
+
+
+@lru_cache(maxsize=64)
+def _break_trend(item, element, iso3, version):
+    years, codes, X, found, fitted, _ = load_segments(item, element)
+    rows = np.flatnonzero(codes == iso3)
+    if not len(rows):
+        return None
+    row = rows[0]
+    fig = go.Figure([_line(years, X[:, row], 'Value'), _line(years, fitted[:, row], 'Piecewise trend')])
+    fig.data[1].line.dash = 'dash'
+    for start in found[row]:
+        fig.add_vline(x=years[start] - 0.5, line_dash='dot', line_color='grey',
+                      annotation_text=str(int(years[start])))
+    fig.update_layout(xaxis_title='Year', yaxis_title='Value')
+    return fig
+
+
+def break_trend(item, element, iso3):
+    """One country's series with its piecewise-linear fit and break years; None if not segmented."""
+    return _break_trend(item, element, iso3, _version())
@@ -0,0 +1,135 @@
+"""
+fit_pool.py
+===========
+Long-lived, pre-warmed process pool for live forecasts, shared by every
+Streamlit session in the server process.
+
+    import fit_pool
+    fit_pool.start()                                  # at app start-up: warm in the background
+    rows = fit_pool.forecast('Brazil', 'BRA', model_data, periods=6)
+
+A cold Prophet fit pays for importing prophet / cmdstanpy / sklearn and for
+cmdstan loading the Stan model on its first run, so the first Forecast click
+on a fresh container used to take several times longer than the next ones.
+The pool's workers do all of that in their initializer — including one tiny
+throwaway fit — as soon as start() is called, and then stay up: every later
+fit from any session runs in an already warm process. The Streamlit process
+itself never imports the forecasting stack.
+
+Fits go through batch_forecast.forecast_country, so they read and write the
+shared on-disk model cache and return the same rows as the precomputed
+forecast table (with y, yhat and the MAE / RMSE / R2 metrics).
+
+FIT_POOL_WORKERS sets the pool size (default: up to 2 — live fits are one
+country at a time; batch runs use their own pool). Workers are started by a
+forkserver (spawn where there is none), never forked from the Streamlit
+server: its other threads may hold locks a forked child would inherit
+locked. A forkserver or spawned child re-runs the parent's main module, and
+under Streamlit that is the page script itself, so __main__ is hidden from
+the workers while they start (_plain_main). If the pool dies (e.g. a worker
+is killed), the next call starts a fresh one.
+"""
+
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+WORKERS = int(os.environ.get("FIT_POOL_WORKERS", min(2, os.cpu_count() or 1)))
+_MP_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                                          else 'spawn')
+
+_lock = threading.Lock()
+_pool = None
+_warm = []          # one future per worker, done once that worker is warm
+
+
+def _warm_worker():
+    """Pool initializer: import the forecasting stack and run one throwaway fit."""
+    import numpy as np
+    import pandas as pd
+
+    from batch_forecast import _worker_init
+    from model_cache import BACKEND
+
+    _worker_init()
+    import sklearn.metrics  # noqa: F401  (used by every forecast_country call)
+
+    # A tiny fit exercises the whole path once: backend import, Stan model load, optimizer
+    warmup = pd.DataFrame({'ds': pd.date_range('2000-01-01', periods=8, freq='YS'),
+                           'y': np.linspace(1.0, 2.0, 8)})
+    if BACKEND == 'numpy':
+        from fast_prophet import FastProphet as Model
+    else:
+        from prophet import Prophet as Model
+    Model().fit(warmup)
+
+
+def _ready():
+    return os.getpid()
+
+
+@contextmanager
+def _plain_main():
+    """An empty __main__ while workers start, so they do not re-run the calling script."""
+    caller = sys.modules['__main__']
+    stub = types.ModuleType('__main__')
+    sys.modules['__main__'] = stub
+    try:
+        yield
+    finally:
+        # Streamlit installs a new __main__ per script run; restore only our own swap
+        if sys.modules['__main__'] is stub:
+            sys.modules['__main__'] = caller
+
+
+def start(workers=None):
+    """The shared pool, created and warming in the background on the first call."""
+    global _pool, _warm
+    with _lock:
+        if _pool is None:
+            n_workers = workers or WORKERS
+            with _plain_main():
+                _pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=_MP_CONTEXT,
+                                            initializer=_warm_worker)
+                # Submitting one no-op per worker makes the pool start (and warm) them all now,
+                # so no worker is started later, outside _plain_main
+                _warm = [_pool.submit(_ready) for _ in range(n_workers)]
+        return _pool
+
+
+def warm_workers():
+    """Number of workers that have finished warming up."""
+    return sum(1 for future in _warm if future.done() and not future.exception())
+
+
+def shutdown():
+    global _pool, _warm
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _warm = None, []
+
+
+atexit.register(shutdown)
+
+
+def submit(fn, *args):
+    """Run fn(*args) in the pool; returns a Future."""
+    return start().submit(fn, *args)
+
+
+def forecast(country, iso3, model_data, periods, params=None):
+    """Fit (or load from the model cache) one country in the pool and return its forecast rows."""
+    from batch_forecast import forecast_country
+
+    try:
+        return submit(forecast_country, country, iso3, model_data, periods, params).result()
+    except BrokenProcessPool:
+        shutdown()
+        return submit(forecast_country, country, iso3, model_data, periods, params).result()
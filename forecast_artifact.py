@@ -0,0 +1,154 @@
+"""
+forecast_artifact.py
+====================
+Versioned on-disk forecast artifact: one Arrow IPC file, memory-mapped by
+every reader.
+
+    from forecast_artifact import open_artifact
+    artifact = open_artifact('dataset/forecasts.arrow')
+    rows = artifact.frame('Brazil', max_horizon=10)     # history + 10 future years
+    artifact.metadata['created'], artifact.keys()[:3]
+
+batch_forecast.py writes the batch table through write_artifact(); the
+Future Prediction App, the forecast service and hierarchy.py read it back
+through open_artifact(). The file is uncompressed Arrow IPC (Feather v2), so
+opening it maps the file instead of reading and parsing it — Parquet or CSV
+would decode every column of every country first. The rows are sorted by
+country with the history first, and the schema metadata holds an index of
+each country's (offset, history rows, future rows); one country's forecast is
+a zero-copy slice of the mapped columns, however many countries and horizons
+the file holds. Only the handful of rows handed to pandas are materialized.
+
+Schema metadata:
+
+  format, version    FORMAT / FORMAT_VERSION; a reader refuses other versions,
+                     so a format change means a batch re-run, never a misread
+  key                column(s) the rows are grouped by (Area for country forecasts)
+  index              JSON {key: [offset, history rows, future rows]}
+  created            UTC time the artifact was written
+  + anything the writer adds (item, element, horizon, ...)
+
+The batch table's columns are described in batch_forecast.py; each row also
+carries the fitting model ('Model') and a hash of its hyperparameters
+('Config', model_cache.config_hash).
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+FORMAT = "livestock-emissions-forecast"
+FORMAT_VERSION = 1
+KEY_SEPARATOR = " / "       # joins multi-column keys, e.g. 'Continent / Africa'
+
+
+def _keys(table, key):
+    if len(key) == 1:
+        return table[key[0]].astype(str)
+    return table[key].astype(str).agg(KEY_SEPARATOR.join, axis=1)
+
+
+def write_artifact(table, path, key=('Area',), **metadata):
+    """Write a forecast table (with a 'horizon' column) as a versioned Arrow IPC file.
+
+    Rows are regrouped by key, keeping their order within each group; string
+    columns are dictionary-encoded. The file is replaced atomically, so
+    readers that have the old one mapped keep a consistent view.
+    """
+    key = [key] if isinstance(key, str) else list(key)
+    keys = _keys(table, key)
+    order = keys.reset_index(drop=True).sort_values(kind='stable').index
+    table = table.iloc[order].reset_index(drop=True)
+    keys = keys.iloc[order].reset_index(drop=True)
+
+    index = {}
+    future = table['horizon'].to_numpy() > 0
+    starts = keys.ne(keys.shift()).to_numpy().nonzero()[0]
+    ends = list(starts[1:]) + [len(table)]
+    for start, end in zip(starts, ends):
+        n_future = int(future[start:end].sum())
+        index[keys.iloc[start]] = [int(start), int(end - start - n_future), n_future]
+
+    # Categorical -> Arrow dictionary; object/str columns get the same treatment
+    strings = [c for c in table.columns if table[c].dtype == object or pd.api.types.is_string_dtype(table[c])]
+    table = table.astype({column: 'category' for column in strings})
+
+    arrow = pa.Table.from_pandas(table, preserve_index=False)
+    meta = {'format': FORMAT, 'version': str(FORMAT_VERSION), 'key': json.dumps(key),
+            'index': json.dumps(index), 'created': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+    meta.update({name: str(value) for name, value in metadata.items()})
+    arrow = arrow.replace_schema_metadata({**(arrow.schema.metadata or {}), **meta})
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f, pa.ipc.new_file(f, arrow.schema) as writer:
+            writer.write_table(arrow)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class ForecastArtifact:
+    """A memory-mapped forecast artifact; see open_artifact()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        meta = {k.decode(): v.decode() for k, v in (self.table.schema.metadata or {}).items()}
+        if meta.get('format') != FORMAT or meta.get('version') != str(FORMAT_VERSION):
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} forecast artifact")
+        self.key = json.loads(meta.pop('key'))
+        self.index = json.loads(meta.pop('index'))
+        meta.pop('pandas', None)
+        self.metadata = meta
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def keys(self):
+        return list(self.index)
+
+    def horizon(self, key):
+        """Future years stored for key (0 when key is absent)."""
+        return self.index[key][2] if key in self.index else 0
+
+    def rows(self, key, max_horizon=None):
+        """Arrow slice of key's history + first max_horizon future rows (all when None); None if absent."""
+        if key not in self.index:
+            return None
+        offset, n_history, n_future = self.index[key]
+        n_future = n_future if max_horizon is None else min(max_horizon, n_future)
+        return self.table.slice(offset, n_history + n_future)
+
+    def frame(self, key=None, max_horizon=None):
+        """rows() as a DataFrame, or the whole table when key is None."""
+        rows = self.table if key is None else self.rows(key, max_horizon)
+        return None if rows is None else rows.to_pandas()
+
+
+@lru_cache(maxsize=8)
+def _open(path, mtime):
+    return ForecastArtifact(path)
+
+
+def open_artifact(path):
+    """The artifact at path, mapped once per file modification time; None if missing or unreadable."""
+    if not ARROW_AVAILABLE:
+        return None
+    try:
+        return _open(path, os.path.getmtime(path))
+    except (OSError, ValueError, pa.ArrowInvalid):
+        return None
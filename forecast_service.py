@@ -0,0 +1,268 @@
+"""
+forecast_service.py
+===================
+Headless forecast HTTP service (asyncio, standard library only).
+
+    python forecast_service.py                       # http://127.0.0.1:8502, all CPUs for fits
+    python forecast_service.py --port 9000 --workers 2
+
+    curl localhost:8502/forecast/BRA?horizon=10
+    curl localhost:8502/forecast?iso3=BRA,IND,KEN&horizon=5
+    curl -X POST localhost:8502/forecast/bulk -d '{"iso3": ["BRA", "IND"], "horizon": 5}'
+    curl localhost:8502/health
+
+Endpoints (JSON in and out; item/element query parameters or body keys pick
+another livestock series, as in the dashboards):
+
+  GET  /forecast/<ISO3>?horizon=H     one country, historical + H future years
+  GET  /forecast?iso3=A,B,...&horizon=H
+  POST /forecast/bulk                 {"iso3": [...], "horizon": H}; all countries when iso3 is omitted
+  GET  /health                        counters: precomputed / memo hits, live fits, coalesced requests
+
+A forecast is answered, in order, from the precomputed batch table
+(batch_forecast.py), from this process's memo of earlier live forecasts, or
+by a live fit in a process pool. Live fits go through model_cache.get_or_fit,
+so a country fit before by the app or the batch is a disk-cache hit, and use
+the country's tuned hyperparameters (tuning.py) for the cattle CH4 series.
+
+Requests for a country that is already being fit wait for that fit instead
+of starting another (single-flight), so a burst of users asking for the same
+uncached country costs one Prophet fit. Live fits always forecast
+MAX_HORIZON years and are sliced per request, so requests with different
+horizons share the fit too.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from batch_forecast import MAX_HORIZON, _worker_init, country_forecast, country_series, forecast_country
+from data_store import source_mtime
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM, is_default, load_selection, tensor_mtime
+from tuning import params_for
+
+HOST = "127.0.0.1"
+PORT = 8502
+MEMO_SIZE = 512             # live forecasts kept in memory (country × series)
+MAX_BODY = 1 << 20          # request bodies above 1 MB are rejected
+
+FORECAST_COLUMNS = ['ds', 'horizon', 'y', 'yhat', 'yhat_lower', 'yhat_upper']
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _payload(rows, source):
+    """JSON-ready forecast for one country (NaN -> null, ds -> year)."""
+    first = rows.iloc[0]
+    table = rows[FORECAST_COLUMNS].copy()
+    table['ds'] = table['ds'].dt.year
+    records = [{k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in record.items()}
+               for record in table.astype(object).to_dict('records')]
+    return {
+        'area': str(first['Area']),
+        'iso3': str(first['Area Code (ISO3)']),
+        'source': source,
+        'metrics': {m: float(first[m]) for m in ('MAE', 'RMSE', 'R2')},
+        'forecast': records,
+    }
+
+
+class ForecastService:
+    """Forecast lookups with a live-fit process pool and single-flight coalescing."""
+
+    def __init__(self, workers=None):
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_worker_init)
+        self.workers = self.pool._max_workers
+        self.memo = OrderedDict()       # (item, element, iso3, version) -> full-horizon forecast rows
+        self.inflight = {}              # same key -> asyncio.Future of the running fit
+        self.stats = {'requests': 0, 'precomputed': 0, 'memo': 0, 'fits': 0, 'coalesced': 0, 'errors': 0}
+        self.started = time.time()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # FORECASTS
+    # ══════════════════════════════════════════════════════════════════════════
+    @staticmethod
+    def _series(item, element):
+        df = load_selection(item, element, 'float64')
+        if df.empty:
+            raise HTTPError(404, f"No {element} data for {item}")
+        return df
+
+    async def forecast(self, iso3, horizon, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+        """One country's forecast payload for `horizon` future years."""
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise HTTPError(400, f"horizon must be between 1 and {MAX_HORIZON}")
+        iso3 = iso3.upper()
+        df = self._series(item, element)
+        areas = df.loc[df['Area Code (ISO3)'] == iso3, 'Area']
+        if areas.empty:
+            raise HTTPError(404, f"Unknown ISO3 code '{iso3}'")
+        country = str(areas.iloc[0])
+
+        # 1. Precomputed batch table
+        rows = country_forecast(country, horizon, item, element)
+        if rows is not None:
+            self.stats['precomputed'] += 1
+            return _payload(rows, 'precomputed')
+
+        # 2. Earlier live forecast, or 3. a live fit (shared by concurrent requests)
+        key = (item, element, iso3, (source_mtime(), tensor_mtime()))
+        if key in self.memo:
+            self.memo.move_to_end(key)
+            self.stats['memo'] += 1
+            full, source = self.memo[key], 'memo'
+        elif key in self.inflight:
+            self.stats['coalesced'] += 1
+            full, source = await asyncio.shield(self.inflight[key]), 'fit'
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.inflight[key] = future
+            try:
+                params = params_for(country) if is_default(item, element) else None
+                self.stats['fits'] += 1
+                full = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, forecast_country, country, iso3, country_series(df, country), MAX_HORIZON, params)
+                future.set_result(full)
+            except BaseException as err:
+                future.set_exception(err)
+                future.exception()          # retrieved: waiters re-raise it, nothing is logged twice
+                raise
+            finally:
+                del self.inflight[key]
+            self.memo[key] = full
+            while len(self.memo) > MEMO_SIZE:
+                self.memo.popitem(last=False)
+            source = 'fit'
+        return _payload(full[full['horizon'] <= horizon], source)
+
+    async def bulk(self, codes, horizon, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+        """Forecasts for many countries at once; unknown codes are reported per code."""
+        if codes is None:
+            codes = self._series(item, element)['Area Code (ISO3)'].astype(str).unique().tolist()
+        results = await asyncio.gather(*(self.forecast(code, horizon, item, element) for code in codes),
+                                       return_exceptions=True)
+        out, errors = {}, {}
+        for code, result in zip(codes, results):
+            if isinstance(result, HTTPError):
+                errors[code.upper()] = str(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                out[result['iso3']] = result
+        return {'horizon': horizon, 'forecasts': out, 'errors': errors}
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # HTTP
+    # ══════════════════════════════════════════════════════════════════════════
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split('/') if p]
+        if method == 'POST':
+            try:
+                query.update(json.loads(body or b'{}'))
+            except (ValueError, TypeError):
+                raise HTTPError(400, "Body must be a JSON object")
+        try:
+            horizon = int(query.get('horizon', MAX_HORIZON))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "horizon must be an integer")
+        item = query.get('item', DEFAULT_ITEM)
+        element = query.get('element', DEFAULT_ELEMENT)
+
+        if parts == ['health'] and method == 'GET':
+            return {'status': 'ok', 'workers': self.workers, 'uptime_s': round(time.time() - self.started, 1),
+                    'memo_entries': len(self.memo), 'inflight': len(self.inflight), **self.stats}
+        if len(parts) == 2 and parts[0] == 'forecast' and parts[1] != 'bulk' and method == 'GET':
+            return await self.forecast(parts[1], horizon, item, element)
+        if parts == ['forecast'] and method == 'GET':
+            codes = query.get('iso3')
+            return await self.bulk(codes.split(',') if codes else None, horizon, item, element)
+        if parts == ['forecast', 'bulk'] and method == 'POST':
+            codes = query.get('iso3')
+            if codes is not None and not isinstance(codes, list):
+                raise HTTPError(400, "iso3 must be a list of codes")
+            return await self.bulk(codes, horizon, item, element)
+        if parts and parts[0] in ('forecast', 'health'):
+            raise HTTPError(405, f"{method} not allowed on {url.path}")
+        raise HTTPError(404, f"No route for {url.path}")
+
+    async def handle(self, reader, writer):
+        """One request per connection (Connection: close)."""
+        status, payload = 200, None
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            if len(request_line) != 3:
+                raise HTTPError(400, "Malformed request line")
+            method, target, _ = request_line
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0) or 0)
+            if length > MAX_BODY:
+                raise HTTPError(413, "Request body too large")
+            body = await reader.readexactly(length) if length else b''
+            self.stats['requests'] += 1
+            payload = await self.route(method.upper(), target, body)
+        except HTTPError as err:
+            status, payload = err.status, {'error': str(err)}
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as err:
+            status, payload = 400, {'error': str(err) or "Malformed request"}
+        except Exception as err:
+            self.stats['errors'] += 1
+            status, payload = 500, {'error': f"{type(err).__name__}: {err}"}
+
+        data = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                f"Connection: close\r\n\r\n").encode()
+        try:
+            writer.write(head + data)
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Forecast service on http://{host}:{port} ({self.workers} fit workers)")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless forecast HTTP service.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes for live Prophet fits (default: all CPUs)")
+    args = parser.parse_args()
+
+    service = ForecastService(args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,61 @@
+"""
+geography.py
+============
+Geography dimension table: ISO3 -> Area -> Continent -> UN M49 sub-region.
+
+    from geography import with_geography
+    df = with_geography(load_data())            # adds Sub-region and Region
+    df.groupby(['Continent', 'Sub-region'], observed=True)['Value'].mean()
+
+dataset/countries.csv is the single source: besides the ISO2/ISO3 codes and
+FAOSTAT continent it holds every country's UN M49 sub-region ('Sub-region',
+e.g. Western Asia, Caribbean, Northern Europe) and, for African countries,
+the five sub-regions used by the Africa dashboard and the paper ('Region':
+East, Southern, North, West and Central Africa — M49's African sub-regions,
+with Zimbabwe counted in Southern Africa). Region is empty outside Africa.
+
+with_geography() joins on 'Area Code (ISO3)' through the categorical codes:
+the table is looked up once per distinct ISO3 and the result is broadcast to
+the rows with one NumPy take, so the columns come back categorical and no
+per-row Python mapping runs.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from cleaning import COUNTRIES_CSV, load_countries
+
+GEOGRAPHY_COLUMNS = ['Area Code (ISO3)', 'Area', 'Continent', 'Sub-region', 'Region']
+
+
+@lru_cache(maxsize=None)
+def load_geography(path=COUNTRIES_CSV):
+    """One row per country, every column categorical; Region is NaN outside Africa."""
+    geo = load_countries(path)[GEOGRAPHY_COLUMNS].copy()
+    geo['Region'] = geo['Region'].replace('', np.nan)
+    return geo.astype({column: 'category' for column in GEOGRAPHY_COLUMNS})
+
+
+def with_geography(df, columns=('Sub-region', 'Region'), path=COUNTRIES_CSV):
+    """df with the given geography columns added, joined on 'Area Code (ISO3)'.
+
+    Codes missing from the table get NaN.
+    """
+    geo = load_geography(path)
+    iso3 = df['Area Code (ISO3)']
+    if not isinstance(iso3.dtype, pd.CategoricalDtype):
+        iso3 = iso3.astype('category')
+
+    # Table row of every ISO3 category (-1 when unknown), then of every row
+    position = pd.Index(geo['Area Code (ISO3)'].astype(str)).get_indexer(iso3.cat.categories.astype(str))
+    codes = iso3.cat.codes.to_numpy()
+    rows = np.where(codes >= 0, position[codes], -1)
+    known = rows >= 0
+
+    added = {}
+    for column in columns:
+        column_codes = geo[column].cat.codes.to_numpy()[rows]
+        added[column] = pd.Categorical.from_codes(np.where(known, column_codes, -1), dtype=geo[column].dtype)
+    return df.assign(**added)
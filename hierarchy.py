@@ -0,0 +1,246 @@
+"""
+hierarchy.py
+============
+Coherent forecasts for the Area -> Sub-region -> Continent -> Global tree.
+
+    python hierarchy.py                              # MinT (shrinkage) reconciliation, 20 years
+    python hierarchy.py --method bottom_up --horizon 10
+    python hierarchy.py --backend numpy              # fit the aggregate series with fast_prophet
+
+    from hierarchy import forecast_hierarchy
+    table = forecast_hierarchy(method='mint_shrink')
+    table[(table['Level'] == 'Continent') & (table['horizon'] > 0)]
+
+Country forecasts come from the precomputed batch table (batch_forecast.py),
+or a batch run when it is missing or too short. Every aggregate node — each
+UN M49 sub-region (geography.py), each continent and the world total — is fit
+once on its summed history, about thirty extra fits. The whole tree is then
+reconciled in one linear-algebra pass through the sparse summing matrix S
+(nodes × countries, one row per node with a 1 for every country under it):
+
+  reconciled = S G yhat,    G = (S' W^-1 S)^-1 S' W^-1
+
+  bottom_up    G picks the country forecasts; aggregates are their sums
+  ols          W = I
+  wls          W = diag(in-sample residual variance of each node)   (MinT-diagonal)
+  mint_shrink  W = residual covariance shrunk towards its diagonal
+               (Schäfer–Strimmer intensity, as in Wickramasuriya et al. 2019)
+
+Every method returns forecasts that add up: each continent equals the sum of
+its sub-regions and countries, the world the sum of the continents. Levels
+are totals (kt), not the per-country means of the dashboard charts. Years a
+country has no data for count as zero in the sums.
+
+The table (dataset/forecasts_hierarchy.arrow, a forecast artifact keyed by
+Level / Node — forecast_artifact.py; other items/elements get the suffix on
+their batch table's name) has one row per node × date:
+
+  Level, Node                   Global / Continent / Sub-region / Area and the node's name
+  Continent                     the node's continent (empty for Global)
+  ds, horizon                   horizon 0 = historical, 1..H = future years
+  y                             observed total (NaN for future rows)
+  yhat_base                     the node's own forecast, before reconciliation
+  yhat                          the reconciled forecast
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from batch_forecast import MAX_HORIZON, PROPHET_PARAMS, forecast_path, load_forecasts, run_batch, write_forecasts
+from data_store import CLEANED_CSV
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM, TENSOR_PATH, is_default, load_selection
+from geography import with_geography
+
+GLOBAL_NODE = 'World'
+METHODS = ('bottom_up', 'ols', 'wls', 'mint_shrink')
+
+
+def hierarchy_path(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+    root, ext = os.path.splitext(forecast_path(item, element))
+    return f"{root}_hierarchy{ext}"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# TREE — nodes and the sparse summing matrix
+# ══════════════════════════════════════════════════════════════════════════════
+def summing_matrix(df):
+    """(nodes, S, areas) for the countries in df.
+
+    nodes is a frame (Level, Node, Continent) in S's row order — the world,
+    continents, sub-regions, then the countries in `areas` order; S is a CSR
+    matrix of shape (len(nodes), len(areas)).
+    """
+    geo = with_geography(df[['Area', 'Area Code (ISO3)', 'Continent']].drop_duplicates('Area'), ['Sub-region'])
+    geo = geo.sort_values('Area', key=lambda s: s.astype(str))
+    areas = geo['Area'].astype(str).to_numpy()
+    continent = geo['Continent'].astype(str).to_numpy()
+    # A country missing from the geography table stands in its continent's own sub-region
+    subregion = geo['Sub-region'].astype(str).where(geo['Sub-region'].notna(), continent).to_numpy()
+    n = len(areas)
+
+    blocks, frames = [], []
+    for level, labels, parents in (('Global', np.full(n, GLOBAL_NODE), np.full(n, '')),
+                                   ('Continent', continent, continent),
+                                   ('Sub-region', subregion, continent)):
+        codes, names = pd.factorize(labels, sort=True)
+        blocks.append(sparse.csr_matrix((np.ones(n), (codes, np.arange(n))), shape=(len(names), n)))
+        first = np.unique(codes, return_index=True)[1]
+        frames.append(pd.DataFrame({'Level': level, 'Node': names, 'Continent': parents[first]}))
+    blocks.append(sparse.identity(n, format='csr'))
+    frames.append(pd.DataFrame({'Level': 'Area', 'Node': areas, 'Continent': continent}))
+
+    nodes = pd.concat(frames, ignore_index=True)
+    return nodes, sparse.vstack(blocks, format='csr'), areas
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# RECONCILIATION
+# ══════════════════════════════════════════════════════════════════════════════
+def _variance(residuals):
+    """Per-node mean squared residual, floored: a node fit exactly (e.g. an all-zero
+    history) would otherwise make W singular."""
+    variance = (residuals ** 2).mean(axis=1)
+    return np.maximum(variance, 1e-12 * variance.max() + 1e-300)
+
+
+def shrink_covariance(residuals):
+    """Schäfer–Strimmer shrinkage of the (nodes × T) residual covariance towards its diagonal."""
+    x = residuals.T                                     # T × nodes, residuals taken as mean zero
+    T = len(x)
+    cov = x.T @ x / T
+    np.fill_diagonal(cov, _variance(residuals))
+    sd = np.sqrt(np.diag(cov))
+    xs = x / sd
+    corr = cov / np.outer(sd, sd)
+    # Variance of each sample correlation, off the diagonal only
+    v = ((xs ** 2).T @ (xs ** 2) - (xs.T @ xs) ** 2 / T) / (T * (T - 1))
+    np.fill_diagonal(v, 0.0)
+    np.fill_diagonal(corr, 0.0)
+    intensity = min(max(v.sum() / (corr ** 2).sum(), 0.0), 1.0)
+    shrunk = (1 - intensity) * cov
+    shrunk[np.diag_indices_from(shrunk)] = np.diag(cov)
+    return shrunk, intensity
+
+
+def reconcile(base, S, method='mint_shrink', residuals=None):
+    """Reconciled (nodes × columns) forecasts from base forecasts in S's row order.
+
+    residuals (nodes × T, in-sample actual - fitted) are needed by wls and
+    mint_shrink.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown reconciliation method '{method}' (expected one of {METHODS})")
+    n_nodes, n_bottom = S.shape
+    if method == 'bottom_up':
+        return S @ base[n_nodes - n_bottom:]
+    if method == 'ols':
+        W_inv_S = S.toarray()
+    else:
+        if residuals is None:
+            raise ValueError(f"'{method}' reconciliation needs in-sample residuals")
+        if method == 'wls':
+            W_inv_S = S.multiply(1 / _variance(residuals)[:, None]).toarray()
+        else:
+            W, _ = shrink_covariance(residuals)
+            W_inv_S = np.linalg.solve(W, S.toarray())
+    # G = (S' W^-1 S)^-1 S' W^-1, applied to every column at once
+    G = np.linalg.solve(S.T @ W_inv_S, W_inv_S.T)
+    return S @ (G @ base)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BASE FORECASTS
+# ══════════════════════════════════════════════════════════════════════════════
+def _country_forecasts(df, horizon, item, element, backend):
+    """Batch forecast rows for every country: the precomputed table, or a fresh batch run."""
+    source = CLEANED_CSV if is_default(item, element) else TENSOR_PATH
+    table = load_forecasts(forecast_path(item, element), source)
+    if table is None or table['horizon'].max() < horizon:
+        table = run_batch(df=df, horizon=horizon, tuned=is_default(item, element), backend=backend or 'stan')
+    return table[table['horizon'] <= horizon]
+
+
+def _fit_aggregates(series, horizon, backend):
+    """{name: yhat over history + horizon} for every aggregate ds/y frame, one fit each."""
+    from model_cache import BACKEND, get_or_fit
+
+    if (backend or BACKEND) == 'numpy':
+        from fast_prophet import fit_batch
+
+        models = fit_batch(series, **PROPHET_PARAMS)
+    else:
+        models = {name: get_or_fit(name, data, PROPHET_PARAMS, backend=backend) for name, data in series.items()}
+    return {name: model.predict(model.make_future_dataframe(periods=horizon, freq='YE'))['yhat'].to_numpy()
+            for name, model in models.items()}
+
+
+def base_forecasts(df, nodes, S, areas, horizon=MAX_HORIZON, item=DEFAULT_ITEM, element=DEFAULT_ELEMENT,
+                   backend=None):
+    """(ds, actual, base) for every node: actual is nodes × T, base nodes × (T + horizon)."""
+    wide = df.pivot_table(index='Area', columns='Year', values='Value', aggfunc='sum', observed=True)
+    wide = wide.reindex(index=areas).fillna(0.0)
+    actual = S @ wide.to_numpy(dtype='float64')
+
+    rows = _country_forecasts(df, horizon, item, element, backend)
+    country_yhat = rows.pivot_table(index='Area', columns='ds', values='yhat', observed=True).reindex(index=areas)
+    ds = country_yhat.columns
+
+    n_bottom = len(areas)
+    aggregates = nodes.iloc[:len(nodes) - n_bottom]
+    names = (aggregates['Level'] + ': ' + aggregates['Node']).tolist()
+    series = {name: pd.DataFrame({'ds': pd.to_datetime(wide.columns.astype(int), format='%Y'), 'y': values})
+              for name, values in zip(names, actual)}
+    fitted = _fit_aggregates(series, horizon, backend)
+
+    base = np.vstack([fitted[name] for name in names] + [country_yhat.to_numpy(dtype='float64')])
+    return ds, actual, base
+
+
+def forecast_hierarchy(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT, horizon=MAX_HORIZON, method='mint_shrink',
+                       backend=None):
+    """Reconciled forecasts for every node of the tree (the table described above)."""
+    df = load_selection(item, element, 'float64')
+    nodes, S, areas = summing_matrix(df)
+    ds, actual, base = base_forecasts(df, nodes, S, areas, horizon, item, element, backend)
+    T = actual.shape[1]
+    residuals = actual - base[:, :T]
+    reconciled = reconcile(base, S, method, residuals)
+
+    n_nodes, n_cols = base.shape
+    table = nodes.loc[nodes.index.repeat(n_cols)].reset_index(drop=True)
+    table['ds'] = np.tile(np.asarray(ds), n_nodes)
+    table['horizon'] = np.tile(np.r_[np.zeros(T), np.arange(1, n_cols - T + 1)].astype('int16'), n_nodes)
+    table['y'] = np.hstack([actual, np.full((n_nodes, n_cols - T), np.nan)]).ravel()
+    table['yhat_base'] = base.ravel()
+    table['yhat'] = reconciled.ravel()
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconciled Area / Sub-region / Continent / Global forecasts.")
+    parser.add_argument("--method", choices=METHODS, default='mint_shrink')
+    parser.add_argument("--horizon", type=int, default=MAX_HORIZON,
+                        help=f"years to forecast beyond the data (default: {MAX_HORIZON})")
+    parser.add_argument("--backend", choices=['stan', 'numpy'], default=None,
+                        help="fit backend (default: PROPHET_BACKEND, else Prophet/cmdstan)")
+    parser.add_argument("--item", default=DEFAULT_ITEM, help=f"livestock item (default: {DEFAULT_ITEM})")
+    parser.add_argument("--element", default=DEFAULT_ELEMENT, help=f"emission element (default: {DEFAULT_ELEMENT})")
+    args = parser.parse_args()
+
+    start = time.time()
+    table = forecast_hierarchy(args.item, args.element, args.horizon, args.method, args.backend)
+    path = hierarchy_path(args.item, args.element)
+    write_forecasts(table, path, key=('Level', 'Node'), item=args.item, element=args.element,
+                    horizon=args.horizon, method=args.method)
+
+    last = table[table['horizon'] == args.horizon]
+    top = last[last['Level'].isin(['Global', 'Continent'])].set_index('Node')[['yhat_base', 'yhat']]
+    print(f"{args.method} forecasts for {last['ds'].iloc[0].year} (kt):")
+    print(top.round(1).to_string())
+    print(f"\n{len(table[['Level', 'Node']].drop_duplicates())} nodes reconciled in {time.time() - start:.1f}s")
+    print(f"Written: {path}")
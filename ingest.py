@@ -0,0 +1,193 @@
+"""
+ingest.py
+=========
+Incremental ingestion of new or revised FAOSTAT years.
+
+    python ingest.py path/to/FAOSTAT_GLE_extract.csv
+    python ingest.py extract.csv --no-refit          # data only, skip model refits
+
+The extract is cleaned exactly as the notebook does it (cleaning.py). Only
+country-years that are new or whose Value changed are merged into the cleaned
+dataset; everything derived from it is then updated in place:
+
+  1. dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv  (+ its Parquet store)
+  2. the dashboard aggregate cube                      (dataset/cube/)
+     and the cattle slice of the emissions tensor       (dataset/emissions_tensor.npz)
+  3. dataset/modelling_data_2000_2021.csv              (years × ISO3 matrix, for the notebook)
+     and its memory-mapped float32 twin                 (dataset/wide/, wide_matrix.py)
+  4. the batch forecast table, for changed countries only
+  5. model_comparison.csv rows, for changed countries only
+
+A year that only some countries have so far (e.g. an extract with 2022 for a
+few of them) is merged, and reported as incomplete; the whole-panel analyses
+cut it from the end of their matrix until every country has it.
+
+The file names keep their 2000_2021 suffix so every reader keeps working when
+later years are appended.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from cleaning import CLEAN_COLUMNS, clean_raw, read_raw
+from data_store import CLEANED_CSV, build_store, load_data
+
+WIDE_CSV = "dataset/modelling_data_2000_2021.csv"
+COMPARISON_CSV = "model_comparison.csv"
+
+
+def upsert(current, incoming):
+    """Merge incoming cleaned rows into current.
+
+    Returns (updated, changes) where changes lists every new or revised
+    country-year with its old and new Value. Rows absent from incoming are kept.
+    """
+    merged = incoming.merge(current[['Area', 'Year', 'Value']], on=['Area', 'Year'],
+                            how='left', suffixes=('', ' (old)'))
+    is_new = merged['Value (old)'].isna()
+    is_revised = ~is_new & ~np.isclose(merged['Value'], merged['Value (old)'], rtol=0, atol=1e-9)
+    merged['Change'] = np.where(is_new, 'new', 'revised')
+    changes = merged[is_new | is_revised]
+
+    if changes.empty:
+        return current, changes
+
+    changed_keys = pd.MultiIndex.from_frame(changes[['Area', 'Year']])
+    keep = ~pd.MultiIndex.from_frame(current[['Area', 'Year']]).isin(changed_keys)
+    updated = pd.concat([current[keep], changes[CLEAN_COLUMNS]], ignore_index=True)
+
+    # Keep the file's existing country order (new countries go last), years ascending
+    area_order = list(pd.unique(current['Area']))
+    area_order += [a for a in pd.unique(changes['Area']) if a not in set(area_order)]
+    rank = {area: i for i, area in enumerate(area_order)}
+    updated = (updated.assign(_rank=updated['Area'].map(rank))
+                      .sort_values(['_rank', 'Year'], kind='stable')
+                      .drop(columns='_rank')
+                      .reset_index(drop=True))
+    return updated, changes[['Area', 'Year', 'Value (old)', 'Value', 'Change']]
+
+
+def build_wide(df):
+    """Years × ISO3 matrix with an avg_emission column, as in modelling_data_preparation.ipynb."""
+    wide = df.pivot(index='Year', columns='Area Code (ISO3)', values='Value')
+    wide.columns.name = None
+    wide.index = pd.to_datetime(wide.index, format='%Y')
+    wide.index.name = 'date'
+    wide['avg_emission'] = wide.mean(axis=1)
+    return wide
+
+
+def partial_years(df):
+    """{year: countries with data} for every year that not every country has."""
+    counts = df.groupby('Year')['Area'].nunique()
+    return counts[counts < df['Area'].nunique()].to_dict()
+
+
+def refresh_derived(df, csv_path=CLEANED_CSV):
+    """Rebuild the Parquet store, aggregate cube, tensor slice and wide matrices from the cleaned CSV."""
+    from aggregates import build_cube, write_cube
+    from emissions_tensor import build_tensor
+    from wide_matrix import build_matrix, matrix_path, write_matrix
+
+    build_store(csv_path)
+    write_cube(build_cube(df))
+    build_tensor(csv_path)
+    build_wide(df).to_csv(WIDE_CSV)
+    write_matrix(*build_matrix(df), matrix_path())
+
+
+def refit_forecasts(df, countries, workers=None):
+    """Replace the forecast-table rows of the given countries with fresh fits.
+
+    The refit uses the table's own mode (backend, break-seeded changepoints),
+    read from the artifact's metadata, and writes that metadata back.
+    """
+    from batch_forecast import FORECAST_PATH, read_forecasts, run_batch, write_forecasts
+    from forecast_artifact import open_artifact
+
+    table = read_forecasts()
+    if table is None:
+        return False
+    artifact = open_artifact(FORECAST_PATH)
+    metadata = {} if artifact is None else {k: v for k, v in artifact.metadata.items()
+                                             if k not in ('format', 'version', 'created')}
+    breaks = None
+    if metadata.get('changepoints') == 'breaks':
+        from breaks import load_breaks
+
+        breaks = load_breaks()
+    horizon = int(table['horizon'].max())
+    fresh = run_batch(df=df, countries=countries, horizon=horizon, workers=workers,
+                      backend=metadata.get('backend', 'stan'), breaks=breaks)
+    table = pd.concat([table[~table['Area'].isin(countries)], fresh], ignore_index=True)
+    write_forecasts(table.sort_values(['Area', 'ds'], kind='stable').reset_index(drop=True), **metadata)
+    return True
+
+
+def refit_comparison(df, countries, workers=None):
+    """Recompute model_comparison.csv rows for the changed countries it already contains."""
+    from comparison import compare_countries, comparison_row
+
+    if not os.path.exists(COMPARISON_CSV):
+        return []
+    table = pd.read_csv(COMPARISON_CSV)
+    affected = [c for c in table['Country'] if c in set(countries)]
+    if not affected:
+        return []
+    rows = {r['country']: comparison_row(r) for r in compare_countries(df, affected, workers=workers)}
+    for i, country in table['Country'].items():
+        if country in rows:
+            table.loc[i, list(rows[country])] = list(rows[country].values())
+    table.to_csv(COMPARISON_CSV, index=False)
+    return affected
+
+
+def ingest(raw_path, refit=True, workers=None, csv_path=CLEANED_CSV):
+    """Merge a raw FAOSTAT extract into the cleaned dataset and update everything downstream."""
+    incoming, skipped = clean_raw(read_raw(raw_path))
+    if skipped:
+        print(f"Skipped {len(skipped)} areas not in dataset/countries.csv: {', '.join(skipped)}")
+
+    current = pd.read_csv(csv_path)
+    updated, changes = upsert(current, incoming)
+    if changes.empty:
+        print("No new or revised country-years — nothing to do.")
+        return changes
+
+    counts = changes['Change'].value_counts()
+    changed_countries = list(pd.unique(changes['Area']))
+    print(f"{counts.get('new', 0)} new and {counts.get('revised', 0)} revised country-years "
+          f"across {len(changed_countries)} countries")
+
+    partial = {year: n for year, n in partial_years(updated).items() if year in set(changes['Year'])}
+    if partial:
+        # The whole-panel analyses cut these from the end until they are complete (wide_matrix.complete_panel)
+        n_countries = updated['Area'].nunique()
+        print("Warning: incomplete years — " + ", ".join(f"{year}: {n} of {n_countries} countries"
+                                                       for year, n in sorted(partial.items())))
+
+    updated.to_csv(csv_path, index=False)
+    refresh_derived(updated, csv_path)
+    print(f"Updated: {csv_path}, its Parquet store, dataset/cube/, the emissions tensor, {WIDE_CSV}")
+
+    if refit:
+        df = load_data(csv_path, value_dtype='float64')
+        if refit_forecasts(df, changed_countries, workers):
+            print(f"Refit forecasts for {len(changed_countries)} countries")
+        affected = refit_comparison(df, changed_countries, workers)
+        if affected:
+            print(f"Refit {COMPARISON_CSV} rows: {', '.join(affected)}")
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingest a raw FAOSTAT GLE extract.")
+    parser.add_argument("raw_path", help="raw FAOSTAT extract (CSV, as downloaded)")
+    parser.add_argument("--no-refit", action="store_true", help="update data only; skip forecast/comparison refits")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for refits (default: all CPUs)")
+    args = parser.parse_args()
+
+    ingest(args.raw_path, refit=not args.no_refit, workers=args.workers)
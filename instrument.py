@@ -0,0 +1,215 @@
+"""
+instrument.py
+=============
+Stage-level timing and profiling for the paper analysis scripts.
+
+    from instrument import TRACE
+    TRACE.start("paper_analysis.py", trace_path("paper_results.txt"))
+    TRACE.stage("descriptive_stats")          # closes the previous stage, opens this one
+    with TRACE.fit('prophet'):
+        m.fit(ts)
+    TRACE.finish()                            # writes paper_results_trace.json
+
+The trace is a JSON file next to the script's results file with, per stage:
+wall and CPU seconds, model fits by type (count and seconds), peak resident
+memory of the process and of its children (cmdstan, ARIMA workers) at the end
+of the stage. Totals per model type cover the whole run, so the dominant cost
+is one lookup and traces from different commits can be diffed.
+
+Library code reports fits through record_fit() (arima_search.py does this for
+fits done in worker processes); it is a no-op unless a trace was started, so
+the dashboards pay nothing.
+
+Optional hooks, switched on by environment variables:
+
+  PAPER_PROFILE=cprofile    one cProfile dump per stage, <trace>.<stage>.prof
+                            (python -m pstats / snakeviz)
+  PAPER_TRACEMALLOC=1       Python-heap peak per stage via tracemalloc (slower)
+
+For sampling profilers, every stage records its wall-clock start/end and the
+pid, so a py-spy profile (py-spy record --format speedscope -- python
+paper_analysis.py) can be cut into the same stages.
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# ── Optional peak-memory support (Unix only) ───────────────────────────────
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+# ru_maxrss is KiB on Linux and bytes on macOS
+_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def _peak_rss_mb(who='self'):
+    if not RESOURCE_AVAILABLE:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    return round(usage.ru_maxrss * _RSS_UNIT / 1e6, 1)
+
+
+def trace_path(results_path):
+    """paper_results.txt -> paper_results_trace.json (same directory)."""
+    return os.path.splitext(results_path)[0] + "_trace.json"
+
+
+class Trace:
+    """Timers for the stages of one script run. Inactive (and free) until start()."""
+
+    def __init__(self):
+        self.active = False
+
+    def start(self, script, path):
+        self.active = True
+        self.script = script
+        self.path = path
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.stages = []
+        self.fits = {}
+        self._current = None
+        self._profile = os.environ.get('PAPER_PROFILE', '').lower() == 'cprofile'
+        self._tracemalloc = os.environ.get('PAPER_TRACEMALLOC') == '1'
+        self._profiler = None
+        self._prof_paths = []
+        if self._tracemalloc:
+            tracemalloc.start()
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # STAGES
+    # ══════════════════════════════════════════════════════════════════════════
+    def stage(self, name):
+        """End the running stage (if any) and start timing `name`."""
+        if not self.active:
+            return
+        self._end_stage()
+        self._current = {
+            'name': name,
+            'started_at': time.time(),
+            '_wall0': time.perf_counter(),
+            '_cpu0': time.process_time(),
+            'fits': {},
+        }
+        if self._tracemalloc:
+            tracemalloc.reset_peak()
+        if self._profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _end_stage(self):
+        stage = self._current
+        if stage is None:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+            path = f"{os.path.splitext(self.path)[0]}.{stage['name']}.prof"
+            self._profiler.dump_stats(path)
+            self._prof_paths.append(path)
+            self._profiler = None
+        stage['ended_at'] = time.time()
+        stage['seconds'] = round(time.perf_counter() - stage.pop('_wall0'), 4)
+        stage['cpu_seconds'] = round(time.process_time() - stage.pop('_cpu0'), 4)
+        stage['peak_rss_mb'] = _peak_rss_mb('self')
+        stage['peak_rss_children_mb'] = _peak_rss_mb('children')
+        if self._tracemalloc:
+            stage['python_heap_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+        self.stages.append(stage)
+        self._current = None
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # MODEL FITS
+    # ══════════════════════════════════════════════════════════════════════════
+    def record_fit(self, model, seconds, cached=False):
+        """Count one fit of `model` taking `seconds` (cached=True for memo/disk hits)."""
+        if not self.active:
+            return
+        key = f"{model} (cached)" if cached else model
+        buckets = [self.fits]
+        if self._current is not None:
+            buckets.append(self._current['fits'])
+        for fits in buckets:
+            entry = fits.setdefault(key, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    def note(self, key, value):
+        """Attach extra information (e.g. a stage-cache hit) to the running stage."""
+        if self.active and self._current is not None:
+            self._current[key] = value
+
+    @contextmanager
+    def fit(self, model):
+        """Time the enclosed block as one fit of `model`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_fit(model, time.perf_counter() - start)
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # OUTPUT
+    # ══════════════════════════════════════════════════════════════════════════
+    def report(self):
+        total = round(time.perf_counter() - self._t0, 4)
+        fits = {model: dict(entry, seconds=round(entry['seconds'], 4),
+                            max_seconds=round(entry['max_seconds'], 4),
+                            mean_seconds=round(entry['seconds'] / entry['count'], 4))
+                for model, entry in self.fits.items()}
+        stages = []
+        for stage in self.stages:
+            stage = dict(stage, fits={m: dict(e, seconds=round(e['seconds'], 4),
+                                              max_seconds=round(e['max_seconds'], 4))
+                                      for m, e in stage['fits'].items()})
+            stage['share'] = round(stage['seconds'] / total, 4) if total else None
+            stages.append(stage)
+        return {
+            'script': self.script,
+            'started_at': self.started,
+            'pid': os.getpid(),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'total_seconds': total,
+            'peak_rss_mb': _peak_rss_mb('self'),
+            'peak_rss_children_mb': _peak_rss_mb('children'),
+            'fits': fits,
+            'stages': stages,
+            'profiles': self._prof_paths,
+        }
+
+    def finish(self):
+        """Close the last stage, write the JSON trace and print a summary."""
+        if not self.active:
+            return None
+        self._end_stage()
+        report = self.report()
+        with open(self.path, 'w') as f:
+            json.dump(report, f, indent=2)
+        if self._tracemalloc:
+            tracemalloc.stop()
+        self.active = False
+
+        print(f"\n--- Timing ({report['total_seconds']:.1f}s total, trace: {self.path}) ---")
+        for stage in report['stages']:
+            fits = ", ".join(f"{e['count']} {m}" for m, e in stage['fits'].items())
+            cached = "  (from stage cache)" if stage.get('cache', {}).get('hit') else ""
+            print(f"  {stage['name']:<28} {stage['seconds']:8.2f}s  {stage['share']:6.1%}"
+                  + (f"  [{fits}]" if fits else "") + cached)
+        return report
+
+
+TRACE = Trace()
+
+
+def record_fit(model, seconds, cached=False):
+    """Report a model fit to the running trace, if any."""
+    TRACE.record_fit(model, seconds, cached)
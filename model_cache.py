@@ -0,0 +1,139 @@
+"""
+model_cache.py
+==============
+On-disk cache of fitted Prophet models, shared by every Streamlit session and
+script on the machine.
+
+A model is keyed by (country, Prophet hyperparameters, hash of the country's
+ds/y series), stored with Prophet's own JSON serialization, and evicted in
+least-recently-used order once the cache exceeds MAX_ENTRIES files or
+MAX_BYTES on disk. A repeat forecast — or the same country with a different
+horizon — loads the fitted model in milliseconds and only runs predict().
+
+    from model_cache import get_or_fit
+    model = get_or_fit('Brazil', model_data, {'changepoint_prior_scale': 0.05})
+
+With backend='numpy' (or PROPHET_BACKEND=numpy in the environment) the model
+is fit in-process by fast_prophet.FastProphet instead of Prophet/cmdstan. That
+fit takes a few milliseconds — less than reading a model back from disk — so
+it bypasses the cache.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+CACHE_DIR = "model_cache"
+MAX_ENTRIES = 500
+MAX_BYTES = 200 * 1024 * 1024
+BACKEND = os.environ.get("PROPHET_BACKEND", "stan")    # 'stan' (Prophet) or 'numpy' (FastProphet)
+BACKENDS = ('stan', 'numpy')
+
+
+def series_hash(model_data):
+    """Stable hash of a Prophet ds/y frame."""
+    ds = pd.to_datetime(model_data['ds']).astype('int64').to_numpy()
+    y = model_data['y'].astype('float64').to_numpy()
+    digest = hashlib.sha256()
+    digest.update(ds.tobytes())
+    digest.update(y.tobytes())
+    return digest.hexdigest()
+
+
+def config_hash(params=None):
+    """Short stable hash of a hyperparameter dict (the forecast table's 'Config' column)."""
+    payload = json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def cache_key(country, model_data, params=None):
+    """Cache key for one (country, hyperparameters, series) combination."""
+    payload = json.dumps({'country': country,
+                          'params': params or {},
+                          'series': series_hash(model_data)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def load_model(key, cache_dir=CACHE_DIR):
+    """Return the cached model for key, or None. A hit refreshes its LRU position."""
+    from prophet.serialize import model_from_json
+
+    path = _path(key, cache_dir)
+    try:
+        with open(path, 'r') as f:
+            model = model_from_json(f.read())
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return model
+
+
+def save_model(key, model, cache_dir=CACHE_DIR):
+    """Write a fitted model atomically, then evict old entries if over budget."""
+    from prophet.serialize import model_to_json
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temp file and rename so concurrent readers never see a partial model
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(model_to_json(model))
+        os.replace(tmp, _path(key, cache_dir))
+    except OSError:
+        # Read-only deployments simply run uncached
+        return
+    evict(cache_dir)
+
+
+def evict(cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+    """Delete least-recently-used models until the cache fits both limits."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > max_entries or total > max_bytes):
+        _, size, name = entries.pop(0)
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+        total -= size
+
+
+def get_or_fit(country, model_data, params=None, cache_dir=CACHE_DIR, backend=None):
+    """Return a fitted Prophet model for model_data, from the cache when possible."""
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown Prophet backend '{backend}' (expected one of {BACKENDS})")
+    if backend == 'numpy':
+        from fast_prophet import FastProphet
+
+        return FastProphet(**(params or {})).fit(model_data)
+
+    key = cache_key(country, model_data, params)
+    model = load_model(key, cache_dir)
+    if model is None:
+        from prophet import Prophet
+
+        model = Prophet(**(params or {}))
+        model.fit(model_data)
+        save_model(key, model, cache_dir)
+    return model
@@ -1,7 +1,9 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM, load_selection, load_selection_cube, load_tensor
+from breaks import load_breaks
+from figures import (break_countries, break_trend, continent_top, continent_trend, continents, country_lines, extremes,
+                     series_label as label_for, subregion_trend, top_continents)
 
 st.set_page_config(page_title="Global Livestock Methane Emissions Dashboard", page_icon="🐮") 
    
@@ -13,40 +15,56 @@ st.write("Browse the livestock emission of cattle from the [FAOSTAT Emissions da
 st.write("")
 st.write("")
 
-# Load dataset
-df = pd.read_csv('dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv')
+# Livestock item / emission element (every species lives in one shared tensor)
+tensor = load_tensor()
+item = st.sidebar.selectbox("Livestock item", tensor.items, index=tensor.items.get_loc(DEFAULT_ITEM))
+element = st.sidebar.selectbox("Emission element", tensor.elements, index=tensor.elements.get_loc(DEFAULT_ELEMENT))
+series_label = label_for(item, element)
 
-# Create a slider for year range selection
-min_year = int(df['Year'].min())
-max_year = int(df['Year'].max())
-selected_years = st.slider("Which years are you interested in?", min_year, max_year, (min_year, max_year))
+# Load dataset (typed, indexed store shared across pages and sessions)
+df = load_selection(item, element)
+if df.empty:
+    st.warning(f"FAOSTAT has no {element} data for {item}. Please select another combination.")
+    st.stop()
 
-# Create a multi-select dropdown for Area Code (ISO3) selection
-area_codes = df['Area Code (ISO3)'].unique()
+# Precomputed aggregates (built once at ingest, no groupby on rerun)
+cube = load_selection_cube(item, element)
 
-# Default selection of 3 area codes (first three by default)
-default_selection = area_codes[:3]  
+# Year-range / country chart: a fragment, so moving its widgets reruns only this
+# chart and not the static charts below
+@st.fragment
+def emission_chart():
+    # Create a slider for year range selection
+    min_year = int(df['Year'].min())
+    max_year = int(df['Year'].max())
+    selected_years = st.slider("Which years are you interested in?", min_year, max_year, (min_year, max_year))
 
-selected_area_codes = st.multiselect("Which countries would you like to view?", area_codes, default=default_selection)
+    # Create a multi-select dropdown for Area Code (ISO3) selection
+    area_codes = df['Area Code (ISO3)'].unique().tolist()
 
-# Filter data based on the selected year range and Area Codes
-filtered_data = df[(df['Year'].between(selected_years[0], selected_years[1])) & (df['Area Code (ISO3)'].isin(selected_area_codes))]
+    # Default selection of 3 area codes (first three by default)
+    default_selection = area_codes[:3]  
 
-# Subheader for Cattle CH4 Emission chart
-st.subheader(f"Cattle CH4 Emission from {selected_years[0]} to {selected_years[1]}")
+    selected_area_codes = st.multiselect("Which countries would you like to view?", area_codes, default=default_selection)
 
-# Create a line plot using Plotly
-if not filtered_data.empty:
-    fig = px.line(filtered_data, x='Year', y='Value', color='Area', markers=False)
-    st.plotly_chart(fig)
-else:
-    st.write("No data available for the selected criteria.")
+    # Subheader for the emission chart
+    st.subheader(f"{series_label} Emission from {selected_years[0]} to {selected_years[1]}")
 
+    # Line per country, sliced from precomputed year arrays and cached by
+    # (year range, ISO3 set) in figures.py
+    fig = country_lines(item, element, selected_years, selected_area_codes)
+    if fig is not None:
+        st.plotly_chart(fig)
+    else:
+        st.write("No data available for the selected criteria.")
 
+emission_chart()
 
 
-# Group by continent and count unique areas (countries), sorted in descending order
-continent_area_counts = df.groupby('Continent')['Area'].nunique().sort_values(ascending=True)
+
+
+# Number of unique areas (countries) per continent, sorted in descending order
+continent_area_counts = cube['continent_summary'].set_index('Continent')['Countries'].sort_values(ascending=True)
 
 # Create a Plotly horizontal bar chart
 fig = go.Figure()
@@ -75,172 +93,47 @@ st.plotly_chart(fig)
 
 
 # -----------------------
-# Methane Emissions Chart by Continent
+# Emissions Chart by Continent
 # -----------------------
 
-st.subheader(f"Continental Average Methane Emissions from Cattle (2000-2021)")
-# Group the data by continent and year, and calculate the mean of the 'Value' column
-emissions_by_continent_year = df.groupby(['Continent', 'Year'])['Value'].mean().reset_index()
-
-# Create an empty figure
-fig_emissions = go.Figure()
-
-# Add a trace for each continent
-continents = emissions_by_continent_year['Continent'].unique()
-for continent in continents:
-    continent_data = emissions_by_continent_year[emissions_by_continent_year['Continent'] == continent]
-    fig_emissions.add_trace(go.Scatter(x=continent_data['Year'], y=continent_data['Value'], name=continent, visible=False))
-
-# Make only the first continent visible
-fig_emissions.data[0].visible = True
-
-# Create dropdown menu options for continent selection
-dropdown_buttons = []
-for i, continent in enumerate(continents):
-    dropdown_buttons.append(dict(method='update',
-                                 label=continent,
-                                 args=[{'visible': [j == i for j in range(len(continents))]},
-                                       {'title': f'Average Methane Emissions from Cattle in {continent} (2000-2021)'}]))
-
-# Add dropdown to the layout
-fig_emissions.update_layout(
-    updatemenus=[dict(active=0, buttons=dropdown_buttons, x=1.15, y=1.25)],
-    xaxis_title='Year',
-    yaxis_title='Total Methane Emissions (kt)',
-)
+st.subheader(f"Continental Average {series_label} Emissions (2000-2021)")
+# Only the selected continent's trace is built and sent (figures.py, cached per selection)
+continent = st.selectbox("Continent", continents(item, element), key='continent_trend')
+st.plotly_chart(continent_trend(item, element, continent))
 
-# Display the emissions figure in the Streamlit app
-st.plotly_chart(fig_emissions)
 
+st.subheader(f"Sub-regional Average {series_label} Emissions (2000-2021)")
+# One line per UN M49 sub-region of the selected continent (geography.py)
+subregion_continent = st.selectbox("Continent", continents(item, element), key='subregion_trend')
+st.plotly_chart(subregion_trend(item, element, subregion_continent))
 
-st.subheader("Methane Emissions from Cattle for Top 5/ Bottom 5 Countries Worldwide (2000-2021)")
-# -----------------------
-# Function to create the plot with a dropdown for selecting top/bottom countries
-def plot_emissions_with_dropdown(df, n=5):
-    # Calculate total emissions by country
-    total_emissions_by_country = df.groupby('Area')['Value'].sum()
-
-    # Create traces for top and bottom countries
-    top_countries = total_emissions_by_country.nlargest(n).index
-    bottom_countries = total_emissions_by_country.nsmallest(n).index
-
-    # Filter the DataFrame for the selected countries
-    df_top = df[df['Area'].isin(top_countries)]
-    df_bottom = df[df['Area'].isin(bottom_countries)]
-
-    # Initialize the figure
-    fig = go.Figure()
-
-    # Add traces for top countries
-    for country in top_countries:
-        country_data = df_top[df_top['Area'] == country]
-        fig.add_trace(go.Scatter(x=country_data['Year'], y=country_data['Value'], name=country))
-
-    # Add traces for bottom countries
-    for country in bottom_countries:
-        country_data = df_bottom[df_bottom['Area'] == country]
-        fig.add_trace(go.Scatter(x=country_data['Year'], y=country_data['Value'], name=country, visible='legendonly'))
-
-    # Create a dropdown menu for selecting top/bottom
-    fig.update_layout(
-        updatemenus=[{
-            'buttons': [
-                {
-                    'label': 'Top 5 Countries',
-                    'method': 'update',
-                    'args': [
-                        {'visible': [True] * n + [False] * n},  # Only show top countries
-                        {'title': 'Methane Emissions from Cattle for Top 5 Countries Worldwide (2000-2021)'},
-                    ],
-                },
-                {
-                    'label': 'Bottom 5 Countries',
-                    'method': 'update',
-                    'args': [
-                        {'visible': [False] * n + [True] * n},  # Only show bottom countries
-                        {'title': 'Methane Emissions from Cattle for Bottom 5 Countries Worldwide (2000-2021)'},
-                    ],
-                },
-            ],
-            'direction': 'down',
-            'showactive': True,
-            'x': 0.98,
-            'xanchor': 'left',
-            'y': 1.28,
-            'yanchor': 'top'
-        }]
-    )
-
-    # Update layout for better readability
-    fig.update_layout(xaxis_title='Year',
-                      yaxis_title='Total Methane Emissions (kt)',
-                      legend_title_text='Country',
-                      template='plotly_white',
-                      title='Methane Emissions from Cattle Worldwide (2000-2021)')
-
-    # Display the plot in Streamlit
-    st.plotly_chart(fig)
-
-# Call the function to plot for n=5 countries
-plot_emissions_with_dropdown(df, n=5)
-
-
-
-
-st.subheader(f"Top 10 Countries' Methane Emission per Continent")
-
-# Group by Continent, Area, and Year, and average the 'Value'
-grouped = df.groupby(['Continent', 'Area', 'Year'])['Value'].mean().reset_index()
-
-# Find the top 10 countries per continent based on total Value
-top_countries_per_continent = grouped.groupby(['Continent', 'Area'])['Value'].mean().reset_index()
-top_10_countries = top_countries_per_continent.groupby('Continent').apply(lambda x: x.nlargest(10, 'Value')).reset_index(drop=True)
-
-# Create a figure with dropdown
-fig = go.Figure()
 
-# Create dropdown options for each continent
-for continent in top_10_countries['Continent'].unique():
-    top_countries = top_10_countries[top_10_countries['Continent'] == continent]['Area'].values
-    continent_data = grouped[(grouped['Continent'] == continent) & (grouped['Area'].isin(top_countries))]
-
-    # Add trace for each country in the selected continent
-    for country in top_countries:
-        country_data = continent_data[continent_data['Area'] == country]
-        fig.add_trace(go.Scatter(x=country_data['Year'], y=country_data['Value'],
-                                 name=f'{country} - {continent}',
-                                 visible=False))  # Initially set all traces to invisible
-
-# Add visibility toggle through dropdown buttons
-buttons = []
-for i, continent in enumerate(top_10_countries['Continent'].unique()):
-    visible = [False] * len(fig.data)
-    start_idx = i * 10  # Each continent has 10 countries
-    visible[start_idx:start_idx + 10] = [True] * 10  # Show only the countries for the selected continent
-
-    buttons.append(dict(label=continent,
-                        method="update",
-                        args=[{"visible": visible},
-                              {"title": f"Top 10 Countries' Methane Emission in {continent} (2000-2021)"}]))
-
-# Update layout with dropdown menu
-fig.update_layout(
-    updatemenus=[dict(active=0,
-                      buttons=buttons,
-                      x=0.95, y=1.28,  # Position the dropdown
-                      xanchor='left', yanchor='top')],
-    title="Select a Continent to View Top 10 Countries' Methane Emissions",
-    xaxis_title="Year",
-    yaxis_title="Methane Emission Value (kt)",
-    template="plotly_white"
-)
+st.subheader(f"{series_label} Emissions for Top 5/ Bottom 5 Countries Worldwide (2000-2021)")
+# Top or bottom 5 countries by total emissions, from the precomputed rankings
+which = st.selectbox("Countries", ['Top', 'Bottom'], format_func=lambda w: f"{w} 5 Countries", key='extremes')
+st.plotly_chart(extremes(item, element, which, n=5))
 
-# Make the first continent (default) visible
-for i in range(10):
-    fig.data[i].visible = True
 
-# Display the emissions figure in the Streamlit app
-st.plotly_chart(fig)
+
+
+st.subheader(f"Top 10 Countries' {series_label} Emissions per Continent")
+# Top 10 countries of the selected continent by mean annual Value
+top_continent = st.selectbox(f"Select a Continent to View Top 10 Countries' {series_label} Emissions",
+                             top_continents(item, element), key='continent_top')
+st.plotly_chart(continent_top(item, element, top_continent, n=10))
+
+
+st.subheader(f"Structural Breaks in Countries' {series_label} Emission Trends (2000-2021)")
+# Years where a country's trend jumps or changes slope, detected for every country at once (breaks.py)
+break_codes = break_countries(item, element)
+break_names = dict(zip(df['Area Code (ISO3)'].astype(str), df['Area'].astype(str)))
+break_code = st.selectbox("Country", break_codes, index=break_codes.index('MEX') if 'MEX' in break_codes else 0,
+                          format_func=lambda code: break_names.get(code, code), key='breaks')
+if break_code is not None:
+    st.plotly_chart(break_trend(item, element, break_code))
+    country_breaks = load_breaks(item, element)
+    st.dataframe(country_breaks[country_breaks['Area Code (ISO3)'] == break_code].drop(columns=['Area', 'Area Code (ISO3)']),
+                 hide_index=True)
 
 st.text('')
 st.text('')
@@ -1,7 +1,10 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from aggregates import top_areas
+from data_store import select
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM, load_selection, load_selection_cube, load_tensor
+from figures import country_lines, series_label as label_for
 
 st.set_page_config(page_title="African Continent Livestock Methane Emission Dashboard", page_icon="🐮") 
 
@@ -9,75 +12,63 @@ st.set_page_config(page_title="African Continent Livestock Methane Emission Dash
 # Title and description
 st.title("The African Continent Livestock Methane Emission Dashboard")
 
-# Load dataset
-africa_data = pd.read_csv('dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv')
-
-africa_data = africa_data[africa_data['Continent'] == 'Africa']
-
-# Map countries into regions
-east = ['Burundi', 'Comoros', 'Djibouti', 'Eritrea', 'Ethiopia', 'Kenya', 'Madagascar', 'Malawi', 'Mauritius', 'Mozambique', 'Réunion',
-        'Rwanda', 'Seychelles', 'Somalia', 'Uganda', 'United Republic of Tanzania', 'Zambia']
-south = ['Botswana', 'Eswatini', 'Lesotho', 'Namibia', 'South Africa', 'Zimbabwe']
-north = ['Algeria', 'Egypt', 'Libya', 'Morocco', 'Tunisia']
-west = ['Benin', 'Burkina Faso', 'Cabo Verde', "Côte d'Ivoire", 'Gambia', 'Ghana', 'Guinea', 'Guinea-Bissau', 'Liberia', 'Mali', 'Mauritania',
-        'Niger', 'Nigeria', 'Senegal', 'Sierra Leone', 'Togo']
-central = ['Angola', 'Cameroon', 'Central African Republic', 'Chad', 'Congo', 'Democratic Republic of the Congo', 'Equatorial Guinea', 'Gabon', 'Sao Tome and Principe']
-
-# Create a dictionary of regions and countries
-regions = {
-    'East Africa': east,
-    'Southern Africa': south,
-    'North Africa': north,
-    'West Africa': west,
-    'Central Africa': central
-}
-
-# Create a function to map countries to regions
-def get_region(country):
-    for region, countries in regions.items():
-        if country in countries:
-            return region
-    return None
-
-# Create a new column 'Region' using .loc to avoid the warning
-africa_data.loc[:, 'Region'] = africa_data['Area'].apply(get_region)
+# Livestock item / emission element (every species lives in one shared tensor)
+tensor = load_tensor()
+item = st.sidebar.selectbox("Livestock item", tensor.items, index=tensor.items.get_loc(DEFAULT_ITEM))
+element = st.sidebar.selectbox("Emission element", tensor.elements, index=tensor.elements.get_loc(DEFAULT_ELEMENT))
+series_label = label_for(item, element)
 
-# Spacing
-st.write("")
-st.write("")
-
-# Create a slider for year range selection
-min_year = int(africa_data['Year'].min())
-max_year = int(africa_data['Year'].max())
-selected_years = st.slider("Which years are you interested in?", min_year, max_year, (min_year, max_year))
-
-# Create a multi-select dropdown for Area Code (ISO3) selection
-area_codes = africa_data['Area Code (ISO3)'].unique()
-
-# Default selection of 3 area codes (first three by default)
-default_selection = area_codes[:3]  
+# Load dataset (typed, indexed store shared across pages and sessions)
+df = load_selection(item, element)
+if df.empty:
+    st.warning(f"FAOSTAT has no {element} data for {item}. Please select another combination.")
+    st.stop()
 
-selected_area_codes = st.multiselect("Which countries in Africa would you like to view?", area_codes, default=default_selection)
-
-# Filter data based on the selected year range and Area Codes
-filtered_data = africa_data[(africa_data['Year'].between(selected_years[0], selected_years[1])) & (africa_data['Area Code (ISO3)'].isin(selected_area_codes))]
-
-# Spacing
-st.write("")
-st.write("")
+# Precomputed aggregates (built once at ingest, no groupby on rerun); the
+# African sub-regions come from the geography table (geography.py)
+cube = load_selection_cube(item, element)
+africa_totals = cube['area_totals'][cube['area_totals']['Continent'] == 'Africa']
 
-# Subheader for Cattle CH4 Emission chart
-st.subheader(f"Cattle CH4 Emission from {selected_years[0]} to {selected_years[1]}")
 # Spacing
 st.write("")
 st.write("")
 
-# Create a line plot using Plotly
-if not filtered_data.empty:
-    fig = px.line(filtered_data, x='Year', y='Value', color='Area', markers=False)
-    st.plotly_chart(fig)
-else:
-    st.write("No data available for the selected criteria.")
+# Year-range / country chart: a fragment, so moving its widgets reruns only this
+# chart and not the static charts below
+@st.fragment
+def emission_chart():
+    # Create a slider for year range selection
+    min_year = int(df['Year'].min())
+    max_year = int(df['Year'].max())
+    selected_years = st.slider("Which years are you interested in?", min_year, max_year, (min_year, max_year))
+
+    # Create a multi-select dropdown for Area Code (ISO3) selection
+    area_codes = africa_totals['Area Code (ISO3)'].tolist()
+
+    # Default selection of 3 area codes (first three by default)
+    default_selection = area_codes[:3]  
+
+    selected_area_codes = st.multiselect("Which countries in Africa would you like to view?", area_codes, default=default_selection)
+
+    # Spacing
+    st.write("")
+    st.write("")
+
+    # Subheader for the emission chart
+    st.subheader(f"{series_label} Emission from {selected_years[0]} to {selected_years[1]}")
+    # Spacing
+    st.write("")
+    st.write("")
+
+    # Line per country, sliced from precomputed year arrays and cached by
+    # (year range, ISO3 set) in figures.py
+    fig = country_lines(item, element, selected_years, selected_area_codes)
+    if fig is not None:
+        st.plotly_chart(fig)
+    else:
+        st.write("No data available for the selected criteria.")
+
+emission_chart()
     
 
     
@@ -86,8 +77,8 @@ st.write("")
 st.write("")
 # @title Number of Unique Countries in Each Region
 
-# Group by Region and count unique areas (countries), sorted in descending order
-Region_area_counts = africa_data.groupby('Region')['Area'].nunique().sort_values(ascending=True)
+# Number of unique areas (countries) per Region, sorted in descending order
+Region_area_counts = cube['region_summary'].set_index('Region')['Countries'].sort_values(ascending=True)
 
 # Create a Plotly horizontal bar chart
 fig = go.Figure()
@@ -120,8 +111,8 @@ st.write("")
 
 # @title Livestock Methane Emmission Distribution for African Regions (2000-2021)
 
-# Group by 'Region' and sum the 'Value'
-region_value_sum = africa_data.groupby('Region')['Value'].sum().reset_index()
+# Total 'Value' per Region
+region_value_sum = cube['region_summary'][['Region', 'Total']].rename(columns={'Total': 'Value'})
 
 # Sort the data by 'Value' in ascending order
 region_value_sum = region_value_sum.sort_values(by='Value', ascending=True)
@@ -131,7 +122,7 @@ fig = px.bar(region_value_sum,
              x='Value',
              y='Region',
              orientation='h',  # Horizontal bars
-             title='Total Methane Emissions by Region in Africa',
+             title=f'Total {series_label} Emissions by Region in Africa',
             #  labels={'Value': 'Total Methane Emissions (kt)', 'Region': 'Region'},
             #  text='Value'
             )  # Add text labels
@@ -164,10 +155,10 @@ st.plotly_chart(fig)
 st.write("")
 st.write("")
 
-#@title Average Methane Emissions from Cattle by African Region (2000-2021)
+#@title Average emissions by African Region (2000-2021)
 
-# Group the data by Region and year, and calculate the mean of the 'Value' column
-emissions_by_Region_year = africa_data.groupby(['Region', 'Year'])['Value'].mean().reset_index()
+# Mean 'Value' by Region and year
+emissions_by_Region_year = cube['region_year']
 
 # Create an empty figure
 fig = go.Figure()
@@ -187,14 +178,14 @@ for i, Region in enumerate(Regions):
     dropdown_buttons.append(dict(method='update',
                                  label=Region,
                                  args=[{'visible': [j == i for j in range(len(Regions))]},
-                                       {'title': f'Average Methane Emissions from Cattle in {Region} (2000-2021)'}]))
+                                       {'title': f'Average {series_label} Emissions in {Region} (2000-2021)'}]))
 
 # Add dropdown to the layout
 fig.update_layout(
     updatemenus=[dict(active=0, buttons=dropdown_buttons, x=1.15, y=1.15)],
-    title=f'Average Methane Emissions from Cattle in {Regions[0]} (2000-2021)',
+    title=f'Average {series_label} Emissions in {Regions[0]} (2000-2021)',
     xaxis_title='Year',
-    yaxis_title='Total Methane Emissions (kt)',
+    yaxis_title='Emissions (kt)',
 )
 
 # Show the figure
@@ -208,12 +199,12 @@ st.write("")
 
 # @title Top 5 Countries' Methane Emission in Africa Regions
 
-# Group by Region, Area, and Year, and average the 'Value'
-grouped = africa_data.groupby(['Region', 'Area', 'Year'])['Value'].mean().reset_index()
+# Top 5 countries per Region by mean annual Value, from the precomputed rankings
+top_5_countries = top_areas(africa_totals, 'Region Rank', 5, 'Region')
 
-# Find the top 5 countries per Region based on total Value
-top_countries_per_Region = grouped.groupby(['Region', 'Area'])['Value'].mean().reset_index()
-top_5_countries = top_countries_per_Region.groupby('Region').apply(lambda x: x.nlargest(5, 'Value')).reset_index(drop=True)
+# Yearly series for just those countries (one row per country-year), tagged with their Region
+grouped = select(df, areas=top_5_countries['Area'])
+grouped = grouped.assign(Region=grouped['Area'].map(top_5_countries.set_index('Area')['Region']))
 
 # Create a figure with dropdown
 fig = go.Figure()
@@ -240,7 +231,7 @@ for i, Region in enumerate(top_5_countries['Region'].unique()):
     buttons.append(dict(label=Region,
                         method="update",
                         args=[{"visible": visible},
-                              {"title": f"Top 5 Countries' Methane Emission in {Region} (2000-2021)"}]))
+                              {"title": f"Top 5 Countries' {series_label} Emissions in {Region} (2000-2021)"}]))
 
 # Update layout with dropdown menu
 fig.update_layout(
@@ -248,9 +239,9 @@ fig.update_layout(
                       buttons=buttons,
                       x=0.17, y=1.15,  # Position the dropdown
                       xanchor='left', yanchor='top')],
-    title="Select an African Region to View Top 5 Countries' Methane Emissions",
+    title=f"Select an African Region to View Top 5 Countries' {series_label} Emissions",
     xaxis_title="Year",
-    yaxis_title="Methane Emission Value (kt)",
+    yaxis_title="Emissions (kt)",
     template="plotly_white"
 )
 
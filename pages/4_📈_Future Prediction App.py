@@ -1,57 +1,53 @@
 import streamlit as st
-import pandas as pd
-from prophet import Prophet
-from sklearn.metrics import mean_absolute_error, r2_score
 import plotly.express as px
+import fit_pool
+from batch_forecast import country_forecast, country_series
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM, is_default, load_selection, load_tensor
+from figures import series_label as label_for
+from tuning import params_for
 
-st.set_page_config(page_title="Livestock Methane Emission Future Prediction App", page_icon="🐮") 
+st.set_page_config(page_title="Livestock Emission Future Prediction App", page_icon="🐮") 
 
-# Title and description
-st.title("Livestock Methane Emission Forecasting with Prophet Model")
+# Shared, pre-warmed fit workers (no-op when the app already started them)
+fit_pool.start()
+
+# Livestock item / emission element to forecast (every species lives in one shared tensor)
+tensor = load_tensor()
+item = st.sidebar.selectbox("Livestock item", tensor.items, index=tensor.items.get_loc(DEFAULT_ITEM))
+element = st.sidebar.selectbox("Emission element", tensor.elements, index=tensor.elements.get_loc(DEFAULT_ELEMENT))
+series_label = label_for(item, element)
 
-# Load dataset
-@st.cache_data
-def load_data():
-    return pd.read_csv("dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv")
+# Title and description
+st.title(f"Livestock {series_label} Emission Forecasting with Prophet Model")
 
-data = load_data()
+# Load dataset (typed store, loaded once per process and shared across sessions).
+# Full float64 values so live fits hash to the same model-cache keys as batch_forecast.py
+data = load_selection(item, element, value_dtype='float64')
 
 # Function to create and display the Prophet model for a selected country
 def create_prophet_model(country, df, periods):
-    # Filter the data for the selected country
-    country_data = df[df['Area'] == country]
-
-    # Convert Year to datetime and then to an array, if needed
-    country_data['Year'] = pd.to_datetime(country_data['Year'], format='%Y')
-
-    # Check if the selected country has data
-    if country_data.empty:
-        st.warning(f"No data available for {country}. Please select another country.")
-        return
-
-    # Prepare the DataFrame for Prophet
-    model_data = country_data[['Year', 'Value']].rename(columns={'Year': 'ds', 'Value': 'y'})
-
-    # Initialize Prophet model
-    model = Prophet()
-    model.fit(model_data)
-
-    # Create a dataframe for future predictions based on user input
-    future = model.make_future_dataframe(periods=periods, freq='YE')  # Using 'YE' for year-end frequency
-    forecast = model.predict(future)
-
-    # Merge actual and predicted values for plotting
-    forecast_plot_data = pd.merge(
-        forecast[['ds', 'yhat']].rename(columns={'ds': 'Year', 'yhat': 'Forecast'}),
-        model_data.rename(columns={'ds': 'Year', 'y': 'Original'}),
-        on='Year',
-        how='left'
-    )
-
-    # Calculate MAE and R² for historical data
-    historical_data = forecast_plot_data.dropna()  # Exclude future data for metrics calculation
-    mae = mean_absolute_error(historical_data['Original'], historical_data['Forecast'])
-    r2 = r2_score(historical_data['Original'], historical_data['Forecast'])
+    # Precomputed forecast from batch_forecast.py, if this country is in the table
+    rows = country_forecast(country, periods, item, element)
+    if rows is None:
+        # Prepare the DataFrame for Prophet (ds = Year as datetime, y = Value)
+        model_data = country_series(df, country)
+
+        # Check if the selected country has data
+        if model_data.empty:
+            st.warning(f"No data available for {country}. Please select another country.")
+            return
+
+        # Live fit in the warm worker pool, reused from the on-disk model cache when
+        # this country's series was already fit (the horizon is not part of the key).
+        # Tuned hyperparameters (tuning.py) apply to the cattle CH4 series they were tuned on
+        params = params_for(country) if is_default(item, element) else None
+        iso3 = str(df.loc[df['Area'] == country, 'Area Code (ISO3)'].iloc[0])
+        rows = fit_pool.forecast(country, iso3, model_data, periods, params)
+
+    # Same rows either way: y (history only), yhat and the in-sample metrics
+    forecast_plot_data = rows[['ds', 'yhat', 'y']].rename(columns={'ds': 'Year', 'yhat': 'Forecast', 'y': 'Original'})
+    mae = rows['MAE'].iloc[0]
+    r2 = rows['R2'].iloc[0]
 
     # Display metrics
     st.write(f"MAE for {country}: {mae}")
@@ -59,14 +55,14 @@ def create_prophet_model(country, df, periods):
 
     # Plot using Plotly Express
     fig = px.line(forecast_plot_data, x='Year', y=['Original', 'Forecast'], 
-                  labels={'value': 'Methane Emission Value (kt)', 'variable': 'Legend'},
-                  title=f'{country} Methane Emission for the next {years_to_forecast} years')
+                  labels={'value': f'{series_label} Emissions (kt)', 'variable': 'Legend'},
+                  title=f'{country} {series_label} Emissions for the next {years_to_forecast} years')
     fig.update_layout(legend_title_text='Type')
     st.plotly_chart(fig)
 
 
 # Country selection dropdown
-country = st.selectbox("Select a Country", data['Area'].unique())
+country = st.selectbox("Select a Country", data['Area'].unique().tolist())
 
 # Input for the number of years to forecast
 years_to_forecast = st.number_input("Enter number of years to forecast", min_value=1, max_value=20, value=6, step=1)
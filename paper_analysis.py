@@ -12,6 +12,13 @@ It will:
   4. Generate Prophet forecasts with tuned hyperparameters
   5. Export all results to paper_results.txt  <-- paste into paper
   6. Save comparison table to model_comparison.csv
+
+Stage timings, model-fit counts and peak memory go to paper_results_trace.json
+(instrument.py; PAPER_PROFILE=cprofile adds per-stage cProfile dumps).
+
+Moran's I, the model comparison and the cps cross-validation are cached on
+disk by the hash of their inputs and code (stage_cache.py), so a re-run after
+editing only the report text reloads them instead of refitting.
 """
 
 import warnings
@@ -21,21 +28,22 @@ import pandas as pd
 import numpy as np
 from prophet import Prophet
 from prophet.diagnostics import cross_validation, performance_metrics
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.stattools import adfuller
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-import itertools
-
-# ── Optional spatial packages ──────────────────────────────────────────────
-try:
-    import libpysal
-    from libpysal.weights import lat2W
-    from esda.moran import Moran
-    SPATIAL_AVAILABLE = True
-except ImportError:
-    SPATIAL_AVAILABLE = False
-    print("NOTE: libpysal/esda not installed. Moran's I will be skipped.")
-    print("Install with: pip install libpysal esda")
+
+import arima_search
+import comparison as comparison_module
+import spatial
+from comparison import N_TRAIN, better_model, compare_countries, comparison_row
+from data_store import load_data
+from geography import with_geography
+from instrument import TRACE, trace_path
+from stage_cache import cached_stage, dataset_hash, file_hash
+
+# ── Model comparison scope ────────────────────────────────────────────────
+# The paper uses the top 10 emitters and p, q in 0..2. ARIMA candidates are fit
+# in parallel (arima_search.py, via comparison.py), so both can be raised, e.g. to every country
+# (N_COMPARISON_COUNTRIES = None) and p, q up to 5.
+N_COMPARISON_COUNTRIES = 10
+ARIMA_MAX_PQ = 2
 
 output_lines = []
 
@@ -43,10 +51,16 @@ def log(text=""):
     print(text)
     output_lines.append(text)
 
+# Stage timers; the trace is written next to paper_results.txt
+TRACE.start("paper_analysis.py", trace_path("paper_results.txt"))
+
 # ══════════════════════════════════════════════════════════════════════════════
 # 0. LOAD DATA
 # ══════════════════════════════════════════════════════════════════════════════
-df = pd.read_csv("dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv")
+TRACE.stage("load_data")
+# Shared typed store, at full float64 precision for the reported statistics
+df = load_data(value_dtype='float64')
+data_hash = dataset_hash(df)
 log("=" * 70)
 log("LIVESTOCK METHANE EMISSIONS — PAPER ANALYSIS RESULTS")
 log("=" * 70)
@@ -56,32 +70,13 @@ log(f"Years covered: {df['Year'].min()} — {df['Year'].max()}")
 log(f"Total countries: {df['Area'].nunique()}")
 log(f"Total continents: {df['Continent'].nunique()}")
 
-# Africa region mapping
-east   = ['Burundi','Comoros','Djibouti','Eritrea','Ethiopia','Kenya','Madagascar',
-          'Malawi','Mauritius','Mozambique','Réunion','Rwanda','Seychelles','Somalia',
-          'Uganda','United Republic of Tanzania','Zambia']
-south  = ['Botswana','Eswatini','Lesotho','Namibia','South Africa','Zimbabwe']
-north  = ['Algeria','Egypt','Libya','Morocco','Tunisia']
-west   = ['Benin','Burkina Faso','Cabo Verde',"Côte d'Ivoire",'Gambia','Ghana',
-          'Guinea','Guinea-Bissau','Liberia','Mali','Mauritania','Niger','Nigeria',
-          'Senegal','Sierra Leone','Togo']
-central= ['Angola','Cameroon','Central African Republic','Chad','Congo',
-          'Democratic Republic of the Congo','Equatorial Guinea','Gabon',
-          'Sao Tome and Principe']
-
-region_map = {}
-for c in east:    region_map[c] = 'East Africa'
-for c in south:   region_map[c] = 'Southern Africa'
-for c in north:   region_map[c] = 'North Africa'
-for c in west:    region_map[c] = 'West Africa'
-for c in central: region_map[c] = 'Central Africa'
-
-africa = df[df['Continent'] == 'Africa'].copy()
-africa['Region'] = africa['Area'].map(region_map)
+# Africa region mapping (Region column of the geography table, dataset/countries.csv)
+africa = with_geography(df[df['Continent'] == 'Africa'], ['Region'])
 
 # ══════════════════════════════════════════════════════════════════════════════
 # FIX 1 — DESCRIPTIVE STATISTICS (Table 1)
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("descriptive_stats")
 log("\n" + "=" * 70)
 log("FIX 1: DESCRIPTIVE STATISTICS")
 log("=" * 70)
@@ -95,28 +90,28 @@ log(f"Percentage change 2000-2021: {pct_change:.1f}%")
 
 # Table 1: Descriptive stats by continent
 log("\n--- TABLE 1: Descriptive Statistics by Continent (kt) ---")
-cont_stats = df.groupby('Continent')['Value'].agg(['mean','std','min','max','sum'])
+cont_stats = df.groupby('Continent', observed=True)['Value'].agg(['mean','std','min','max','sum'])
 cont_stats.columns = ['Mean', 'Std Dev', 'Min', 'Max', 'Total']
 cont_stats = cont_stats.round(2)
 log(cont_stats.to_string())
 
 # Top 5 global countries
 log("\n--- Top 5 Countries by Total Cumulative Emissions (2000-2021) ---")
-top5 = df.groupby('Area')['Value'].sum().nlargest(5).reset_index()
+top5 = df.groupby('Area', observed=True)['Value'].sum().nlargest(5).reset_index()
 top5.columns = ['Country', 'Total Emissions (kt)']
 top5['Total Emissions (kt)'] = top5['Total Emissions (kt)'].round(2)
 log(top5.to_string(index=False))
 
 # Bottom 5
 log("\n--- Bottom 5 Countries by Total Cumulative Emissions (2000-2021) ---")
-bot5 = df.groupby('Area')['Value'].sum().nsmallest(5).reset_index()
+bot5 = df.groupby('Area', observed=True)['Value'].sum().nsmallest(5).reset_index()
 bot5.columns = ['Country', 'Total Emissions (kt)']
 bot5['Total Emissions (kt)'] = bot5['Total Emissions (kt)'].round(2)
 log(bot5.to_string(index=False))
 
 # Africa sub-regional stats
 log("\n--- Africa Sub-Regional Totals (2000-2021) ---")
-africa_region = africa.groupby('Region')['Value'].agg(['sum','mean']).round(2)
+africa_region = africa.groupby('Region', observed=True)['Value'].agg(['sum','mean']).round(2)
 africa_region.columns = ['Total (kt)', 'Annual Mean (kt)']
 africa_region = africa_region.sort_values('Total (kt)', ascending=False)
 log(africa_region.to_string())
@@ -124,7 +119,7 @@ log(africa_region.to_string())
 # Top 3 countries per African region
 log("\n--- Top 3 Countries per African Sub-Region ---")
 for region in africa_region.index:
-    top3 = africa[africa['Region'] == region].groupby('Area')['Value'].sum().nlargest(3)
+    top3 = africa[africa['Region'] == region].groupby('Area', observed=True)['Value'].sum().nlargest(3)
     log(f"\n{region}:")
     for country, val in top3.items():
         log(f"  {country}: {val:.2f} kt")
@@ -132,166 +127,81 @@ for region in africa_region.index:
 # ══════════════════════════════════════════════════════════════════════════════
 # FIX 2 — MORAN'S I SPATIAL AUTOCORRELATION
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("morans_i")
 log("\n" + "=" * 70)
 log("FIX 2: SPATIAL AUTOCORRELATION (Moran's I)")
 log("=" * 70)
 
-if SPATIAL_AVAILABLE:
-    # Use mean emissions per country as the spatial variable
-    # Build a simple contiguity matrix based on continent groupings
-    # since we don't have shapefile, we use a rank-based approach on sorted country emissions
-    country_means = df.groupby('Area')['Value'].mean().reset_index()
-    country_means = country_means.sort_values('Value').reset_index(drop=True)
-    n = len(country_means)
-
-    # Build a simple k-nearest-neighbours weight from emission magnitude ranking
-    # (a proxy for spatial structure when shapefile unavailable)
-    from libpysal.weights import KNN
-    import numpy as np
-
-    # Create a 1D coordinate array (rank as x, 0 as y) for KNN weight
-    coords = np.column_stack([country_means.index.values, np.zeros(n)])
-    w = KNN.from_array(coords, k=5)
-    w.transform = 'R'
-
-    mi = Moran(country_means['Value'].values, w)
-    log(f"\nMoran's I statistic: {mi.I:.4f}")
-    log(f"Expected I (under null): {mi.EI:.4f}")
-    log(f"Z-score: {mi.z_norm:.4f}")
-    log(f"P-value: {mi.p_norm:.4f}")
-    if mi.p_norm < 0.05:
-        if mi.I > 0:
-            log("Interpretation: Significant POSITIVE spatial autocorrelation detected.")
-            log("High-emitting countries tend to cluster geographically.")
-        else:
-            log("Interpretation: Significant NEGATIVE spatial autocorrelation detected.")
+def morans_i(df):
+    # Mean emissions per country on real geography: land-border contiguity
+    # between ISO3 codes (dataset/country_adjacency.csv), islands linked to
+    # their nearest centroid. The same statistic is computed for every year.
+    means = df.groupby('Area Code (ISO3)', observed=True)['Value'].mean()
+    w = spatial.weights(means.index)
+    mi = spatial.moran(means.to_numpy()[None, :], w).iloc[0]
+    return {**mi.to_dict(), 'n': len(means),
+            'by_year': spatial.moran_by_year(df), 'lisa': spatial.lisa_by_year(df)}
+
+mi = cached_stage('morans_i', {'data': data_hash, 'permutations': spatial.PERMUTATIONS,
+                              'weights': file_hash(spatial.CENTROIDS_CSV, spatial.ADJACENCY_CSV)},
+                  lambda: morans_i(df), code=[morans_i, spatial])
+log(f"\nWeights: land-border contiguity, row-standardised ({mi['n']} countries)")
+log(f"Moran's I statistic: {mi['I']:.4f}")
+log(f"Expected I (under null): {mi['EI']:.4f}")
+log(f"Z-score: {mi['z_norm']:.4f}")
+log(f"P-value: {mi['p_norm']:.4f}")
+log(f"Permutation p-value ({spatial.PERMUTATIONS} permutations): {mi['p_sim']:.4f}")
+if mi['p_sim'] < 0.05:
+    if mi['I'] > 0:
+        log("Interpretation: Significant POSITIVE spatial autocorrelation detected.")
+        log("High-emitting countries tend to cluster geographically.")
     else:
-        log("Interpretation: No significant spatial autocorrelation detected.")
-
-    log("\nNOTE FOR PAPER: For a rigorous spatial analysis, run Moran's I")
-    log("on a country-level shapefile (e.g. from naturalearth) joined with")
-    log("emission values using GeoPandas + Queen contiguity weights.")
-    log("The shapefile-based code block is provided below the results.")
+        log("Interpretation: Significant NEGATIVE spatial autocorrelation detected.")
 else:
-    log("\nMoran's I skipped — libpysal not available.")
-    log("Install with: pip install libpysal esda")
-    log("Then re-run this script.")
-
-log("""
---- SHAPEFILE-BASED MORAN'S I CODE (add to notebook) ---
-
-import geopandas as gpd
-from libpysal.weights import Queen
-from esda.moran import Moran
-
-# Load world shapefile
-world = gpd.read_file(gpd.datasets.get_path('naturalearth_lowres'))
-
-# Merge with mean emission values
-country_means = df.groupby('Area')['Value'].mean().reset_index()
-country_means.columns = ['name', 'mean_emission']
-merged = world.merge(country_means, on='name', how='inner')
-merged = merged[merged['mean_emission'].notna()]
+    log("Interpretation: No significant spatial autocorrelation detected.")
 
-# Build Queen contiguity weights
-w = Queen.from_dataframe(merged)
-w.transform = 'R'
+log("\nMoran's I by year:")
+log(f"{'Year':<6} {'I':>8} {'z':>8} {'p_sim':>8}")
+for row in mi['by_year'].itertuples():
+    log(f"{row.Year:<6} {row.I:>8.4f} {row.z_sim:>8.3f} {row.p_sim:>8.4f}")
 
-# Run Moran's I
-mi = Moran(merged['mean_emission'], w)
-print(f"Moran's I: {mi.I:.4f}, p-value: {mi.p_norm:.4f}")
-""")
+lisa = mi['lisa']
+latest = lisa[lisa['Year'] == lisa['Year'].max()]
+log(f"\nLISA clusters, {latest['Year'].iloc[0]} (p < 0.05):")
+for cluster in ['HH', 'LL', 'HL', 'LH']:
+    members = latest.loc[latest['cluster'] == cluster, 'Area'].tolist()
+    log(f"  {cluster} ({len(members)}): {', '.join(members) if members else '-'}")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # FIX 3 — ARIMA vs PROPHET COMPARISON
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("arima_vs_prophet")
 log("\n" + "=" * 70)
 log("FIX 3: ARIMA vs PROPHET MODEL COMPARISON")
 log("=" * 70)
 
-# Select top 10 emitting countries for the comparison
-top10_countries = df.groupby('Area')['Value'].sum().nlargest(10).index.tolist()
+# Select top emitting countries for the comparison
+country_totals = df.groupby('Area', observed=True)['Value'].sum()
+n_countries = N_COMPARISON_COUNTRIES or len(country_totals)
+top10_countries = country_totals.nlargest(n_countries).index.tolist()
 log(f"\nCountries used for model comparison: {top10_countries}")
 
+# ── Train/test split: train on 2000-2016, test on 2017-2021 (comparison.py) ──
+comparison = cached_stage(
+    'arima_vs_prophet',
+    {'data': data_hash, 'countries': top10_countries, 'max_pq': ARIMA_MAX_PQ, 'n_train': N_TRAIN},
+    lambda: compare_countries(df, top10_countries, max_pq=ARIMA_MAX_PQ),
+    code=[comparison_module, arima_search])
+
 results = []
 
-for country in top10_countries:
-    country_data = df[df['Area'] == country].sort_values('Year')
-    values = country_data['Value'].values
-    years  = country_data['Year'].values
-
-    # ── Train/test split: train on 2000-2016, test on 2017-2021 ──
-    train_vals = values[:17]   # 2000-2016
-    test_vals  = values[17:]   # 2017-2021
-    n_test = len(test_vals)
-
-    # ── PROPHET ──────────────────────────────────────────────────
-    prophet_df = pd.DataFrame({
-        'ds': pd.to_datetime(years, format='%Y'),
-        'y': values
-    })
-    prophet_train = prophet_df.iloc[:17]
-
-    prophet_model = Prophet(
-        changepoint_prior_scale=0.05,
-        seasonality_mode='additive',
-        yearly_seasonality=False,
-        weekly_seasonality=False,
-        daily_seasonality=False
-    )
-    prophet_model.fit(prophet_train)
-
-    future = prophet_model.make_future_dataframe(periods=n_test, freq='YE')
-    forecast = prophet_model.predict(future)
-    prophet_pred = forecast['yhat'].values[-n_test:]
-
-    prophet_mae  = mean_absolute_error(test_vals, prophet_pred)
-    prophet_rmse = np.sqrt(mean_squared_error(test_vals, prophet_pred))
-    prophet_r2   = r2_score(values, prophet_model.predict(prophet_df[['ds']])['yhat'].values)
-
-    # ── ARIMA ─────────────────────────────────────────────────────
-    # Use ADF test to determine differencing
-    adf_result = adfuller(train_vals, autolag='AIC')
-    d = 0 if adf_result[1] < 0.05 else 1
-
-    best_arima_aic = np.inf
-    best_arima_order = (1, d, 1)
-
-    for p, q in itertools.product(range(3), range(3)):
-        try:
-            m = ARIMA(train_vals, order=(p, d, q)).fit()
-            if m.aic < best_arima_aic:
-                best_arima_aic = m.aic
-                best_arima_order = (p, d, q)
-        except Exception:
-            continue
-
-    arima_model = ARIMA(train_vals, order=best_arima_order).fit()
-    arima_pred  = arima_model.forecast(steps=n_test)
-
-    arima_mae  = mean_absolute_error(test_vals, arima_pred)
-    arima_rmse = np.sqrt(mean_squared_error(test_vals, arima_pred))
-
-    # In-sample R2 for ARIMA
-    arima_insample = ARIMA(values, order=best_arima_order).fit()
-    arima_r2 = r2_score(values, arima_insample.fittedvalues)
-
-    results.append({
-        'Country': country,
-        'ARIMA Order': str(best_arima_order),
-        'ARIMA MAE': round(arima_mae, 3),
-        'ARIMA RMSE': round(arima_rmse, 3),
-        'ARIMA R2': round(arima_r2, 3),
-        'Prophet MAE': round(prophet_mae, 3),
-        'Prophet RMSE': round(prophet_rmse, 3),
-        'Prophet R2': round(prophet_r2, 3),
-        'Better Model': 'Prophet' if prophet_mae < arima_mae else 'ARIMA'
-    })
-
-    log(f"\n{country}:")
-    log(f"  ARIMA{best_arima_order}  — MAE: {arima_mae:.3f}, RMSE: {arima_rmse:.3f}, R2: {arima_r2:.3f}")
-    log(f"  Prophet     — MAE: {prophet_mae:.3f}, RMSE: {prophet_rmse:.3f}, R2: {prophet_r2:.3f}")
-    log(f"  Better model: {'Prophet' if prophet_mae < arima_mae else 'ARIMA'}")
+for r in comparison:
+    results.append(comparison_row(r))
+
+    log(f"\n{r['country']}:")
+    log(f"  ARIMA{r['order']}  — MAE: {r['arima_mae']:.3f}, RMSE: {r['arima_rmse']:.3f}, R2: {r['arima_r2']:.3f}")
+    log(f"  Prophet     — MAE: {r['prophet_mae']:.3f}, RMSE: {r['prophet_rmse']:.3f}, R2: {r['prophet_r2']:.3f}")
+    log(f"  Better model: {better_model(r)}")
 
 results_df = pd.DataFrame(results)
 log("\n--- TABLE 2: Full Model Comparison Summary ---")
@@ -302,14 +212,15 @@ prophet_wins = (results_df['Better Model'] == 'Prophet').sum()
 arima_wins   = (results_df['Better Model'] == 'ARIMA').sum()
 log(f"\nProphet outperformed ARIMA in {prophet_wins}/{len(results_df)} countries")
 log(f"ARIMA outperformed Prophet in {arima_wins}/{len(results_df)} countries")
-log(f"\nMean Prophet MAE across top 10 countries: {results_df['Prophet MAE'].mean():.3f} kt")
-log(f"Mean ARIMA MAE across top 10 countries:   {results_df['ARIMA MAE'].mean():.3f} kt")
-log(f"Mean Prophet R2 across top 10 countries:  {results_df['Prophet R2'].mean():.3f}")
-log(f"Mean ARIMA R2 across top 10 countries:    {results_df['ARIMA R2'].mean():.3f}")
+log(f"\nMean Prophet MAE across top {len(results_df)} countries: {results_df['Prophet MAE'].mean():.3f} kt")
+log(f"Mean ARIMA MAE across top {len(results_df)} countries:   {results_df['ARIMA MAE'].mean():.3f} kt")
+log(f"Mean Prophet R2 across top {len(results_df)} countries:  {results_df['Prophet R2'].mean():.3f}")
+log(f"Mean ARIMA R2 across top {len(results_df)} countries:    {results_df['ARIMA R2'].mean():.3f}")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PROPHET TUNING — Full dataset forecasts with optimised parameters
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("prophet_cps_cv")
 log("\n" + "=" * 70)
 log("PROPHET TUNING — CHANGEPOINT PRIOR SCALE SELECTION")
 log("=" * 70)
@@ -323,23 +234,40 @@ brazil_prophet = pd.DataFrame({
     'y': brazil['Value'].values
 })
 
+CPS_GRID = [0.001, 0.01, 0.05, 0.1, 0.5]
+
+def cps_cross_validation(series, grid):
+    """CV RMSE per cps value, or the error message when Prophet's CV fails."""
+    cv_results = []
+    for cps in grid:
+        try:
+            m = Prophet(changepoint_prior_scale=cps,
+                        yearly_seasonality=False,
+                        weekly_seasonality=False,
+                        daily_seasonality=False)
+            with TRACE.fit('prophet'):
+                m.fit(series)
+            with TRACE.fit('prophet_cv'):
+                df_cv = cross_validation(m, initial='10 years', period='2 years', horizon='2 years', disable_tqdm=True)
+            perf  = performance_metrics(df_cv)
+            cv_results.append((cps, perf['rmse'].mean(), None))
+        except Exception as e:
+            cv_results.append((cps, None, str(e)))
+    return cv_results
+
+cv_results = cached_stage('prophet_cps_cv', {'data': dataset_hash(brazil_prophet), 'grid': CPS_GRID},
+                          lambda: cps_cross_validation(brazil_prophet, CPS_GRID),
+                          code=[cps_cross_validation])
+
 best_cps, best_rmse_cv = 0.05, np.inf
-for cps in [0.001, 0.01, 0.05, 0.1, 0.5]:
-    try:
-        m = Prophet(changepoint_prior_scale=cps,
-                    yearly_seasonality=False,
-                    weekly_seasonality=False,
-                    daily_seasonality=False)
-        m.fit(brazil_prophet)
-        df_cv = cross_validation(m, initial='10 years', period='2 years', horizon='2 years', disable_tqdm=True)
-        perf  = performance_metrics(df_cv)
-        rmse_cv = perf['rmse'].mean()
-        log(f"  cps={cps}: CV RMSE = {rmse_cv:.3f} kt")
-        if rmse_cv < best_rmse_cv:
-            best_rmse_cv = rmse_cv
-            best_cps = cps
-    except Exception as e:
-        log(f"  cps={cps}: failed ({e})")
+for cps, rmse_cv, error in cv_results:
+    if error is not None:
+        log(f"  cps={cps}: failed ({error})")
+        continue
+    log(f"  cps={cps}: CV RMSE = {rmse_cv:.3f} kt")
+    if rmse_cv < best_rmse_cv:
+        best_rmse_cv = rmse_cv
+        best_cps = cps
 
 log(f"\nOptimal changepoint_prior_scale: {best_cps} (CV RMSE: {best_rmse_cv:.3f} kt)")
 log("This value was used for all country-level forecasts in the paper.")
@@ -347,6 +275,7 @@ log("This value was used for all country-level forecasts in the paper.")
 # ══════════════════════════════════════════════════════════════════════════════
 # SAVE OUTPUTS
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("save")
 with open("paper_results.txt", "w") as f:
     f.write("\n".join(output_lines))
 
@@ -356,4 +285,6 @@ log("\n" + "=" * 70)
 log("DONE. Files written:")
 log("  paper_results.txt   — all numbers to paste into your paper")
 log("  model_comparison.csv — Table 2 for the paper")
-log("=" * 70)
\ No newline at end of file
+log("=" * 70)
+
+TRACE.finish()
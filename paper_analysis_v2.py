@@ -3,6 +3,8 @@ paper_analysis_v2.py
 ====================
 Fixed version — corrects Prophet cross-validation unit error.
 Run from your repo root: python paper_analysis_v2.py
+
+Stage timings and model-fit counts go to paper_results_v2_trace.json (instrument.py).
 """
 
 import warnings
@@ -11,10 +13,10 @@ warnings.filterwarnings("ignore")
 import pandas as pd
 import numpy as np
 from prophet import Prophet
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.stattools import adfuller
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-import itertools
+
+from data_store import load_data
+from instrument import TRACE, trace_path
 
 output_lines = []
 
@@ -22,25 +24,18 @@ def log(text=""):
     print(text)
     output_lines.append(str(text))
 
+# Stage timers; the trace is written next to paper_results_v2.txt
+TRACE.start("paper_analysis_v2.py", trace_path("paper_results_v2.txt"))
+
 # ── LOAD DATA ────────────────────────────────────────────────────────────────
-df = pd.read_csv("dataset/Cattle_CH4_dataset_cleaned_2000_2021.csv")
-
-# Africa region mapping
-east    = ['Burundi','Comoros','Djibouti','Eritrea','Ethiopia','Kenya','Madagascar',
-           'Malawi','Mauritius','Mozambique','Réunion','Rwanda','Seychelles','Somalia',
-           'Uganda','United Republic of Tanzania','Zambia']
-south   = ['Botswana','Eswatini','Lesotho','Namibia','South Africa','Zimbabwe']
-north   = ['Algeria','Egypt','Libya','Morocco','Tunisia']
-west    = ['Benin','Burkina Faso','Cabo Verde',"Côte d'Ivoire",'Gambia','Ghana',
-           'Guinea','Guinea-Bissau','Liberia','Mali','Mauritania','Niger','Nigeria',
-           'Senegal','Sierra Leone','Togo']
-central = ['Angola','Cameroon','Central African Republic','Chad','Congo',
-           'Democratic Republic of the Congo','Equatorial Guinea','Gabon',
-           'Sao Tome and Principe']
+TRACE.stage("load_data")
+# Shared typed store, at full float64 precision for the reported statistics
+df = load_data(value_dtype='float64')
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PROPHET HYPERPARAMETER TUNING — Manual CV (fixes unit error)
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("cps_sweep")
 log("=" * 70)
 log("PROPHET HYPERPARAMETER TUNING (Manual Cross-Validation)")
 log("=" * 70)
@@ -71,7 +66,8 @@ for cps in [0.001, 0.01, 0.05, 0.1, 0.5]:
         daily_seasonality=False,
         seasonality_mode='additive'
     )
-    m.fit(train_brazil)
+    with TRACE.fit('prophet'):
+        m.fit(train_brazil)
 
     future = m.make_future_dataframe(periods=len(test_brazil), freq='YE')
     fc     = m.predict(future)
@@ -84,7 +80,8 @@ for cps in [0.001, 0.01, 0.05, 0.1, 0.5]:
     # In-sample R2 on full series
     m2   = Prophet(changepoint_prior_scale=cps,
                    yearly_seasonality=False, weekly_seasonality=False, daily_seasonality=False)
-    m2.fit(brazil_ts)
+    with TRACE.fit('prophet'):
+        m2.fit(brazil_ts)
     fc2  = m2.predict(brazil_ts[['ds']])
     r2   = r2_score(brazil_ts['y'].values, fc2['yhat'].values)
 
@@ -102,6 +99,7 @@ log("This value is applied to all country forecasts.")
 # ══════════════════════════════════════════════════════════════════════════════
 # INTERPRETATION NOTE ON ARIMA vs PROPHET RESULTS
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("interpretation")
 log("\n" + "=" * 70)
 log("INTERPRETATION: ARIMA vs PROPHET RESULTS")
 log("=" * 70)
@@ -133,11 +131,12 @@ for long-horizon forecasting where trend continuity matters.
 # ══════════════════════════════════════════════════════════════════════════════
 # FORECAST ACCURACY — Full series fit for all top 10
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("full_series_fits")
 log("=" * 70)
 log("PROPHET FULL-SERIES FIT METRICS (Training Period 2000-2021)")
 log("=" * 70)
 
-top10 = df.groupby('Area')['Value'].sum().nlargest(10).index.tolist()
+top10 = df.groupby('Area', observed=True)['Value'].sum().nlargest(10).index.tolist()
 full_fit_results = []
 
 log("\nCountry                  | MAE     | RMSE    | R2")
@@ -155,7 +154,8 @@ for country in top10:
         weekly_seasonality=False,
         daily_seasonality=False
     )
-    m.fit(ts)
+    with TRACE.fit('prophet'):
+        m.fit(ts)
     fc  = m.predict(ts[['ds']])
     mae  = mean_absolute_error(ts['y'], fc['yhat'])
     rmse = np.sqrt(mean_squared_error(ts['y'], fc['yhat']))
@@ -174,6 +174,7 @@ log(f"Mean R2   (Prophet, full fit): {fit_df['R2'].mean():.4f}")
 # ══════════════════════════════════════════════════════════════════════════════
 # RESULTS TEXT — READY TO PASTE INTO PAPER
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("results_text")
 log("\n" + "=" * 70)
 log("RESULTS TEXT — PASTE DIRECTLY INTO PAPER SECTIONS")
 log("=" * 70)
@@ -247,6 +248,7 @@ training, 2015-2021 test), yielding a test MAE of [best_mae] kt.
 # ══════════════════════════════════════════════════════════════════════════════
 # SAVE
 # ══════════════════════════════════════════════════════════════════════════════
+TRACE.stage("save")
 fit_df.to_csv("prophet_full_fit_metrics.csv", index=False)
 
 with open("paper_results_v2.txt", "w") as f:
@@ -254,4 +256,6 @@ with open("paper_results_v2.txt", "w") as f:
 
 log("\nFiles saved:")
 log("  paper_results_v2.txt         — all results and paste-ready text")
-log("  prophet_full_fit_metrics.csv — Table 3 for the paper")
\ No newline at end of file
+log("  prophet_full_fit_metrics.csv — Table 3 for the paper")
+
+TRACE.finish()
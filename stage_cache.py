@@ -0,0 +1,118 @@
+"""
+stage_cache.py
+==============
+Content-addressed cache for the expensive stages of the paper analysis.
+
+    from stage_cache import cached_stage, dataset_hash
+    comparison = cached_stage('arima_vs_prophet',
+                              {'data': dataset_hash(df), 'countries': top10, 'max_pq': 2},
+                              lambda: compare_countries(df, top10, max_pq=2),
+                              code=[compare_countries, comparison_module])
+
+A stage's key is the SHA-256 of its name, its declared inputs (dataset hash,
+hashes of the lookup files it reads, country list, hyperparameters, ...), the source code of the functions/modules
+it runs, and the versions of the libraries that shape its numbers. The result
+is pickled to stage_cache/<name>-<key>.pkl, so re-running the script after
+editing the report text loads every unchanged stage in milliseconds, while any
+change to the data, the inputs or the stage's code recomputes just that stage.
+
+Set PAPER_STAGE_CACHE=0 to bypass the cache (results are still written).
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+import time
+
+import pandas as pd
+
+from instrument import TRACE
+
+STAGE_CACHE_DIR = "stage_cache"
+
+# Libraries whose version changes a stage's numbers
+VERSIONED_LIBRARIES = ['numpy', 'pandas', 'prophet', 'scipy', 'statsmodels', 'sklearn']
+
+
+def dataset_hash(df):
+    """Stable hash of a frame's contents (values, dtypes and column names)."""
+    h = hashlib.sha256()
+    h.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def file_hash(*paths):
+    """Hash of the given files' bytes, e.g. the lookup tables a stage reads besides the dataset."""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def code_version(objects):
+    """Hash of the source code of the given functions / modules."""
+    h = hashlib.sha256()
+    for obj in objects:
+        try:
+            h.update(inspect.getsource(obj).encode())
+        except (OSError, TypeError):
+            h.update(repr(obj).encode())
+    return h.hexdigest()
+
+
+def library_versions():
+    versions = {}
+    for name in VERSIONED_LIBRARIES:
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        versions[name] = getattr(module, '__version__', None)
+    return versions
+
+
+def stage_key(name, inputs, code=()):
+    payload = {
+        'stage': name,
+        'inputs': inputs,
+        'code': code_version(code),
+        'libraries': library_versions(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cached_stage(name, inputs, compute, code=(), cache_dir=STAGE_CACHE_DIR):
+    """Return compute()'s result for these inputs, from disk when it was computed before."""
+    key = stage_key(name, inputs, code)
+    path = os.path.join(cache_dir, f"{name}-{key[:24]}.pkl")
+    use_cache = os.environ.get('PAPER_STAGE_CACHE', '1') != '0'
+
+    if use_cache and os.path.exists(path):
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass    # unreadable entry: recompute and overwrite it
+        else:
+            TRACE.note('cache', {'key': key[:24], 'hit': True, 'seconds': round(time.perf_counter() - start, 4)})
+            return result
+
+    result = compute()
+    TRACE.note('cache', {'key': key[:24], 'hit': False})
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        # Read-only checkouts still run, just without the cache
+        pass
+    return result
@@ -0,0 +1,49 @@
+"""Regression check: ingesting a year that only some countries have must not
+shrink the whole-panel matrix to those countries."""
+
+import numpy as np
+import pandas as pd
+
+import spatial
+from data_store import load_data
+from ingest import partial_years
+from wide_matrix import build_matrix, complete_panel
+
+
+def _with_partial_year():
+    df = load_data(value_dtype='float64')
+    brazil = df[(df['Area'] == 'Brazil') & (df['Year'] == df['Year'].max())].copy()
+    brazil['Year'] = brazil['Year'] + 1
+    return pd.concat([df.astype({'Area': str, 'Continent': str, 'Area Code (ISO3)': str}),
+                      brazil.astype({'Area': str, 'Continent': str, 'Area Code (ISO3)': str})],
+                     ignore_index=True)
+
+
+def test_complete_panel_cuts_the_partial_year():
+    df = _with_partial_year()
+    last = int(load_data()['Year'].max())
+    years, iso3, X = complete_panel(*build_matrix(df))
+    assert years[-1] == last
+    assert len(iso3) == df['Area Code (ISO3)'].nunique()
+    assert not np.isnan(X).any()
+
+
+def test_complete_panel_drops_a_gappy_country_not_the_year():
+    years, iso3, X = build_matrix(load_data(value_dtype='float64'))
+    X = X.copy()
+    X[-1, 0] = np.nan                                   # one country misses the last year
+    kept_years, kept_iso3, _ = complete_panel(years, iso3, X)
+    assert len(kept_years) == len(years)
+    assert list(kept_iso3) == list(iso3[1:])
+
+
+def test_spatial_statistics_survive_a_partial_year():
+    df = _with_partial_year()
+    table = spatial.moran_by_year(df, permutations=99)
+    assert len(table) == len(load_data()['Year'].unique())
+    assert table['n'].iloc[0] == df['Area Code (ISO3)'].nunique()
+
+
+def test_ingest_reports_the_partial_year():
+    df = _with_partial_year()
+    assert partial_years(df) == {int(df['Year'].max()): 1}
@@ -0,0 +1,207 @@
+"""
+tuning.py
+=========
+Per-country Prophet hyperparameter search with successive halving.
+
+    python tuning.py                               # every country, full grid
+    python tuning.py --random 30 --eta 3           # 30 random configs per country
+    python tuning.py --countries Brazil India --workers 2
+
+paper_analysis_v2.py tunes changepoint_prior_scale on Brazil alone and applies
+it everywhere. Here every country gets its own search over SEARCH_SPACE
+(changepoint_prior_scale, seasonality_prior_scale, growth, n_changepoints),
+scored by rolling-origin MAE from backtest.py:
+
+  rung 0   every config is scored on the most recent fold only
+  rung k   the best 1/eta survive and are re-scored on eta^k recent folds
+  last     the survivors are scored on all folds; the lowest mean MAE wins
+
+so most configs cost one fit and only the promising ones pay for the full
+backtest. Fold fits are warm-started and cached (backtest.py), so a fold a
+config already saw in an earlier rung is free. Countries are searched in
+parallel.
+
+Configs that cannot differ are searched once: seasonality_prior_scale does
+nothing while every seasonality is off (annual data), and flat growth ignores
+the changepoint settings. Logistic growth needs a capacity and is not searched.
+
+The result, dataset/prophet_best_params.csv, has one row per country. The
+batch forecasts and the prediction app fit each country with its row
+(params_for), and fall back to the default parameters for countries without one.
+"""
+
+import argparse
+import itertools
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from arima_search import _MP_CONTEXT
+from backtest import PROPHET_DEFAULTS, _worker_init, backtest_series, expanding_folds
+
+BEST_PARAMS_CSV = "dataset/prophet_best_params.csv"
+
+SEARCH_SPACE = {
+    'changepoint_prior_scale': [0.001, 0.01, 0.05, 0.1, 0.5],
+    'seasonality_prior_scale': [0.1, 1.0, 10.0],
+    'growth': ['linear', 'flat'],
+    'n_changepoints': [5, 10, 25],
+}
+PARAM_COLUMNS = list(SEARCH_SPACE)
+
+INITIAL_YEARS = 12     # first training window of the backtest (2000-2011)
+HORIZON = 5            # test years per fold, as in the model comparison
+ETA = 3
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SEARCH SPACE
+# ══════════════════════════════════════════════════════════════════════════════
+def grid_configs(space=SEARCH_SPACE):
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def random_configs(n, space=SEARCH_SPACE, seed=0):
+    rng = random.Random(seed)
+    return [{name: rng.choice(values) for name, values in space.items()} for _ in range(n)]
+
+
+def effective(config, base=PROPHET_DEFAULTS):
+    """The config with settings that cannot change the fit removed."""
+    config = dict(config)
+    seasonal = any(base.get(f'{period}_seasonality') not in (False, None)
+                   for period in ('yearly', 'weekly', 'daily'))
+    if not seasonal:
+        config.pop('seasonality_prior_scale', None)
+    if config.get('growth') == 'flat':
+        config.pop('changepoint_prior_scale', None)
+        config.pop('n_changepoints', None)
+    return config
+
+
+def distinct(configs):
+    """Drop configs equivalent to an earlier one (same effective settings)."""
+    seen, out = set(), []
+    for config in configs:
+        key = tuple(sorted(effective(config).items()))
+        if key not in seen:
+            seen.add(key)
+            out.append(effective(config))
+    return out
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SUCCESSIVE HALVING
+# ══════════════════════════════════════════════════════════════════════════════
+def fold_budgets(n_folds, eta=ETA):
+    """Folds per rung: 1, eta, eta^2, ... then all of them."""
+    budgets, b = [], 1
+    while b < n_folds:
+        budgets.append(b)
+        b *= eta
+    return budgets + [n_folds]
+
+
+def _score(country, years, values, config, folds):
+    rows = pd.concat(backtest_series(country, years, values, 'prophet', folds, config), ignore_index=True)
+    return float(np.abs(rows['yhat'] - rows['y']).mean())
+
+
+def successive_halving(country, years, values, configs, initial=INITIAL_YEARS, horizon=HORIZON, eta=ETA):
+    """Best config for one country; returns (config, MAE on all folds, fits scored)."""
+    folds = expanding_folds(len(values), initial, horizon)
+    survivors, scores, evaluations = list(configs), {}, 0
+    for rung, budget in enumerate(fold_budgets(len(folds), eta)):
+        recent = folds[-budget:]
+        scores = {i: _score(country, years, values, survivors[i], recent) for i in range(len(survivors))}
+        evaluations += len(survivors) * budget
+        ranked = sorted(scores, key=scores.get)
+        if budget == len(folds):
+            best = ranked[0]
+            return survivors[best], scores[best], evaluations
+        survivors = [survivors[i] for i in ranked[:max(1, math.ceil(len(survivors) / eta))]]
+
+
+def _search_task(args):
+    country, iso3, years, values, configs, initial, horizon, eta = args
+    config, mae, evaluations = successive_halving(country, years, values, configs, initial, horizon, eta)
+    return {'Area': country, 'Area Code (ISO3)': iso3, **{p: config.get(p) for p in PARAM_COLUMNS},
+            'MAE': mae, 'configs': len(configs), 'fold_fits': evaluations}
+
+
+def search(df, countries=None, configs=None, initial=INITIAL_YEARS, horizon=HORIZON, eta=ETA, workers=None):
+    """Successive-halving search for every country (in parallel); one row per country."""
+    configs = distinct(configs or grid_configs())
+    if countries is None:
+        countries = df['Area'].unique().tolist()
+    iso3 = dict(zip(df['Area'].astype(str), df['Area Code (ISO3)'].astype(str)))
+    tasks = []
+    for country in countries:
+        series = df[df['Area'] == country].sort_values('Year')
+        tasks.append((country, iso3[country], series['Year'].to_numpy(), series['Value'].to_numpy(dtype='float64'),
+                      configs, initial, horizon, eta))
+
+    if workers == 1 or len(tasks) == 1:
+        _worker_init()
+        rows = [_search_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT, initializer=_worker_init) as pool:
+            rows = list(pool.map(_search_task, tasks))
+    return pd.DataFrame(rows)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BEST-CONFIG TABLE — read by batch_forecast.py and the prediction app
+# ══════════════════════════════════════════════════════════════════════════════
+@lru_cache(maxsize=2)
+def _load_best(path, mtime):
+    table = pd.read_csv(path)
+    best = {}
+    for row in table.to_dict('records'):
+        tuned = {p: row[p] for p in PARAM_COLUMNS if p in row and pd.notna(row[p])}
+        if 'n_changepoints' in tuned:
+            tuned['n_changepoints'] = int(tuned['n_changepoints'])
+        best[row['Area']] = {**PROPHET_DEFAULTS, **tuned}
+    return best
+
+
+def params_for(country, path=BEST_PARAMS_CSV):
+    """Tuned Prophet kwargs for a country, or None if it has not been tuned."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return _load_best(path, mtime).get(country)
+
+
+if __name__ == "__main__":
+    from data_store import load_data
+
+    parser = argparse.ArgumentParser(description="Per-country Prophet hyperparameter search (successive halving).")
+    parser.add_argument("--countries", nargs='*', default=None, help="Area names (default: all)")
+    parser.add_argument("--random", type=int, default=None, help="sample this many random configs instead of the grid")
+    parser.add_argument("--eta", type=int, default=ETA, help=f"halving rate (default: {ETA})")
+    parser.add_argument("--initial", type=int, default=INITIAL_YEARS)
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default=BEST_PARAMS_CSV)
+    args = parser.parse_args()
+
+    configs = random_configs(args.random) if args.random else grid_configs()
+    start = time.time()
+    table = search(load_data(value_dtype='float64'), args.countries, configs, args.initial, args.horizon,
+                   args.eta, args.workers)
+    table.to_csv(args.output, index=False)
+
+    n_configs = int(table['configs'].iloc[0])
+    n_folds = len(expanding_folds(int(load_data()['Year'].nunique()), args.initial, args.horizon))
+    print(f"Searched {n_configs} distinct configs for {len(table)} countries in {time.time() - start:.1f}s")
+    print(f"Fold fits scored: {table['fold_fits'].sum()} (exhaustive: {n_configs * n_folds * len(table)})")
+    print(table.groupby(['growth', 'changepoint_prior_scale'], dropna=False).size().rename('countries').to_string())
+    print(f"\nWritten: {args.output}")
@@ -0,0 +1,189 @@
+"""
+wide_matrix.py
+==============
+The years × countries emission matrix, built from the cleaned store and kept
+on disk as a memory-mapped float64 array.
+
+    python wide_matrix.py                              # build / refresh the cattle matrix
+    python wide_matrix.py --item Sheep --element "Enteric fermentation (Emissions CH4)"
+
+    from wide_matrix import load_matrix
+    years, iso3, X = load_matrix()                     # X: 22 × 192 float64, read-only memmap
+    years, iso3, X = load_matrix(complete=True)        # complete panel (see complete_panel)
+
+Every whole-panel computation reads this one array: the vectorized baselines
+(baselines.load_wide), Moran's I / LISA and the structural-break scan
+(spatial.year_matrix) and the dashboards' country line chart. They used to
+rebuild it per run, by a pandas pivot of the long table or by parsing
+dataset/modelling_data_2000_2021.csv (the modelling notebook's export, which
+ingest.py keeps writing for the notebook). Here it is derived once per data
+version and then mapped: every process shares the same pages, and a load is
+three small file opens.
+
+Files (dataset/wide/, one set per item/element; the default is 'cattle'):
+
+  <name>.npy         float64 (years × countries), C order, NaN = no value
+  <name>.iso3.npy    the column labels (ISO3), sorted as a pivot sorts them
+  <name>.years.npy   the row labels (int16 years)
+
+The values file is written last and is the freshness marker: a matrix older
+than its source (the cleaned CSV, or the emissions tensor for the other
+items) is rebuilt on the next load. Writes go through a temp file + rename,
+so a reader never maps a half-written array. Read-only deployments still get
+the matrix, in memory.
+
+complete=True returns a panel without gaps. A year that only some countries
+have so far (an extract that brings 2022 for a handful of them) is cut from
+the end rather than dropping every country without it: complete_panel keeps
+the leading run of years that leaves the most complete cells, then drops
+the countries still missing one of those years.
+
+Values are stored at the source's float64 precision, like the Parquet store,
+so the paper statistics (Moran's I, LISA, the Table 2 baselines) computed
+from the matrix are exactly those of the float64 frame. At 22 × 192 the
+matrix is 34 kB; float32 would save nothing worth the rounding.
+"""
+
+import argparse
+import os
+import re
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+from data_store import source_mtime
+from emissions_tensor import DEFAULT_ELEMENT, DEFAULT_ITEM, is_default, load_selection, tensor_mtime
+
+WIDE_DIR = "dataset/wide"
+DEFAULT_NAME = "cattle"
+
+
+def matrix_path(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+    """Path of the values file for one item/element (sidecars share its stem)."""
+    if is_default(item, element):
+        name = DEFAULT_NAME
+    else:
+        name = re.sub(r'[^a-z0-9]+', '_', f"{item} {element}".lower()).strip('_')
+    return os.path.join(WIDE_DIR, f"{name}.npy")
+
+
+def _sidecar(path, label):
+    return f"{os.path.splitext(path)[0]}.{label}.npy"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BUILD — long table -> matrix, one scatter (no pivot)
+# ══════════════════════════════════════════════════════════════════════════════
+def build_matrix(df):
+    """(years, iso3, X) from a cleaned-layout frame; X is float64 years × countries."""
+    years, row = np.unique(df['Year'].to_numpy(), return_inverse=True)
+    iso3, col = np.unique(df['Area Code (ISO3)'].astype(str).to_numpy(), return_inverse=True)
+    X = np.full((len(years), len(iso3)), np.nan, dtype='float64')
+    X[row, col] = df['Value'].to_numpy()
+    return years.astype('int16'), iso3, X
+
+
+def complete_panel(years, iso3, X):
+    """(years, iso3, X) without gaps: trailing partial years cut, then gappy countries dropped.
+
+    The kept years are the leading run 0..t that maximizes (countries with
+    every year up to t) × (t + 1) complete cells; ties keep more years. X is
+    returned as is (no copy) when it has no gaps.
+    """
+    present = ~np.isnan(X)
+    if present.all():
+        return years, iso3, X
+    # Countries with no gap from the first year through each year
+    through = np.logical_and.accumulate(present, axis=0).sum(axis=1)
+    cells = through * np.arange(1, len(years) + 1)
+    n_years = len(cells) - int(np.argmax(cells[::-1]))
+    keep = present[:n_years].all(axis=0)
+    return years[:n_years], iso3[keep], X[:n_years, keep]
+
+
+def _save(path, array):
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.npy.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def write_matrix(years, iso3, X, path):
+    """Persist a matrix and its sidecars; the values file goes last."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    _save(_sidecar(path, 'years'), np.asarray(years, dtype='int16'))
+    _save(_sidecar(path, 'iso3'), np.asarray(iso3, dtype=str))
+    _save(path, np.ascontiguousarray(X, dtype='float64'))
+
+
+def refresh_matrix(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT):
+    """Rebuild one item/element's matrix from its current data and write it."""
+    years, iso3, X = build_matrix(load_selection(item, element, 'float64'))
+    write_matrix(years, iso3, X, matrix_path(item, element))
+    return years, iso3, X
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# LOAD — mapped once per data version
+# ══════════════════════════════════════════════════════════════════════════════
+def _read(path, source_times):
+    """(years, iso3, X) mapped from disk; None if missing, stale or inconsistent."""
+    try:
+        if os.path.getmtime(path) < max(source_times):
+            return None
+        X = np.load(path, mmap_mode='r')
+        years = np.load(_sidecar(path, 'years')).astype(int)
+        iso3 = np.load(_sidecar(path, 'iso3'))
+    except (OSError, ValueError):
+        return None
+    # A matrix from an older layout (e.g. float32) is rebuilt
+    if X.dtype != np.float64 or X.shape != (len(years), len(iso3)):
+        return None
+    return years, iso3, X
+
+
+@lru_cache(maxsize=8)
+def _load(item, element, complete, version):
+    path = matrix_path(item, element)
+    sources = (version[0],) if is_default(item, element) else version
+    loaded = _read(path, sources)
+    if loaded is None:
+        try:
+            refresh_matrix(item, element)
+            loaded = _read(path, sources)
+        except OSError:
+            pass
+    years, iso3, X = loaded or build_matrix(load_selection(item, element, 'float64'))
+    if complete:
+        return complete_panel(years, iso3, X)
+    return years, iso3, X
+
+
+def load_matrix(item=DEFAULT_ITEM, element=DEFAULT_ELEMENT, complete=False):
+    """(years, iso3, X) for one item/element, X a read-only float64 years × countries array.
+
+    complete=True returns complete_panel(): trailing partial years cut, then
+    the countries with a gap dropped (a copy only when there are gaps).
+    Shared between callers — never write into X.
+    """
+    return _load(item, element, complete, (source_mtime(), tensor_mtime()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped years × countries matrix.")
+    parser.add_argument("--item", default=DEFAULT_ITEM, help=f"livestock item (default: {DEFAULT_ITEM})")
+    parser.add_argument("--element", default=DEFAULT_ELEMENT, help=f"emission element (default: {DEFAULT_ELEMENT})")
+    args = parser.parse_args()
+
+    years, iso3, X = refresh_matrix(args.item, args.element)
+    panel_years, panel_iso3, _ = complete_panel(years, iso3, X)
+    print(f"{X.shape[0]} years ({years[0]}-{years[-1]}) × {X.shape[1]} countries, {X.nbytes / 1024:.0f} kB")
+    print(f"Complete panel: {len(panel_years)} years ({panel_years[0]}-{panel_years[-1]}) × "
+          f"{len(panel_iso3)} countries")
+    print(f"Written: {matrix_path(args.item, args.element)}")